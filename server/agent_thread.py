@@ -0,0 +1,71 @@
+"""
+Agent Thread - Per-agent message thread with a stable prompt prefix
+
+OpenAI serves the longest previously seen prefix of a prompt from its
+prompt cache, which is faster and billed at the cached input rate. So each
+agent keeps one thread per discussion: a system message holding its persona
+and data (then the question), followed by one user turn per phase carrying
+only what is new to the agent - statements it hasn't been shown yet and the
+phase's instructions - and the agent's reply. Every request is the previous
+request plus a delta, so everything before the new turn is a cache hit.
+
+Once the turns outgrow the history token budget they are dropped, and the
+next turn carries the compacted discussion instead; deltas resume from there.
+"""
+from typing import Dict, Iterable, List, Set, Tuple
+
+from transcript import Transcript, TranscriptEntry, CHARS_PER_TOKEN
+
+# (speaker, message type, round, text) identifies a statement across transcript
+# forks and copies; speaker, type and round alone don't (a hierarchical panel
+# lead makes two rebuttals per round, one in its panel and one in the debate)
+EntryKey = Tuple[str, str, int, str]
+
+
+def _key(entry: TranscriptEntry) -> EntryKey:
+    return (entry.agent, entry.type, entry.round_number, entry.message)
+
+
+class AgentThread:
+    def __init__(self, agent_name: str, system_prompt: str):
+        self.agent_name = agent_name
+        self.system = {"role": "system", "content": system_prompt}
+        self._turns: List[Dict[str, str]] = []
+        self._turn_chars = 0
+        self._seen: Set[EntryKey] = set()
+
+    @property
+    def history_token_estimate(self) -> int:
+        """Approximate tokens in the turns after the system prefix"""
+        return self._turn_chars // CHARS_PER_TOKEN
+
+    def unseen(self, history: Transcript, include_types: Iterable[str]) -> List[TranscriptEntry]:
+        """Statements by other speakers that haven't been shown in this thread yet"""
+        return [
+            entry for entry in history.entries(include_types)
+            if entry.agent != self.agent_name and _key(entry) not in self._seen
+        ]
+
+    def messages(self, content: str) -> List[Dict[str, str]]:
+        """Request messages: the thread so far plus a new user turn"""
+        return [self.system, *self._turns, {"role": "user", "content": content}]
+
+    def commit(self, content: str, reply: str, shown: Iterable[TranscriptEntry] = ()):
+        """
+        Append a completed turn
+
+        Args:
+            content: The user turn that was sent
+            reply: The agent's reply
+            shown: Transcript entries included in the turn, so they aren't repeated
+        """
+        self._turns.append({"role": "user", "content": content})
+        self._turns.append({"role": "assistant", "content": reply})
+        self._turn_chars += len(content) + len(reply)
+        self._seen.update(_key(entry) for entry in shown)
+
+    def reset(self):
+        """Drop every turn after the system prefix (the next turn must carry the whole discussion)"""
+        self._turns = []
+        self._turn_chars = 0
+        self._seen = set()
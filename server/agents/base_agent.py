@@ -2,9 +2,15 @@
 Base agent class for all advisory board agents
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, List, FrozenSet
+
+# Capability: get_context takes the discussion question (e.g. live web search)
+QUESTION_CONTEXT = "question_context"
 
 class BaseAgent(ABC):
+    # Declared up front so callers don't have to inspect get_context
+    capabilities: FrozenSet[str] = frozenset()
+
     def __init__(self, name: str, role: str):
         self.name = name
         self.role = role
@@ -14,6 +20,12 @@ class BaseAgent(ABC):
         """Get the context data for this agent"""
         pass
 
+    async def load_context(self, question: str) -> str:
+        """Get the context data for a question, according to declared capabilities"""
+        if QUESTION_CONTEXT in self.capabilities:
+            return await self.get_context(question)
+        return await self.get_context()
+
     @abstractmethod
     async def generate_response(self, question: str, previous_responses: List[Dict[str, str]] = None) -> str:
         """Generate a response to the question"""
@@ -23,5 +35,6 @@ class BaseAgent(ABC):
         """Convert agent to dictionary representation"""
         return {
             "name": self.name,
-            "role": self.role
+            "role": self.role,
+            "capabilities": sorted(self.capabilities)
         }
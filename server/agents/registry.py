@@ -0,0 +1,116 @@
+"""
+Agent Registry - The single list of advisory board seats
+
+Each seat declares its URL id, agent, data source and (optional) Airia
+pipeline. The orchestrator, API endpoints and final-report parsing are all
+driven from this registry, so adding a seat is one register() call.
+"""
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+from agents.base_agent import BaseAgent
+from agents.sales_agent import sales_agent
+from agents.customer_service_agent import customer_service_agent
+from agents.research_agent import research_agent
+from config import settings
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    key: str
+    agent: BaseAgent
+    data_source: str
+    airia_pipeline_id: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.agent.name
+
+    @property
+    def role(self) -> str:
+        return self.agent.role
+
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        return self.agent.capabilities
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "id": self.key,
+            "name": self.name,
+            "role": self.role,
+            "data_source": self.data_source,
+            "capabilities": sorted(self.capabilities)
+        }
+
+
+class AgentRegistry:
+    def __init__(self):
+        # Insertion order is speaking order
+        self._specs: Dict[str, AgentSpec] = {}
+
+    def register(
+        self,
+        key: str,
+        agent: BaseAgent,
+        data_source: str,
+        airia_pipeline_id: Optional[str] = None
+    ) -> AgentSpec:
+        """
+        Add a seat to the board
+
+        Args:
+            key: URL id used by /api/agent/{agent_id}/ask
+            agent: The agent instance
+            data_source: Human-readable description of the agent's data
+            airia_pipeline_id: Airia pipeline used when Airia orchestration is enabled
+
+        Returns:
+            The registered spec
+        """
+        if key in self._specs:
+            raise ValueError(f"Agent {key} is already registered")
+        if any(spec.name == agent.name for spec in self._specs.values()):
+            raise ValueError(f"An agent named {agent.name} is already registered")
+        spec = AgentSpec(key=key, agent=agent, data_source=data_source, airia_pipeline_id=airia_pipeline_id)
+        self._specs[key] = spec
+        return spec
+
+    def get(self, key: str) -> Optional[AgentSpec]:
+        return self._specs.get(key)
+
+    def for_agent(self, agent: BaseAgent) -> Optional[AgentSpec]:
+        return next((spec for spec in self._specs.values() if spec.agent is agent), None)
+
+    def specs(self) -> List[AgentSpec]:
+        return list(self._specs.values())
+
+    def agents(self) -> List[BaseAgent]:
+        return [spec.agent for spec in self._specs.values()]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._specs
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+
+agent_registry = AgentRegistry()
+agent_registry.register(
+    "sales",
+    sales_agent,
+    data_source="Internal sales data",
+    airia_pipeline_id=settings.airia_sales_agent_id
+)
+agent_registry.register(
+    "customer_service",
+    customer_service_agent,
+    data_source="Internal customer service data",
+    airia_pipeline_id=settings.airia_cs_agent_id
+)
+agent_registry.register(
+    "research",
+    research_agent,
+    data_source="Web research via Linkup",
+    airia_pipeline_id=settings.airia_research_agent_id
+)
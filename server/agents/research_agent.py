@@ -2,11 +2,14 @@
 Research Agent - Provides insights based on web research using Linkup
 """
 from typing import List, Dict
-from agents.base_agent import BaseAgent
-from services.linkup_service import linkup_service
+from agents.base_agent import BaseAgent, QUESTION_CONTEXT
+from config import settings
 from services.openai_service import openai_service
+from services.research_fanout import research_fanout
 
 class ResearchAgent(BaseAgent):
+    capabilities = frozenset({QUESTION_CONTEXT})
+
     def __init__(self):
         super().__init__(
             name="Research Director",
@@ -19,27 +22,30 @@ class ResearchAgent(BaseAgent):
             return "No research conducted yet. Awaiting specific question."
 
         try:
-            # Use Linkup to search for relevant information
-            search_results = await linkup_service.search_results(question, max_results=5)
+            # Fan the question out into several Linkup searches, best findings first
+            findings = await research_fanout.research(question)
 
-            if not search_results:
+            if not findings:
                 return self._fallback_context()
 
             context = "Recent Web Research Findings:\n\n"
-            for idx, result in enumerate(search_results, 1):
-                title = result.get('name', result.get('title', 'Untitled'))
-                snippet = result.get('content', result.get('snippet', 'No description'))
-                url = result.get('url', '')
-                # Truncate content if too long
-                if len(snippet) > 200:
-                    snippet = snippet[:200] + "..."
-                context += f"{idx}. {title}\n   {snippet}\n   Source: {url}\n\n"
+            for idx, finding in enumerate(findings, 1):
+                snippet = self._trim(finding.snippet, settings.research_snippet_chars)
+                context += f"{idx}. {finding.title}\n   {snippet}\n   Source: {finding.url}\n\n"
 
             return context
         except Exception as e:
             print(f"⚠️  Linkup unavailable, using fallback research context: {e}")
             return self._fallback_context()
 
+    @staticmethod
+    def _trim(text: str, limit: int) -> str:
+        """Shorten text to about limit characters, at a word boundary"""
+        text = " ".join(text.split())
+        if len(text) <= limit:
+            return text
+        return text[:limit].rsplit(" ", 1)[0].rstrip(",;:") + "..."
+
     def _fallback_context(self) -> str:
         """Fallback context when Linkup is unavailable"""
         return """Market Research Context (Industry Knowledge Base):
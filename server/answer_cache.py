@@ -0,0 +1,128 @@
+"""
+Semantic Answer Cache - Reuses finished discussions for near-identical questions
+
+Entries are keyed by the normalised question plus a fingerprint of the
+agents' data contexts, so a change to the underlying data never serves a
+stale discussion. A stored discussion is only a candidate when its question
+normalises to the same text or has exactly the same content words, so
+"raise prices" never matches "lower prices" however close their n-grams
+are. Candidates are compared with the question's hashed n-gram vector in a
+single matrix product and the best match above the similarity threshold is
+returned unchanged, still carrying the question it answered. Entries expire
+after a TTL and the least recently used entry is evicted once the cache is
+full.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from models import BoardDiscussion
+from similarity import DIMENSIONS, content_words, normalize_text, text_vector
+
+
+@dataclass
+class _CacheEntry:
+    slot: int
+    fingerprint: str
+    words: frozenset
+    discussion: BoardDiscussion
+    created_at: float
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Normalised question -> entry, least recently used first
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._vectors = np.zeros((max_entries, DIMENSIONS), dtype=np.float32)
+        self._free_slots: List[int] = list(range(max_entries))
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, question: str, fingerprint: str) -> Optional[BoardDiscussion]:
+        """
+        Find a stored discussion for a similar question
+
+        Args:
+            question: The question being asked
+            fingerprint: Fingerprint of the agents' current data contexts
+
+        Returns:
+            The stored discussion, still labelled with the question it
+            answered, or None
+        """
+        self._expire()
+        normalized = normalize_text(question)
+        exact = self._entries.get(normalized)
+        if exact is not None and exact.fingerprint == fingerprint:
+            self._entries.move_to_end(normalized)
+            self.hits += 1
+            print(f"Answer cache hit (exact) for: {question}")
+            return exact.discussion
+
+        words = content_words(question)
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if entry.fingerprint == fingerprint and words and entry.words == words
+        ]
+        if not candidates:
+            self.misses += 1
+            return None
+
+        query = text_vector(question)
+        slots = [entry.slot for _, entry in candidates]
+        scores = self._vectors[slots] @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        key, entry = candidates[best]
+        self._entries.move_to_end(key)
+        self.hits += 1
+        print(f"Answer cache hit ({scores[best]:.2f}) for: {question} (answered: {entry.discussion.question})")
+        return entry.discussion
+
+    def store(self, question: str, fingerprint: str, discussion: BoardDiscussion):
+        """Store a finished discussion, evicting the least recently used entry if full"""
+        if self.max_entries <= 0:
+            return
+        key = normalize_text(question)
+        if key in self._entries:
+            self._release(key)
+        elif not self._free_slots:
+            self._release(next(iter(self._entries)))
+
+        slot = self._free_slots.pop()
+        self._vectors[slot] = text_vector(question)
+        self._entries[key] = _CacheEntry(
+            slot=slot,
+            fingerprint=fingerprint,
+            words=content_words(question),
+            discussion=discussion,
+            created_at=time.monotonic()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            self._release(key)
+
+    def _release(self, key: str):
+        entry = self._entries.pop(key)
+        self._free_slots.append(entry.slot)
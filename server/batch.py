@@ -0,0 +1,176 @@
+"""
+Batch Discussions - Run many board questions from a JSONL file
+
+Each input line is a JSON object with a "question" (and optionally an "id";
+without one, the id is a hash of the question). Discussions run
+concurrently, at most BATCH_CONCURRENCY at once across every batch in the
+process, and each result is written as one JSONL line as soon as it
+finishes. Re-running with the same output file skips questions that already
+completed, so a crash never redoes finished work.
+
+With --batch-api, discussions run offline through the OpenAI Batch API
+instead: groups of OPENAI_BATCH_DISCUSSIONS questions move through each phase
+in lockstep, one batch job per phase. Much slower per question, but cheaper
+and not limited by interactive rate limits.
+
+Usage:
+    python batch.py questions.jsonl results.jsonl [--concurrency 4] [--batch-api]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from config import settings
+from orchestrator import orchestrator
+from services.call_context import call_context
+
+# Caps discussions (not upstream calls, which the rate limiters cap) across every
+# batch in this process, so concurrent batches can't multiply the number running
+_discussion_slots: Optional[asyncio.Semaphore] = None
+
+
+def _discussion_slot() -> asyncio.Semaphore:
+    global _discussion_slots
+    if _discussion_slots is None:
+        _discussion_slots = asyncio.Semaphore(settings.batch_concurrency)
+    return _discussion_slots
+
+
+def question_id(question: str) -> str:
+    """Default id of a question: stable across edits and reordering of the input file"""
+    return hashlib.sha256(question.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def read_questions(lines: Iterable[str]) -> List[Dict[str, str]]:
+    """
+    Parse JSONL question lines
+
+    Args:
+        lines: JSONL lines, each with a "question" and optional "id"
+
+    Returns:
+        List of {"id", "question"} dicts (id defaults to a hash of the question)
+
+    Raises:
+        ValueError: If a line is not valid JSON or has no question
+    """
+    items = []
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {line_number}: invalid JSON ({e})")
+        if not isinstance(record, dict) or not record.get("question"):
+            raise ValueError(f"Line {line_number}: missing 'question'")
+        items.append({
+            "id": str(record["id"]) if record.get("id") is not None else question_id(record["question"]),
+            "question": record["question"]
+        })
+    return items
+
+
+def completed_ids(output_path: Path) -> Set[str]:
+    """Ids already completed in an existing results file"""
+    if not output_path.exists():
+        return set()
+    done = set()
+    with output_path.open() as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written line from a crash
+            if result.get("status") == "completed":
+                done.add(result["id"])
+    return done
+
+
+async def _discuss(item: Dict[str, str]) -> Dict[str, Any]:
+    async with _discussion_slot():
+        try:
+            with call_context(endpoint="batch"):
+                discussion = await orchestrator.conduct_discussion(item["question"])
+        except Exception as e:
+            print(f"Batch question {item['id']} failed: {e}")
+            return {**item, "status": "failed", "error": str(e)}
+    return {**item, "status": "completed", "discussion": discussion.model_dump()}
+
+
+async def run_batch(items: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run discussions for a batch of questions
+
+    Yields:
+        One result dict per question, in completion order
+    """
+    tasks = [asyncio.create_task(_discuss(item)) for item in items]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def run_batch_api(items: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run discussions through the OpenAI Batch API, in lockstep groups
+
+    Yields:
+        One result dict per question, a group at a time
+    """
+    group_size = max(1, settings.openai_batch_discussions)
+    for start in range(0, len(items), group_size):
+        group = items[start:start + group_size]
+        with call_context(endpoint="batch"):
+            outcomes = await orchestrator.conduct_discussions_batch([item["question"] for item in group])
+        for item, outcome in zip(group, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Batch question {item['id']} failed: {outcome}")
+                yield {**item, "status": "failed", "error": str(outcome)}
+            else:
+                yield {**item, "status": "completed", "discussion": outcome.model_dump()}
+
+
+async def run_batch_file(input_path: Path, output_path: Path, batch_api: bool = False) -> Dict[str, int]:
+    """Run a JSONL question file, appending results and skipping finished ids"""
+    with input_path.open() as f:
+        items = read_questions(f)
+
+    done = completed_ids(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} questions, {len(items) - len(pending)} already completed, {len(pending)} to run")
+
+    counts = {"completed": 0, "failed": 0}
+    with output_path.open("a") as out:
+        async for result in (run_batch_api(pending) if batch_api else run_batch(pending)):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            counts[result["status"]] += 1
+            print(f"[{sum(counts.values())}/{len(pending)}] {result['id']}: {result['status']}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run advisory board discussions for a JSONL file of questions")
+    parser.add_argument("input", type=Path, help="JSONL file with one {\"question\": ...} per line")
+    parser.add_argument("output", type=Path, help="JSONL results file (appended to, enables resume)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Max discussions at once")
+    parser.add_argument("--batch-api", action="store_true", help="Run offline through the OpenAI Batch API")
+    args = parser.parse_args()
+
+    if args.concurrency:
+        settings.batch_concurrency = args.concurrency
+
+    counts = asyncio.run(run_batch_file(args.input, args.output, batch_api=args.batch_api))
+    print(f"Done: {counts['completed']} completed, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
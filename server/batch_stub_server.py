@@ -0,0 +1,176 @@
+"""
+Batch Stub Server - Offline stand-in for the OpenAI Files and Batches API
+
+Implements just enough of the API for batch mode to run end to end without
+network access or an API key: file upload/download, batch create/retrieve,
+and plain chat completions. Batches complete after --delay seconds with a
+canned completion for every request; requests whose body asks for
+"fail": true (or an unknown model) come back in the error file.
+
+Usage:
+    python batch_stub_server.py [--port 8100] [--delay 2]
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=stub \\
+        python batch.py questions.jsonl results.jsonl --batch-api
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from typing import Any, Dict
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+app = FastAPI(title="OpenAI Batch API stand-in")
+
+# Seconds before a submitted batch completes
+BATCH_DELAY_SECONDS = 2.0
+
+_files: Dict[str, Dict[str, Any]] = {}
+_batches: Dict[str, Dict[str, Any]] = {}
+
+
+def _completion(body: Dict[str, Any]) -> Dict[str, Any]:
+    """A canned ChatCompletion for a request body"""
+    messages = body.get("messages", [])
+    last = messages[-1]["content"] if messages else ""
+    text = f"[stub completion] {' '.join(last.split()[:40])}"
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    completion_tokens = min(len(text) // 4, body.get("max_tokens") or 1000)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": text}
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def _store_file(filename: str, content: bytes, purpose: str) -> Dict[str, Any]:
+    file_id = f"file-{uuid.uuid4().hex}"
+    _files[file_id] = {
+        "meta": {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        },
+        "content": content
+    }
+    return _files[file_id]["meta"]
+
+
+async def _process(batch_id: str):
+    batch = _batches[batch_id]
+    batch["status"] = "in_progress"
+    await asyncio.sleep(BATCH_DELAY_SECONDS)
+
+    outputs, errors = [], []
+    for line in _files[batch["input_file_id"]]["content"].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        body = request.get("body", {})
+        if body.get("fail") or not body.get("model"):
+            errors.append({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 400, "body": {"error": {"message": "stub rejected request"}}},
+                "error": None
+            })
+        else:
+            outputs.append({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": _completion(body)},
+                "error": None
+            })
+
+    def jsonl(records):
+        return "\n".join(json.dumps(r) for r in records).encode("utf-8")
+
+    if outputs:
+        batch["output_file_id"] = _store_file("output.jsonl", jsonl(outputs), "batch_output")["id"]
+    if errors:
+        batch["error_file_id"] = _store_file("errors.jsonl", jsonl(errors), "batch_output")["id"]
+    batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+@app.post("/v1/files")
+async def upload_file(request: Request):
+    # Parse the multipart upload with the stdlib so the stub needs no extra packages
+    raw = f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode() + await request.body()
+    form = BytesParser(policy=default_policy).parsebytes(raw)
+    fields = {part.get_param("name", header="content-disposition"): part for part in form.iter_parts()}
+    if "file" not in fields:
+        raise HTTPException(status_code=400, detail="file is required")
+    purpose = fields["purpose"].get_content().strip() if "purpose" in fields else "batch"
+    return _store_file(fields["file"].get_filename() or "upload.jsonl", fields["file"].get_payload(decode=True), purpose)
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    if file_id not in _files:
+        raise HTTPException(status_code=404, detail="No such file")
+    return Response(_files[file_id]["content"], media_type="application/octet-stream")
+
+
+@app.post("/v1/batches")
+async def create_batch(body: Dict[str, Any]):
+    if body.get("input_file_id") not in _files:
+        raise HTTPException(status_code=400, detail="Unknown input_file_id")
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    _batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body.get("endpoint", "/v1/chat/completions"),
+        "input_file_id": body["input_file_id"],
+        "completion_window": body.get("completion_window", "24h"),
+        "status": "validating",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None
+    }
+    asyncio.create_task(_process(batch_id))
+    return _batches[batch_id]
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    if batch_id not in _batches:
+        raise HTTPException(status_code=404, detail="No such batch")
+    return _batches[batch_id]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completion(body: Dict[str, Any]):
+    """Interactive calls, so the whole server can run against the stub"""
+    return _completion(body)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline stand-in for the OpenAI Batch API")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--delay", type=float, default=BATCH_DELAY_SECONDS, help="Seconds until a batch completes")
+    args = parser.parse_args()
+    BATCH_DELAY_SECONDS = args.delay
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
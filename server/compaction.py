@@ -0,0 +1,130 @@
+"""
+History Compaction - Keeps the rendered discussion under a token budget
+
+When the "discussion so far" would exceed the budget, the oldest rounds are
+replaced by a rolling summary and only the most recent rounds are kept
+verbatim. Summaries are built incrementally (summary of rounds <= N is the
+summary of rounds <= N-1 plus round N) and cached per round for the whole
+discussion, so each round is summarized at most once per history view.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+from scheduler import SharedWork
+from services.openai_service import openai_service
+from services.call_context import call_context
+from services.model_router import SUMMARY
+from transcript import Transcript, TranscriptEntry, CHARS_PER_TOKEN
+
+SUMMARY_MAX_TOKENS = 250
+
+
+class HistoryCompactor:
+    def __init__(self, token_budget: int):
+        self.token_budget = token_budget
+        # (scope, include_types, last summarized round) -> rolling summary
+        self._summaries: Dict[Tuple[str, Tuple[str, ...], int], SharedWork] = {}
+
+    async def render(
+        self,
+        transcript: Transcript,
+        include_types: Iterable[str],
+        scope: str = ""
+    ) -> str:
+        """
+        Prompt text for the given message types, compacted if over budget
+
+        Args:
+            transcript: The history to render
+            include_types: Message types to include
+            scope: Separates summary caches for transcripts holding different
+                messages (e.g. one per deliberation panel)
+        """
+        key = tuple(sorted(set(include_types)))
+        if not self.token_budget or transcript.token_estimate_for(key) <= self.token_budget:
+            return transcript.render(key)
+
+        rounds = self._by_round(transcript.entries(key))
+        round_numbers = sorted(rounds)
+
+        # Keep the most recent rounds verbatim while they fit next to the summary
+        available = self.token_budget - SUMMARY_MAX_TOKENS
+        kept = 0
+        used = 0
+        for round_number in reversed(round_numbers):
+            tokens = sum(len(e.text) for e in rounds[round_number]) // CHARS_PER_TOKEN
+            if kept and used + tokens > available:
+                break
+            used += tokens
+            kept += 1
+
+        if kept == len(round_numbers):
+            return transcript.render(key)
+
+        last_summarized = round_numbers[-kept - 1]
+        summary = await self._summary(transcript, key, last_summarized, scope)
+        recent = "".join(
+            e.text for r in round_numbers[-kept:] for e in rounds[r]
+        )
+        return f"\nSummary of rounds {round_numbers[0]}-{last_summarized}: {summary}\n{recent}"
+
+    def close(self):
+        """Cancel any summaries still running when the discussion ends"""
+        for work in self._summaries.values():
+            work.cancel()
+
+    async def _summary(
+        self,
+        transcript: Transcript,
+        key: Tuple[str, ...],
+        upto_round: int,
+        scope: str
+    ) -> str:
+        cache_key = (scope, key, upto_round)
+        work = self._summaries.get(cache_key)
+        if work is None:
+            work = SharedWork(self._summarize(transcript, key, upto_round, scope))
+            self._summaries[cache_key] = work
+        # Shielded so one cancelled turn doesn't cancel a summary others are waiting on
+        return await work.wait()
+
+    async def _summarize(
+        self,
+        transcript: Transcript,
+        key: Tuple[str, ...],
+        upto_round: int,
+        scope: str
+    ) -> str:
+        rounds = self._by_round(transcript.entries(key))
+        earlier = [r for r in sorted(rounds) if r < upto_round]
+        previous = await self._summary(transcript, key, earlier[-1], scope) if earlier else ""
+        new_messages = "".join(e.text for e in rounds.get(upto_round, []))
+
+        prompt = f"""You are the secretary of an advisory board, keeping a running summary of the discussion.
+
+Summary so far:
+{previous or "Nothing yet."}
+
+New messages from round {upto_round}:
+{new_messages}
+
+Update the summary to include the new messages. Keep each director's current position, the key data points they cited, and where they agree or disagree. Be concise (under 150 words)."""
+
+        with call_context(phase="compaction"):
+            summary = await openai_service.generate_response(
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                task=SUMMARY
+            )
+
+        if summary.startswith("Error generating response"):
+            # Don't cache the failure; fall back to the verbatim messages
+            self._summaries.pop((scope, key, upto_round), None)
+            return f"{previous}{new_messages}"
+        return summary
+
+    def _by_round(self, entries: List[TranscriptEntry]) -> Dict[int, List[TranscriptEntry]]:
+        rounds: Dict[int, List[TranscriptEntry]] = {}
+        for entry in entries:
+            rounds.setdefault(entry.round_number, []).append(entry)
+        return rounds
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Any, Dict, Literal, Optional
 from pathlib import Path
 
 class Settings(BaseSettings):
@@ -17,14 +17,135 @@ class Settings(BaseSettings):
     # Enable Airia orchestration
     use_airia_orchestration: bool = False
 
-    # Rate Limiting Configuration
+    # Default model and per-call deadline; OPENAI_MODEL_ROUTES overrides them per task class
+    # (JSON, e.g. {"synthesis": {"model": "gpt-4o", "fallback_model": "gpt-4o-mini", "latency_slo_seconds": 20}})
+    openai_model: str = "gpt-4o-mini"
+    openai_model_routes: Dict[str, Dict[str, Any]] = {}
+
+    # OpenAI per-call deadline and hedged requests
+    openai_timeout_seconds: float = 60.0
+    openai_hedge_enabled: bool = False
+    openai_hedge_percentile: float = 95.0
+    openai_hedge_min_delay_seconds: float = 1.0
+
+    # Pooled HTTP clients for Linkup and Airia
+    http_pool_max_connections: int = 20
+    http_pool_max_keepalive: int = 10
+    http_pool_keepalive_seconds: float = 30.0
+    http_pool_http2: bool = True
+
+    # Upstream rate limits (0 = unlimited). Concurrency backs off on 429/5xx
+    # and recovers while calls succeed
+    openai_requests_per_minute: int = 500
+    openai_tokens_per_minute: int = 200000
+    openai_max_concurrency: int = 16
+    linkup_requests_per_minute: int = 60
+    linkup_max_concurrency: int = 8
+    airia_requests_per_minute: int = 60
+    airia_max_concurrency: int = 8
+
+    # Retries and circuit breakers for upstream calls
+    upstream_retry_attempts: int = 3
+    upstream_retry_base_delay_seconds: float = 0.5
+    upstream_retry_max_delay_seconds: float = 8.0
+    circuit_failure_threshold: int = 5
+    circuit_reset_seconds: float = 30.0
+
+    # OpenAI completion cache for identical requests (memory LRU over SQLite)
+    completion_cache_enabled: bool = False
+    completion_cache_path: str = ""  # Defaults to server/completions.db
+    completion_cache_ttl_seconds: int = 86400
+    completion_cache_max_entries: int = 1000
+    # Comma-separated endpoint or discussion phase labels whose calls may be cached
+    completion_cache_endpoints: str = "analyze_report,quick_discuss,agent_ask,research"
+
+    # Share one upstream call between identical OpenAI requests / Linkup searches in flight at once
+    single_flight_enabled: bool = True
+
+    # Research fan-out: sub-queries per question, how many run at once, and the
+    # overall deadline after which unfinished searches are dropped
+    research_subqueries: int = 4
+    research_concurrency: int = 4
+    research_deadline_seconds: float = 8.0
+    research_max_results: int = 6
+    research_snippet_chars: int = 400
+
+    # Linkup search cache: fresh for the TTL, then served stale (and refreshed
+    # in the background) for stale_seconds more; failures are cached briefly
+    search_cache_enabled: bool = True
+    search_cache_path: str = ""  # SQLite file to persist entries in ("" = memory only)
+    search_cache_ttl_seconds: int = 3600
+    search_cache_stale_seconds: int = 86400
+    search_cache_negative_ttl_seconds: int = 60
+    search_cache_max_entries: int = 1000
+
+    # OpenAI Batch API mode (batch.py --batch-api)
+    openai_base_url: str = ""  # e.g. http://localhost:8100/v1 for batch_stub_server.py
+    openai_batch_flush_seconds: float = 2.0
+    # Lockstep phases are sent when every discussion has queued its requests; this is the backstop
+    openai_batch_fallback_seconds: float = 120.0
+    openai_batch_max_requests: int = 50000
+    openai_batch_poll_seconds: float = 30.0
+    openai_batch_price_multiplier: float = 0.5
+    openai_batch_discussions: int = 100
+
+    # Fake upstream backend for load testing: "" (off), "synthetic", "record" or "replay"
+    fake_backend: str = ""
+    fake_backend_profile: str = "typical"  # Latency profile: "instant", "typical" or "slow"
+    fake_backend_latency_scale: float = 1.0
+    fake_backend_error_rate: float = 0.0
+    fake_backend_rate_limit_rate: float = 0.0
+    fake_backend_seed: int = 0
+    fake_backend_recording: str = ""  # Defaults to server/fake_backend.jsonl
+
+    # Discussion job queue (submit/poll API)
+    job_db_path: str = ""  # Defaults to server/jobs.db
+    job_workers: int = 2
+    job_queue_max: int = 100
+
+    # Batch discussions (HTTP batch endpoint and batch.py CLI)
+    batch_concurrency: int = 4
+
+    # Semantic answer cache for repeated questions
+    answer_cache_enabled: bool = False
+    answer_cache_threshold: float = 0.95
+    answer_cache_ttl_seconds: int = 86400
+    answer_cache_max_entries: int = 500
+
+    # Deliberation length: "fixed" or "adaptive" (stop once positions converge)
+    deliberation_mode: str = "fixed"
+    max_deliberation_rounds: int = 5
+    convergence_threshold: float = 0.85
+
+    # Discussion turn scheduling: "sequential" or "snapshot" (checked at startup, see scheduler.POLICIES)
+    discussion_turn_policy: Literal["sequential", "snapshot"] = "sequential"
+    # Max agent turns in flight at once (0 = no cap)
+    max_concurrent_turns: int = 0
+    # Deliberation topology: "flat" or "hierarchical" (panels of panel_size)
+    deliberation_topology: str = "flat"
+    panel_size: int = 4
+
+    # Rate Limiting Configuration (per client, on incoming API requests)
     rate_limit_window_minutes: int = 15
     rate_limit_max_requests: int = 100
     ai_rate_limit_max_requests: int = 10
+    # Reverse proxies in front of the API (1 on Render); clients are read from X-Forwarded-For
+    trusted_proxy_hops: int = 0
     max_tokens_per_request: int = 2000
 
-    # Daily Budget Limit
+    # Token budget for rendered discussion history (0 = use max_tokens_per_request)
+    history_token_budget: int = 0
+
+    # Daily Budget Limit (USD, 0 = disabled), enforced before each OpenAI call
     daily_budget_limit: float = 5.0
+    usage_db_path: str = ""  # Defaults to server/usage.db
+    # OpenAI pricing (USD per million tokens) used by the usage meter for models
+    # without a known list price; OPENAI_MODEL_PRICES adds or overrides models
+    # (JSON, e.g. {"gpt-4o": {"input": 2.5, "cached_input": 1.25, "output": 10}})
+    openai_input_cost_per_million: float = 0.15
+    openai_cached_input_cost_per_million: float = 0.075
+    openai_output_cost_per_million: float = 0.60
+    openai_model_prices: Dict[str, Dict[str, float]] = {}
 
     model_config = SettingsConfigDict(
         env_file=str(Path(__file__).parent / ".env"),
@@ -0,0 +1,65 @@
+"""
+Context Store - Discussion-scoped cache of agent data contexts
+
+Each agent's context is resolved once per discussion and shared by every
+phase, so the Research Director runs its web research once per question
+rather than once per phase. Contexts can be prefetched in parallel at the start.
+
+The store also holds each agent's message thread for the discussion, whose
+system prefix is built from the agent's persona and context.
+"""
+import asyncio
+from typing import Dict, List
+
+from agents.base_agent import BaseAgent
+from agent_thread import AgentThread
+
+
+class ContextStore:
+    def __init__(self, question: str):
+        self.question = question
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._threads: Dict[str, AgentThread] = {}
+
+    def prefetch(self, agents: List[BaseAgent]):
+        """Start resolving every agent's context concurrently"""
+        for agent in agents:
+            self._task(agent)
+
+    async def get(self, agent: BaseAgent) -> str:
+        """Get an agent's context, resolving it on first use"""
+        # Shielded so one cancelled turn doesn't cancel the lookup for the rest
+        return await asyncio.shield(self._task(agent))
+
+    async def thread(self, agent: BaseAgent) -> AgentThread:
+        """Get an agent's message thread, starting it on first use"""
+        thread = self._threads.get(agent.name)
+        if thread is None:
+            context = await self.get(agent)
+            thread = self._threads.setdefault(
+                agent.name, AgentThread(agent.name, self._system_prompt(agent, context))
+            )
+        return thread
+
+    def _system_prompt(self, agent: BaseAgent, context: str) -> str:
+        # Persona and data first: for agents with static data this prefix is
+        # identical across discussions, not just across one discussion's phases
+        return f"""You are {agent.name}, {agent.role}, a member of an advisory board. Over the meeting you research the question, present your initial position and deliberate with the other advisors.
+
+Your data:
+{context}
+
+Question: {self.question}"""
+
+    def close(self):
+        """Cancel any lookups still running when the discussion ends"""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+    def _task(self, agent: BaseAgent) -> asyncio.Task:
+        task = self._tasks.get(agent.name)
+        if task is None:
+            task = asyncio.create_task(agent.load_context(self.question))
+            self._tasks[agent.name] = task
+        return task
@@ -0,0 +1,37 @@
+"""
+Convergence detection - Decides when deliberation has stopped moving
+
+Compares each agent's message in a round with their message in the previous
+round using local hashed n-gram similarity. The round's score is the lowest
+of these, so deliberation only stops when every agent is mostly repeating
+themselves and one agent who is still moving keeps it going.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+from models import DiscussionRound
+from similarity import text_vector
+
+
+def position_similarity(previous: DiscussionRound, current: DiscussionRound) -> Optional[float]:
+    """
+    Similarity of the agent whose position moved most between two rounds
+
+    Args:
+        previous: The earlier round (initial presentations or a deliberation round)
+        current: The round that just finished
+
+    Returns:
+        Lowest cosine similarity (0-1) between an agent's last message in
+        each round, or None if no agent spoke in both rounds
+    """
+    # An agent's last message in a round is its position (leads speak twice in hierarchical rounds)
+    before: Dict[str, str] = {m.agent: m.message for m in previous.messages}
+    after: Dict[str, str] = {m.agent: m.message for m in current.messages}
+    scores = [
+        float(np.dot(text_vector(before[agent]), text_vector(message)))
+        for agent, message in after.items()
+        if agent in before
+    ]
+    return min(scores) if scores else None
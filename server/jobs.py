@@ -0,0 +1,194 @@
+"""
+Discussion Jobs - Submit/poll execution of board discussions
+
+Instead of holding an HTTP connection open for a whole discussion, clients
+submit a question, get a job id back and poll for status, partial rounds and
+the final report. A bounded pool of workers runs the discussions and every
+job is persisted in a local SQLite database, so results survive client
+timeouts and unfinished jobs are picked up again after a restart.
+"""
+import asyncio
+import json
+import sqlite3
+import uuid
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from orchestrator import orchestrator
+from services.call_context import call_context
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue can't take more work"""
+
+
+class JobStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    rounds TEXT NOT NULL DEFAULT '[]',
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )"""
+            )
+
+    def create(self, question: str) -> str:
+        """Store a new queued job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, question, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, question, QUEUED, now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields: Any):
+        """Update status, rounds, result or error of a job"""
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job with its JSON columns decoded"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["rounds"] = json.loads(job["rounds"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def unfinished(self) -> List[Dict[str, str]]:
+        """Jobs that were queued or running when the server stopped"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, question FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class JobQueue:
+    def __init__(self, store: JobStore, workers: int, max_pending: int):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the worker pool and re-queue jobs left over from a previous run"""
+        self._queue = asyncio.Queue()
+        for job in await asyncio.to_thread(self.store.unfinished):
+            await asyncio.to_thread(self.store.update, job["id"], status=QUEUED, rounds="[]")
+            self._queue.put_nowait((job["id"], job["question"]))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; running jobs stay 'running' and are retried on next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, question: str) -> str:
+        """
+        Queue a discussion
+
+        Args:
+            question: The question for the board
+
+        Returns:
+            The job id
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting
+        """
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if self._queue.qsize() >= self.max_pending:
+            raise QueueFullError(f"{self.max_pending} discussions are already queued")
+        job_id = await asyncio.to_thread(self.store.create, question)
+        self._queue.put_nowait((job_id, question))
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self):
+        while True:
+            job_id, question = await self._queue.get()
+            try:
+                await self._run(job_id, question)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, question: str):
+        await asyncio.to_thread(self.store.update, job_id, status=RUNNING)
+        rounds: Dict[int, Dict[str, Any]] = {}
+
+        async def progress(event: str, data: Dict[str, Any]):
+            # Persist rounds as messages arrive so pollers can see partial results
+            if event == "phase" and data["phase"] != "synthesis":
+                rounds[data["round_number"]] = {
+                    "round_number": data["round_number"],
+                    "round_type": data["phase"],
+                    "messages": []
+                }
+            elif event == "message":
+                rounds[data["round_number"]]["messages"].append(data)
+                await asyncio.to_thread(
+                    self.store.update, job_id, rounds=json.dumps(list(rounds.values()))
+                )
+
+        try:
+            with call_context(endpoint="jobs"):
+                # Progress only: token deltas would put every call on the streaming path
+                discussion = await orchestrator.conduct_discussion(question, emit=progress, stream_tokens=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Discussion job {job_id} failed: {e}")
+            await asyncio.to_thread(self.store.update, job_id, status=FAILED, error=str(e))
+            return
+
+        await asyncio.to_thread(
+            self.store.update,
+            job_id,
+            status=COMPLETED,
+            rounds=json.dumps([r.model_dump() for r in discussion.rounds]),
+            result=discussion.model_dump_json()
+        )
+
+
+discussion_jobs = JobQueue(
+    JobStore(settings.job_db_path or str(Path(__file__).parent / "jobs.db")),
+    workers=settings.job_workers,
+    max_pending=settings.job_queue_max
+)
@@ -1,27 +1,101 @@
 """
 FastAPI backend for AI Agent Advisory Board
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, Literal, Awaitable, Optional
 from pydantic import BaseModel, Field, ValidationError
 import asyncio
+import json
 
-from models import QuestionRequest, BoardDiscussion, HealthResponse
-from agents.sales_agent import sales_agent
-from agents.customer_service_agent import customer_service_agent
-from agents.research_agent import research_agent
+from models import QuestionRequest, BoardDiscussion, DiscussionJob, HealthResponse
+from agents.registry import agent_registry
 from orchestrator import orchestrator
 from services.openai_service import openai_service
+from services.http_pool import http_pool
+from services.linkup_service import linkup_service
+from services.research_fanout import research_fanout
+from services.rate_limiter import api_limiter, ai_api_limiter, client_address, upstream_limiters
+from services.resilience import upstreams, CLOSED
+from services.call_context import call_context
+from services.usage import usage_meter
+from services.fake_backend import fake_backend
+from jobs import discussion_jobs, QueueFullError
+from batch import read_questions, run_batch
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_pool.start()
+    await discussion_jobs.start()
+    yield
+    await discussion_jobs.stop()
+    await http_pool.aclose()
 
 app = FastAPI(
     title="AI Agent Advisory Board",
     description="Multi-agent advisory board using OpenAI, Airia, and Linkup",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# CORS configuration
+# Job status polls; a client polling its job every second must not use up its window
+JOB_STATUS_PREFIX = "/api/advisory-board/jobs/"
+
+class ApiRateLimit:
+    """
+    Per-client limit on every /api route (RATE_LIMIT_MAX_REQUESTS per window)
+    except job status polls
+
+    A plain ASGI middleware rather than @app.middleware("http"): that wraps
+    receive, so Request.is_disconnected() never reports a client that went
+    away and run_until_disconnect can't cancel abandoned discussions.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/api/") and not _is_job_poll(scope):
+            retry_after = api_limiter.check(client_address(scope))
+            if retry_after is not None:
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many requests. Please wait before making more requests."},
+                    headers={"Retry-After": str(int(retry_after) + 1)}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+def _is_job_poll(scope) -> bool:
+    return scope["method"] == "GET" and scope["path"].startswith(JOB_STATUS_PREFIX)
+
+app.add_middleware(ApiRateLimit)
+
+async def ai_rate_limit(request: Request):
+    """Stricter per-client limit on routes that call the LLM (AI_RATE_LIMIT_MAX_REQUESTS per window)"""
+    retry_after = ai_api_limiter.check(client_address(request.scope))
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="AI request limit exceeded. Please wait before making more requests.",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+
+async def require_budget():
+    """Refuse LLM routes once today's metered spend has reached DAILY_BUDGET_LIMIT"""
+    limit = usage_meter.daily_limit
+    if limit > 0 and usage_meter.spent_today() >= limit:
+        raise HTTPException(status_code=429, detail="Daily budget limit reached. Please try again tomorrow.")
+
+async def ask_agent(agent, question: str) -> str:
+    """An agent's direct answer, with its calls attributed to it in the usage meter"""
+    with call_context(agent=agent.name):
+        return await agent.generate_response(question)
+
+# CORS configuration (added last so it also wraps rate-limited responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:3000", "http://localhost:8081", "http://localhost:8080", "https://ai-advisor-board.vercel.app"],
@@ -30,12 +104,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Agent registry
-AGENTS = {
-    "sales": sales_agent,
-    "customer_service": customer_service_agent,
-    "research": research_agent
-}
+# How often long-running endpoints check whether the client is still there
+DISCONNECT_POLL_SECONDS = 0.5
+# Requests cancelled because their client went away
+disconnect_stats = {"cancelled": 0}
 
 
 class ReportInput(BaseModel):
@@ -57,24 +129,78 @@ class AnalysisOutput(BaseModel):
     consensus: str = Field(description="A 2-3 sentence synthesis of the agents' core agreement.")
     action_plan: List[PrioritizedTask]
 
+# Offline runs (FAKE_BACKEND) answer analyze-report's json_object call in this shape
+fake_backend.register_json_shape("analyze_report", AnalysisOutput.model_json_schema())
+
+async def run_until_disconnect(http_request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Await work, cancelling it if the client disconnects first
+
+    Cancellation propagates through the orchestrator's task tree (scheduled
+    turns, context lookups, summaries), so no further upstream calls are made
+    for a response nobody will read.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                print(f"Client disconnected from {http_request.url.path}, cancelling")
+                disconnect_stats["cancelled"] += 1
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
 @app.get("/", tags=["Health"])
 async def root():
     return {"message": "AI Agent Advisory Board API", "version": "1.0.0"}
 
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint - reports each upstream's circuit breaker state"""
+    states = {name: upstream.breaker.state for name, upstream in upstreams.items()}
     return {
-        "status": "healthy",
-        "services": {
-            "openai": "configured",
-            "airia": "configured",
-            "linkup": "configured"
-        }
+        "status": "healthy" if all(state == CLOSED for state in states.values()) else "degraded",
+        "services": states
+    }
+
+@app.get("/api/metrics", tags=["Health"])
+async def get_metrics():
+    """Upstream call and cache metrics"""
+    return {
+        "openai": openai_service.metrics(),
+        "linkup": linkup_service.metrics(),
+        "research": research_fanout.metrics(),
+        "http_pools": http_pool.metrics(),
+        "rate_limiters": {name: limiter.metrics() for name, limiter in upstream_limiters.items()},
+        "upstreams": {name: upstream.metrics() for name, upstream in upstreams.items()},
+        "client_disconnects": dict(disconnect_stats),
+        "answer_cache": orchestrator.answer_cache.stats() if orchestrator.answer_cache else None,
+        "fake_backend": fake_backend.metrics() if fake_backend.enabled else None
     }
 
-@app.post("/api/advisory-board/discuss", response_model=BoardDiscussion, tags=["Advisory Board"])
-async def discuss_question(request: QuestionRequest):
+@app.get("/api/usage", tags=["Health"])
+async def get_usage(discussion_id: Optional[str] = None):
+    """
+    Today's token usage and spend against DAILY_BUDGET_LIMIT
+
+    Broken down by endpoint, phase, agent and model, with per-phase usage of
+    recent discussions. Pass discussion_id for a single discussion.
+    """
+    if discussion_id is None:
+        return usage_meter.report()
+    usage = usage_meter.discussion(discussion_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail=f"No usage recorded for discussion {discussion_id}")
+    return usage
+
+@app.post("/api/advisory-board/discuss", response_model=BoardDiscussion, tags=["Advisory Board"], dependencies=[Depends(ai_rate_limit), Depends(require_budget)])
+async def discuss_question(request: QuestionRequest, http_request: Request):
     """
     Submit a question to the advisory board for multi-round discussion
 
@@ -87,14 +213,114 @@ async def discuss_question(request: QuestionRequest):
     Returns detailed discussion with all rounds and final analysis.
     """
     try:
-        discussion = await orchestrator.conduct_discussion(request.question)
+        with call_context(endpoint="discuss"):
+            discussion = await run_until_disconnect(
+                http_request,
+                orchestrator.conduct_discussion(request.question)
+            )
         return discussion
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in board discussion: {str(e)}")
 
-@app.post("/api/advisory-board/quick-discuss", tags=["Advisory Board"])
-async def quick_discuss_question(request: QuestionRequest):
+@app.post("/api/advisory-board/discuss/stream", tags=["Advisory Board"], dependencies=[Depends(ai_rate_limit), Depends(require_budget)])
+async def discuss_question_stream(request: QuestionRequest):
+    """
+    Streaming variant of /api/advisory-board/discuss (Server-Sent Events)
+
+    Events:
+    - phase: a discussion phase is starting
+    - token: a text delta from the agent (or synthesis) currently speaking
+    - message: a finished AgentMessage
+    - final_report: the parsed FinalReport
+    - done: total rounds and duration
+    - converged: adaptive deliberation stopped early
+    - error: the discussion failed
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def emit(event: str, data: Dict[str, Any]):
+        await events.put((event, data))
+
+    async def run():
+        try:
+            with call_context(endpoint="discuss_stream"):
+                await orchestrator.conduct_discussion(request.question, emit=emit)
+        except Exception as e:
+            await events.put(("error", {"detail": f"Error in board discussion: {str(e)}"}))
+        finally:
+            await events.put(None)
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                event, data = item
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            # Client went away before the discussion finished
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/advisory-board/jobs", status_code=202, tags=["Advisory Board"], dependencies=[Depends(ai_rate_limit), Depends(require_budget)])
+async def submit_discussion_job(request: QuestionRequest):
+    """
+    Queue a full board discussion and return immediately
+
+    Poll GET /api/advisory-board/jobs/{job_id} for status, partial rounds
+    and the final discussion.
+    """
+    try:
+        job_id = await discussion_jobs.submit(request.question)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/api/advisory-board/jobs/{job_id}", response_model=DiscussionJob, tags=["Advisory Board"])
+async def get_discussion_job(job_id: str):
+    """Get the status, rounds so far and (when completed) result of a job"""
+    job = await discussion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    return DiscussionJob(job_id=job.pop("id"), **job)
+
+@app.post("/api/advisory-board/batch", tags=["Advisory Board"], dependencies=[Depends(ai_rate_limit), Depends(require_budget)])
+async def discuss_batch(request: Request):
+    """
+    Run full discussions for a JSONL body of questions
+
+    Each body line is {"question": ..., "id": optional}. Results stream back
+    as JSONL in completion order, one {"id", "question", "status",
+    "discussion" | "error"} line per question. Resend only the ids that
+    didn't come back to resume an interrupted batch.
+    """
+    body = (await request.body()).decode("utf-8")
+    try:
+        items = read_questions(body.splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def results():
+        async for result in run_batch(items):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/api/advisory-board/quick-discuss", tags=["Advisory Board"], dependencies=[Depends(ai_rate_limit), Depends(require_budget)])
+async def quick_discuss_question(request: QuestionRequest, http_request: Request):
     """
     Quick discussion mode - single round without deliberation
 
@@ -105,17 +331,15 @@ async def quick_discuss_question(request: QuestionRequest):
         question = request.question
 
         # Run all agents in parallel
-        tasks = [
-            sales_agent.generate_response(question),
-            customer_service_agent.generate_response(question),
-            research_agent.generate_response(question)
-        ]
+        agents = agent_registry.agents()
+        tasks = [ask_agent(agent, question) for agent in agents]
 
-        responses = await asyncio.gather(*tasks)
+        with call_context(endpoint="quick_discuss"):
+            responses = await run_until_disconnect(http_request, asyncio.gather(*tasks))
 
         # Build simple response
         agent_summaries = []
-        for idx, agent in enumerate([sales_agent, customer_service_agent, research_agent]):
+        for idx, agent in enumerate(agents):
             agent_summaries.append({
                 "agent": agent.name,
                 "role": agent.role,
@@ -128,6 +352,8 @@ async def quick_discuss_question(request: QuestionRequest):
             "agents": agent_summaries
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in quick discussion: {str(e)}")
 
@@ -135,24 +361,19 @@ async def quick_discuss_question(request: QuestionRequest):
 async def list_agents():
     """Get list of available agents"""
     return {
-        "agents": [
-            {
-                "id": key,
-                "name": agent.name,
-                "role": agent.role
-            }
-            for key, agent in AGENTS.items()
-        ]
+        "agents": [spec.to_dict() for spec in agent_registry.specs()]
     }
 
-@app.post("/api/agent/{agent_id}/ask", tags=["Agents"])
-async def ask_single_agent(agent_id: str, request: QuestionRequest):
+@app.post("/api/agent/{agent_id}/ask", tags=["Agents"], dependencies=[Depends(ai_rate_limit), Depends(require_budget)])
+async def ask_single_agent(agent_id: str, request: QuestionRequest, http_request: Request):
     """Ask a question to a single agent"""
-    if agent_id not in AGENTS:
+    spec = agent_registry.get(agent_id)
+    if spec is None:
         raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
 
-    agent = AGENTS[agent_id]
-    response = await agent.generate_response(request.question)
+    agent = spec.agent
+    with call_context(endpoint="agent_ask"):
+        response = await run_until_disconnect(http_request, ask_agent(agent, request.question))
 
     return {
         "agent": agent.name,
@@ -162,7 +383,7 @@ async def ask_single_agent(agent_id: str, request: QuestionRequest):
     }
 
 
-@app.post("/api/analyze-report", response_model=AnalysisOutput, tags=["Analysis"])
+@app.post("/api/analyze-report", response_model=AnalysisOutput, tags=["Analysis"], dependencies=[Depends(ai_rate_limit), Depends(require_budget)])
 async def analyze_report(report: ReportInput):
     """Convert the final report JSON into a prioritized action plan."""
 
@@ -187,12 +408,13 @@ async def analyze_report(report: ReportInput):
     ]
 
     try:
-        raw_response = await openai_service.generate_structured_json(
-            messages,
-            response_format={"type": "json_object"},
-            temperature=0.4,
-            max_tokens=800,
-        )
+        with call_context(endpoint="analyze_report"):
+            raw_response = await openai_service.generate_structured_json(
+                messages,
+                response_format={"type": "json_object"},
+                temperature=0.4,
+                max_tokens=800,
+            )
 
         if raw_response.startswith("Error generating response"):
             raise RuntimeError(raw_response)
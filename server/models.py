@@ -13,7 +13,7 @@ class AgentMessage(BaseModel):
     role: str
     message: str
     round_number: int
-    message_type: str  # "research", "initial", "rebuttal", "synthesis"
+    message_type: str  # "research", "initial", "rebuttal", "panel_summary", "panel_debate", "synthesis"
     timestamp: str
 
 class DiscussionRound(BaseModel):
@@ -35,6 +35,16 @@ class BoardDiscussion(BaseModel):
     total_rounds: int
     duration_seconds: Optional[float] = None
 
+class DiscussionJob(BaseModel):
+    job_id: str
+    question: str
+    status: str  # "queued", "running", "completed", "failed"
+    rounds: List[DiscussionRound] = []
+    result: Optional[BoardDiscussion] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
+
 class HealthResponse(BaseModel):
     status: str
     services: Dict[str, str]
@@ -12,23 +12,70 @@ Supports both:
 - Airia orchestration (using Airia pipelines)
 """
 import asyncio
+import hashlib
+import uuid
+from contextvars import ContextVar
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Union, Tuple
 from models import AgentMessage, DiscussionRound, FinalReport, BoardDiscussion
-from agents.sales_agent import sales_agent
-from agents.customer_service_agent import customer_service_agent
-from agents.research_agent import research_agent
+from agents.base_agent import QUESTION_CONTEXT
+from agents.registry import agent_registry
 from services.openai_service import openai_service
 from services.airia_service import airia_service
+from services.call_context import call_context
+from services.usage import usage_meter
+from services.model_router import RESEARCH_SUMMARY, PRESENTATION, DELIBERATION, SYNTHESIS, SUMMARY
+from scheduler import build_turns, run_turns, split_panels, gather_branches, Lockstep, SNAPSHOT
+from context_store import ContextStore
+from transcript import Transcript, TranscriptEntry, CHARS_PER_TOKEN
+from agent_thread import AgentThread
+from compaction import HistoryCompactor
+from answer_cache import SemanticAnswerCache
+from convergence import position_similarity
 from config import settings
 
+# Agent threads may hold this many times the history token budget before compaction
+THREAD_BUDGET_FACTOR = 2
+
+# Receives (event name, JSON-serialisable payload) as the discussion progresses
+EventCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Whether calls made for a discussion stream token deltas to its emit callback.
+# Off for listeners that only want progress, so calls keep the non-streaming
+# path (hedging, single-flight, completion cache, whole-call deadline)
+_stream_tokens: ContextVar[bool] = ContextVar("stream_tokens", default=True)
+
 class DiscussionOrchestrator:
     def __init__(self):
-        self.agents = [sales_agent, customer_service_agent, research_agent]
+        self.agents = agent_registry.agents()
         self.deliberation_rounds = 1
+        # "fixed" runs deliberation_rounds; "adaptive" stops once positions converge
+        self.deliberation_mode = settings.deliberation_mode
+        self.max_deliberation_rounds = settings.max_deliberation_rounds
+        self.convergence_threshold = settings.convergence_threshold
         self.use_airia = settings.use_airia_orchestration
-
-    async def conduct_discussion(self, question: str) -> BoardDiscussion:
+        # "sequential" (each agent sees the previous speaker) or "snapshot" (agents run concurrently)
+        self.turn_policy = settings.discussion_turn_policy
+        # Cap on agent turns in flight at once, so large boards don't burst upstream (None = no cap)
+        self.max_concurrent_turns = settings.max_concurrent_turns or None
+        # "flat" (everyone reads everyone) or "hierarchical" (panels deliberate, then panel leads debate)
+        self.deliberation_topology = settings.deliberation_topology
+        self.panel_size = settings.panel_size
+        # Older rounds are summarized once the rendered history exceeds this many tokens
+        self.history_token_budget = settings.history_token_budget or settings.max_tokens_per_request
+        self.answer_cache = SemanticAnswerCache(
+            threshold=settings.answer_cache_threshold,
+            ttl_seconds=settings.answer_cache_ttl_seconds,
+            max_entries=settings.answer_cache_max_entries
+        ) if settings.answer_cache_enabled else None
+
+    async def conduct_discussion(
+        self,
+        question: str,
+        emit: Optional[EventCallback] = None,
+        lockstep: Optional[Lockstep] = None,
+        stream_tokens: bool = True
+    ) -> BoardDiscussion:
         """
         Conduct a full multi-round advisory board discussion
 
@@ -37,40 +84,133 @@ class DiscussionOrchestrator:
         2. Initial Presentation - Agents present initial positions
         3. Deliberation (3 rounds) - Back-and-forth discussion
         4. Final Synthesis - Comprehensive report
+
+        If emit is given, phase starts, token deltas, finished agent messages
+        and the final report are reported through it as they happen (token
+        deltas only with stream_tokens). With a lockstep, the discussion waits
+        for its peers before every phase.
         """
+        fingerprint = None
+        if self.answer_cache is not None:
+            fingerprint = await self._data_fingerprint()
+            cached = self.answer_cache.lookup(question, fingerprint)
+            if cached is not None:
+                await self._replay(cached, emit)
+                return cached
+
+        # Resolve every agent's context once, in parallel, and share it across phases
+        contexts = ContextStore(question)
+        contexts.prefetch(self.agents)
+        compactor = HistoryCompactor(self.history_token_budget)
+        discussion_id = uuid.uuid4().hex
+        usage_meter.start_discussion(discussion_id, question)
+        streaming = _stream_tokens.set(stream_tokens)
+        try:
+            with call_context(discussion=discussion_id):
+                discussion = await self._run_phases(question, contexts, compactor, emit, lockstep)
+        finally:
+            _stream_tokens.reset(streaming)
+            contexts.close()
+            compactor.close()
+
+        if self.answer_cache is not None and not self._has_errors(discussion):
+            self.answer_cache.store(question, fingerprint, discussion)
+        return discussion
+
+    async def conduct_discussions_batch(self, questions: List[str]) -> List[Union[BoardDiscussion, Exception]]:
+        """
+        Run many discussions through the OpenAI Batch API, phase by phase in lockstep
+
+        Every discussion's calls for a phase land in the same batch job, so a
+        bulk run takes one batch round-trip per phase instead of thousands of
+        interactive calls. Turns run under the snapshot policy so each phase
+        needs a single round-trip.
+
+        Args:
+            questions: Questions to discuss
+
+        Returns:
+            One BoardDiscussion (or the exception it failed with) per question, in order
+        """
+        # A phase's requests go out once every discussion has queued its own or finished
+        lockstep = Lockstep(len(questions), on_idle=openai_service.batch.flush)
+
+        async def discuss(question: str) -> BoardDiscussion:
+            with lockstep.member():
+                return await self.conduct_discussion(question, lockstep=lockstep)
+
+        with openai_service.batch_mode():
+            return await asyncio.gather(*(discuss(q) for q in questions), return_exceptions=True)
+
+    async def _run_phases(
+        self,
+        question: str,
+        contexts: ContextStore,
+        compactor: HistoryCompactor,
+        emit: Optional[EventCallback] = None,
+        lockstep: Optional[Lockstep] = None
+    ) -> BoardDiscussion:
+        """Run research, presentation, deliberation and synthesis in order"""
         start_time = datetime.utcnow()
         all_rounds: List[DiscussionRound] = []
-        discussion_history: List[Dict[str, str]] = []
+        transcript = Transcript()
 
         # PHASE 1: Research Phase
         print("[PHASE 1] Research Phase")
-        research_round = await self._research_phase(question)
+        await self._step(lockstep)
+        await self._emit(emit, "phase", {"phase": "research", "round_number": 0})
+        with call_context(phase="research"):
+            research_round = await self._research_phase(question, contexts, emit)
         all_rounds.append(research_round)
-        self._add_to_history(discussion_history, research_round.messages)
+        transcript.extend(research_round.messages)
 
         # PHASE 2: Initial Presentation
         print("[PHASE 2] Initial Presentations")
-        initial_round = await self._initial_presentation_phase(question, discussion_history)
+        await self._step(lockstep)
+        await self._emit(emit, "phase", {"phase": "initial", "round_number": 1})
+        with call_context(phase="initial"):
+            initial_round = await self._initial_presentation_phase(question, transcript, contexts, compactor, emit)
         all_rounds.append(initial_round)
-        self._add_to_history(discussion_history, initial_round.messages)
+        transcript.extend(initial_round.messages)
 
         # PHASE 3: Deliberation (3 rounds)
         print("[PHASE 3] Deliberation Rounds")
-        for i in range(self.deliberation_rounds):
-            print(f"   Round {i+1}/{self.deliberation_rounds}")
-            delib_round = await self._deliberation_round(
-                question,
-                discussion_history,
-                round_num=i+1
-            )
+        adaptive = self.deliberation_mode == "adaptive"
+        max_rounds = self.max_deliberation_rounds if adaptive else self.deliberation_rounds
+        for i in range(max_rounds):
+            print(f"   Round {i+1}/{max_rounds}")
+            await self._step(lockstep)
+            await self._emit(emit, "phase", {"phase": "deliberation", "round_number": i + 2})
+            with call_context(phase="deliberation"):
+                delib_round = await self._deliberation_round(
+                    question,
+                    transcript,
+                    contexts,
+                    compactor,
+                    round_num=i+1,
+                    emit=emit
+                )
+            previous_round = all_rounds[-1]
             all_rounds.append(delib_round)
-            self._add_to_history(discussion_history, delib_round.messages)
+            transcript.extend(delib_round.messages)
+
+            if adaptive:
+                score = position_similarity(previous_round, delib_round)
+                if score is not None and score >= self.convergence_threshold:
+                    print(f"   Positions converged (similarity {score:.2f}), ending deliberation")
+                    await self._emit(emit, "converged", {"round_number": i + 2, "similarity": score})
+                    break
 
         # PHASE 4: Final Synthesis
         print("[PHASE 4] Final Synthesis")
-        final_report = await self._create_final_report(question, discussion_history)
+        await self._step(lockstep)
+        await self._emit(emit, "phase", {"phase": "synthesis", "round_number": len(all_rounds)})
+        with call_context(phase="synthesis"):
+            final_report = await self._create_final_report(question, transcript, compactor, emit)
+        await self._emit(emit, "final_report", final_report.model_dump())
 
         duration = (datetime.utcnow() - start_time).total_seconds()
+        await self._emit(emit, "done", {"total_rounds": len(all_rounds), "duration_seconds": duration})
 
         return BoardDiscussion(
             question=question,
@@ -80,17 +220,20 @@ class DiscussionOrchestrator:
             duration_seconds=duration
         )
 
-    async def _research_phase(self, question: str) -> DiscussionRound:
+    async def _research_phase(
+        self,
+        question: str,
+        contexts: ContextStore,
+        emit: Optional[EventCallback] = None
+    ) -> DiscussionRound:
         """Phase 1: Each agent conducts research"""
-        messages: List[AgentMessage] = []
+        async def research(turn, earlier: List[AgentMessage]) -> AgentMessage:
+            return await self._agent_research(turn.agent, question, contexts, 0, emit)
 
-        # Research in parallel
-        research_tasks = [
-            self._agent_research(agent, question, 0)
-            for agent in self.agents
-        ]
-        research_messages = await asyncio.gather(*research_tasks)
-        messages.extend(research_messages)
+        # Research in parallel - no agent depends on another
+        messages = await run_turns(
+            build_turns(self.agents, SNAPSHOT), research, self._max_turns()
+        )
 
         return DiscussionRound(
             round_number=0,
@@ -101,21 +244,20 @@ class DiscussionOrchestrator:
     async def _initial_presentation_phase(
         self,
         question: str,
-        history: List[Dict[str, str]]
+        history: Transcript,
+        contexts: ContextStore,
+        compactor: HistoryCompactor,
+        emit: Optional[EventCallback] = None
     ) -> DiscussionRound:
         """Phase 2: Each agent presents their initial case"""
-        messages: List[AgentMessage] = []
+        async def present(turn, earlier: List[AgentMessage]) -> AgentMessage:
+            # Each agent sees the presentations it depends on (previous speakers under "sequential")
+            visible = self._history_with(history, earlier)
+            return await self._agent_initial_case(turn.agent, question, visible, contexts, compactor, 1, emit)
 
-        # Present in sequence - each agent sees previous presentations
-        for agent in self.agents:
-            message = await self._agent_initial_case(agent, question, history, 1)
-            messages.append(message)
-            # Add to history so next agent can see it
-            history.append({
-                "agent": message.agent,
-                "message": message.message,
-                "type": "initial"
-            })
+        messages = await run_turns(
+            build_turns(self.agents, self._turn_policy()), present, self._max_turns()
+        )
 
         return DiscussionRound(
             round_number=1,
@@ -126,27 +268,34 @@ class DiscussionOrchestrator:
     async def _deliberation_round(
         self,
         question: str,
-        history: List[Dict[str, str]],
-        round_num: int
+        history: Transcript,
+        contexts: ContextStore,
+        compactor: HistoryCompactor,
+        round_num: int,
+        emit: Optional[EventCallback] = None
     ) -> DiscussionRound:
         """Phase 3: Deliberation round - agents respond to each other"""
-        messages: List[AgentMessage] = []
+        if self.deliberation_topology == "hierarchical" and len(self.agents) > self.panel_size:
+            return await self._hierarchical_deliberation_round(
+                question, history, contexts, compactor, round_num, emit
+            )
 
-        # Each agent responds based on full discussion history
-        for agent in self.agents:
-            message = await self._agent_deliberation(
-                agent,
+        async def deliberate(turn, earlier: List[AgentMessage]) -> AgentMessage:
+            # Round-start snapshot plus whatever earlier turns this one depends on
+            visible = self._history_with(history, earlier)
+            return await self._agent_deliberation(
+                turn.agent,
                 question,
-                history,
-                round_num + 1  # +1 because round 0 is research, round 1 is initial
+                visible,
+                contexts,
+                compactor,
+                round_num + 1,  # +1 because round 0 is research, round 1 is initial
+                emit
             )
-            messages.append(message)
-            # Add to history for next agent in this round
-            history.append({
-                "agent": message.agent,
-                "message": message.message,
-                "type": "deliberation"
-            })
+
+        messages = await run_turns(
+            build_turns(self.agents, self._turn_policy()), deliberate, self._max_turns()
+        )
 
         return DiscussionRound(
             round_number=round_num + 1,
@@ -154,49 +303,164 @@ class DiscussionOrchestrator:
             messages=messages
         )
 
+    async def _hierarchical_deliberation_round(
+        self,
+        question: str,
+        history: Transcript,
+        contexts: ContextStore,
+        compactor: HistoryCompactor,
+        round_num: int,
+        emit: Optional[EventCallback] = None
+    ) -> DiscussionRound:
+        """
+        Phase 3 for large boards - panels deliberate in parallel, then debate
+
+        Each panel only reads its own members and the top level (panel
+        summaries and the leads' debate), so prompt volume per round grows
+        with panel size instead of board size. Each panel's position is
+        summarized, and the panel leads (first member of each panel) then
+        debate all panel positions, picking up from earlier rounds' debate.
+        """
+        display_round = round_num + 1  # +1 because round 0 is research, round 1 is initial
+        panels = split_panels(self.agents, self.panel_size)
+        slots = asyncio.Semaphore(self._max_turns()) if self._max_turns() else None
+
+        async def panel_round(index: int, panel: List[Any]):
+            panel_history = self._panel_history(history, panel)
+
+            async def deliberate(turn, earlier: List[AgentMessage]) -> AgentMessage:
+                visible = self._history_with(panel_history, earlier)
+                return await self._agent_deliberation(
+                    turn.agent, question, visible, contexts, compactor, display_round, emit,
+                    include_types=["initial", "rebuttal", "panel_summary", "panel_debate"],
+                    scope=f"panel-{index}"
+                )
+
+            messages = await run_turns(
+                build_turns(panel, self._turn_policy()), deliberate, semaphore=slots
+            )
+            summary = await self._panel_summary(index, panel, question, messages, display_round, emit)
+            return messages, summary
+
+        results = await gather_branches(*(
+            panel_round(index, panel) for index, panel in enumerate(panels, 1)
+        ))
+        panel_messages = [message for messages, _ in results for message in messages]
+        summaries = [summary for _, summary in results]
+
+        # Top level: panel leads debate the panel positions, continuing earlier rounds' debate
+        top_history = Transcript()
+        for entry in history.entries(["panel_summary", "panel_debate"]):
+            top_history.append(entry.agent, entry.message, entry.type, entry.round_number)
+        top_history.extend(summaries)
+
+        async def debate(turn, earlier: List[AgentMessage]) -> AgentMessage:
+            visible = self._history_with(top_history, earlier)
+            return await self._agent_deliberation(
+                turn.agent, question, visible, contexts, compactor, display_round, emit,
+                include_types=["panel_summary", "panel_debate"],
+                scope="panel-leads",
+                message_type="panel_debate"
+            )
+
+        leads = [panel[0] for panel in panels]
+        lead_messages = await run_turns(
+            build_turns(leads, self._turn_policy()), debate, semaphore=slots
+        )
+
+        return DiscussionRound(
+            round_number=display_round,
+            round_type="deliberation",
+            messages=panel_messages + summaries + lead_messages
+        )
+
+    async def _panel_summary(
+        self,
+        index: int,
+        panel: List[Any],
+        question: str,
+        messages: List[AgentMessage],
+        round_num: int,
+        emit: Optional[EventCallback] = None
+    ) -> AgentMessage:
+        """Summarize one panel's position for the top-level debate"""
+        names = ", ".join(agent.name for agent in panel)
+        speaker = f"Panel {index} ({names})"
+        statements = "".join(f"\n{m.agent}: {m.message}\n" for m in messages)
+
+        prompt = f"""You are summarizing one panel of a larger advisory board for the rest of the board.
+
+Question: {question}
+
+Panel members: {names}
+
+This round's panel discussion:
+{statements}
+
+Summarize the panel's position in 2-3 sentences: where the members agree, where they disagree, and what they recommend."""
+
+        summary = await self._generate(
+            [{"role": "user", "content": prompt}],
+            SUMMARY,
+            temperature=0.5,
+            max_tokens=150,
+            emit=emit,
+            speaker=speaker,
+            round_num=round_num
+        )
+
+        message = AgentMessage(
+            agent=speaker,
+            role="Panel summary",
+            message=summary,
+            round_number=round_num,
+            message_type="panel_summary",
+            timestamp=datetime.utcnow().isoformat()
+        )
+        await self._emit(emit, "message", message.model_dump())
+        return message
+
     async def _agent_research(
         self,
         agent,
         question: str,
-        round_num: int
+        contexts: ContextStore,
+        round_num: int,
+        emit: Optional[EventCallback] = None
     ) -> AgentMessage:
         """Agent conducts research (gathers context)"""
-        # Check if get_context accepts a question parameter
-        import inspect
-        sig = inspect.signature(agent.get_context)
-        if len(sig.parameters) > 0:
-            # Research agent - takes question
-            context = await agent.get_context(question)
-        else:
-            # Sales/CS agents - no parameters
-            context = await agent.get_context()
-
-        # Use Airia if enabled
-        if self.use_airia:
-            agent_type = self._get_agent_type(agent)
+        context = await contexts.get(agent)
+        thread = await contexts.thread(agent)
+        research_prompt = """Research phase: you are conducting preliminary research for the discussion.
+
+Provide a brief summary (2-3 sentences) of the key insights you've discovered from your research that are relevant to this question."""
+
+        # Use Airia if enabled, falling back to OpenAI while Airia is failing
+        research_summary = None
+        if self.use_airia and airia_service.available():
+            spec = agent_registry.for_agent(agent)
             research_summary = await airia_service.execute_agent(
-                agent_type=agent_type,
+                agent_type=spec.key if spec else agent.name,
                 question=f"Conduct research: {question}",
                 context=context,
-                previous_messages=None
+                previous_messages=None,
+                pipeline_id=spec.airia_pipeline_id if spec else None
             )
-        else:
-            research_prompt = f"""You are {agent.name}, conducting preliminary research for an advisory board discussion.
-
-Question: {question}
-
-Your available data:
-{context}
-
-Provide a brief summary (2-3 sentences) of the key insights you've discovered from your research that are relevant to this question."""
-
-            research_summary = await openai_service.generate_response(
-                messages=[{"role": "user", "content": research_prompt}],
+            if research_summary.startswith("Error executing"):
+                print(f"⚠️  Airia research failed for {agent.name}, falling back to OpenAI")
+                research_summary = None
+        if research_summary is None:
+            research_summary = await self._generate(
+                thread.messages(research_prompt),
+                RESEARCH_SUMMARY,
                 temperature=0.7,
-                max_tokens=100
+                emit=emit,
+                speaker=agent.name,
+                round_num=round_num
             )
+        self._commit_turn(thread, research_prompt, research_summary)
 
-        return AgentMessage(
+        message = AgentMessage(
             agent=agent.name,
             role=agent.role,
             message=research_summary,
@@ -204,35 +468,27 @@ Provide a brief summary (2-3 sentences) of the key insights you've discovered fr
             message_type="research",
             timestamp=datetime.utcnow().isoformat()
         )
+        await self._emit(emit, "message", message.model_dump())
+        return message
 
     async def _agent_initial_case(
         self,
         agent,
         question: str,
-        history: List[Dict[str, str]],
-        round_num: int
+        history: Transcript,
+        contexts: ContextStore,
+        compactor: HistoryCompactor,
+        round_num: int,
+        emit: Optional[EventCallback] = None
     ) -> AgentMessage:
         """Agent presents their initial case/position"""
-        # Check if get_context accepts a question parameter
-        import inspect
-        sig = inspect.signature(agent.get_context)
-        if len(sig.parameters) > 0:
-            context = await agent.get_context(question)
-        else:
-            context = await agent.get_context()
-
-        # Build context from previous messages
-        previous_statements = self._format_history(history, ["research", "initial"])
-
-        prompt = f"""You are {agent.name}, {agent.role}, presenting your initial position at an advisory board meeting.
-
-Question: {question}
-
-Your data and research:
-{context}
+        thread = await contexts.thread(agent)
 
-{previous_statements}
+        # Only the research and presentations this agent hasn't heard yet
+        statements, shown = await self._new_statements(thread, history, ["research", "initial"], compactor)
 
+        prompt = f"""Initial presentations.
+{statements}
 Present your initial position on this question. Include:
 - Your key findings and data points
 - Your perspective based on your role
@@ -241,13 +497,17 @@ Present your initial position on this question. Include:
 
 Be clear, data-driven, and assertive in your position."""
 
-        initial_case = await openai_service.generate_response(
-            messages=[{"role": "user", "content": prompt}],
+        initial_case = await self._generate(
+            thread.messages(prompt),
+            PRESENTATION,
             temperature=0.8,
-            max_tokens=200
+            emit=emit,
+            speaker=agent.name,
+            round_num=round_num
         )
+        self._commit_turn(thread, prompt, initial_case, shown)
 
-        return AgentMessage(
+        message = AgentMessage(
             agent=agent.name,
             role=agent.role,
             message=initial_case,
@@ -255,35 +515,31 @@ Be clear, data-driven, and assertive in your position."""
             message_type="initial",
             timestamp=datetime.utcnow().isoformat()
         )
+        await self._emit(emit, "message", message.model_dump())
+        return message
 
     async def _agent_deliberation(
         self,
         agent,
         question: str,
-        history: List[Dict[str, str]],
-        round_num: int
+        history: Transcript,
+        contexts: ContextStore,
+        compactor: HistoryCompactor,
+        round_num: int,
+        emit: Optional[EventCallback] = None,
+        include_types: Optional[List[str]] = None,
+        scope: str = "",
+        message_type: str = "rebuttal"
     ) -> AgentMessage:
         """Agent participates in deliberation round"""
-        # Check if get_context accepts a question parameter
-        import inspect
-        sig = inspect.signature(agent.get_context)
-        if len(sig.parameters) > 0:
-            context = await agent.get_context(question)
-        else:
-            context = await agent.get_context()
+        thread = await contexts.thread(agent)
 
-        discussion = self._format_history(history, ["initial", "deliberation"])
-
-        prompt = f"""You are {agent.name}, {agent.role}, participating in round {round_num - 1} of deliberations.
-
-Question: {question}
-
-Your data:
-{context}
-
-Discussion so far:
-{discussion}
+        statements, shown = await self._new_statements(
+            thread, history, include_types or ["initial", "rebuttal"], compactor, scope
+        )
 
+        prompt = f"""Deliberation round {round_num - 1}.
+{statements}
 Respond to the other advisors. You should:
 - Address specific points raised by others
 - Challenge assumptions if needed
@@ -293,28 +549,42 @@ Respond to the other advisors. You should:
 
 Be direct, collegial, and focused on finding the best solution."""
 
-        deliberation = await openai_service.generate_response(
-            messages=[{"role": "user", "content": prompt}],
+        deliberation = await self._generate(
+            thread.messages(prompt),
+            DELIBERATION,
             temperature=0.9,
-            max_tokens=150
+            emit=emit,
+            speaker=agent.name,
+            round_num=round_num
         )
+        self._commit_turn(thread, prompt, deliberation, shown)
 
-        return AgentMessage(
+        message = AgentMessage(
             agent=agent.name,
             role=agent.role,
             message=deliberation,
             round_number=round_num,
-            message_type="rebuttal",
+            message_type=message_type,
             timestamp=datetime.utcnow().isoformat()
         )
+        await self._emit(emit, "message", message.model_dump())
+        return message
 
     async def _create_final_report(
         self,
         question: str,
-        history: List[Dict[str, str]]
+        history: Transcript,
+        compactor: HistoryCompactor,
+        emit: Optional[EventCallback] = None
     ) -> FinalReport:
         """Create comprehensive final synthesis report"""
-        full_discussion = self._format_history(history, ["research", "initial", "deliberation"])
+        full_discussion = await compactor.render(
+            history, ["research", "initial", "rebuttal", "panel_summary", "panel_debate"]
+        )
+        position_lines = "\n\n".join(
+            f"**{agent.name}'s Final Position**: [One sentence that captures their ultimate conclusion/recommendation based on their expertise and the full discussion]"
+            for agent in self.agents
+        )
 
         synthesis_prompt = f"""You are an executive synthesizing an advisory board discussion into a clear, actionable report.
 
@@ -328,11 +598,7 @@ Create a comprehensive final report that captures the essence of the discussion.
 ## Agent Perspectives
 First, synthesize each director's final position into ONE clear, impactful sentence that captures their core argument or perspective:
 
-**Sales Director's Final Position**: [One sentence that captures their ultimate conclusion/recommendation based on their expertise and the full discussion]
-
-**Customer Success Director's Final Position**: [One sentence that captures their ultimate conclusion/recommendation based on their expertise and the full discussion]
-
-**Research Director's Final Position**: [One sentence that captures their ultimate conclusion/recommendation based on their expertise and the full discussion]
+{position_lines}
 
 ## Executive Summary
 Write 2-3 compelling paragraphs that capture the essence of the discussion. Focus on how the different perspectives came together or diverged.
@@ -352,10 +618,13 @@ Provide 3-5 specific, actionable recommendations that synthesize the different p
 
 Write this as a flowing, readable document - NOT as JSON. Use markdown formatting for headers and emphasis where appropriate."""
 
-        report_text = await openai_service.generate_response(
-            messages=[{"role": "user", "content": synthesis_prompt}],
+        report_text = await self._generate(
+            [{"role": "user", "content": synthesis_prompt}],
+            SYNTHESIS,
             temperature=0.7,
-            max_tokens=1500
+            # 1500 for the original three seats, plus room for each extra perspective
+            max_tokens=1200 + 100 * len(self.agents),
+            emit=emit
         )
 
         # Parse the markdown-formatted report into structured sections
@@ -372,16 +641,16 @@ Write this as a flowing, readable document - NOT as JSON. Use markdown formattin
         if perspectives_match:
             perspectives_text = perspectives_match.group(1).strip()
             # More forgiving regex that looks for anything between the position marker and the next double asterisk or section
-            sales_match = re.search(r'\*\*Sales Director\'s Final Position\*\*:?\s*([^*]+?)(?=\n\s*\*\*|$)', perspectives_text, re.DOTALL)
-            cs_match = re.search(r'\*\*Customer Success Director\'s Final Position\*\*:?\s*([^*]+?)(?=\n\s*\*\*|$)', perspectives_text, re.DOTALL)
-            research_match = re.search(r'\*\*Research Director\'s Final Position\*\*:?\s*([^*]+?)(?=\n\s*\*\*|$)', perspectives_text, re.DOTALL)
-            
-            # Clean up the matched text
-            agent_perspectives = {
-                "Sales Director": sales_match.group(1).strip().strip('[]') if sales_match else "Processing response...",
-                "Customer Success Director": cs_match.group(1).strip().strip('[]') if cs_match else "Processing response...",
-                "Research Director": research_match.group(1).strip().strip('[]') if research_match else "Processing response..."
-            }
+            for agent in self.agents:
+                position_match = re.search(
+                    r'\*\*' + re.escape(agent.name) + r'\'s Final Position\*\*:?\s*([^*]+?)(?=\n\s*\*\*|$)',
+                    perspectives_text,
+                    re.DOTALL
+                )
+                # Clean up the matched text
+                agent_perspectives[agent.name] = (
+                    position_match.group(1).strip().strip('[]') if position_match else "Processing response..."
+                )
 
         # Extract key points as list items
         key_points = []
@@ -406,40 +675,154 @@ Write this as a flowing, readable document - NOT as JSON. Use markdown formattin
             agent_perspectives=agent_perspectives
         )
 
-    def _format_history(
+    async def _generate(
         self,
-        history: List[Dict[str, str]],
-        include_types: List[str]
+        messages: List[Dict[str, str]],
+        task: str,
+        temperature: float,
+        max_tokens: Optional[int] = None,
+        emit: Optional[EventCallback] = None,
+        speaker: Optional[str] = None,
+        round_num: Optional[int] = None
     ) -> str:
-        """Format discussion history for context"""
-        formatted = ""
-        for entry in history:
-            if entry.get("type") in include_types:
-                formatted += f"\n{entry['agent']}: {entry['message']}\n"
-        return formatted if formatted else "No previous discussion."
-
-    def _add_to_history(
+        """Generate a completion on the task class's route, streaming token deltas through emit when given"""
+        with call_context(agent=speaker or "board"):
+            if emit is None or not _stream_tokens.get():
+                return await openai_service.generate_response(
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    task=task
+                )
+
+            chunks: List[str] = []
+            async for delta in openai_service.generate_response_stream(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                task=task
+            ):
+                chunks.append(delta)
+                await emit("token", {
+                    "agent": speaker,
+                    "round_number": round_num,
+                    "delta": delta
+                })
+            return "".join(chunks)
+
+    async def _new_statements(
         self,
-        history: List[Dict[str, str]],
-        messages: List[AgentMessage]
+        thread: AgentThread,
+        history: Transcript,
+        include_types: List[str],
+        compactor: HistoryCompactor,
+        scope: str = ""
+    ) -> Tuple[str, List[TranscriptEntry]]:
+        """
+        Prompt text for what an agent hasn't heard yet, and the entries it covers
+
+        Normally only statements made since the agent's last turn, so the
+        thread stays a cacheable prefix. A thread may grow to twice the history
+        budget, since most of it is served from the prompt cache; beyond that
+        it is reset and the compacted discussion (within budget) is sent instead.
+        """
+        shown = thread.unseen(history, include_types)
+        text = "".join(entry.text for entry in shown)
+        new_tokens = len(text) // CHARS_PER_TOKEN
+        thread_budget = THREAD_BUDGET_FACTOR * self.history_token_budget
+        if thread_budget and thread.history_token_estimate + new_tokens > thread_budget:
+            thread.reset()
+            discussion = await compactor.render(history, include_types, scope)
+            return f"\nDiscussion so far:\n{discussion}\n", thread.unseen(history, include_types)
+        if not shown:
+            return "", shown
+        return f"\nNew statements from the other advisors:\n{text}\n", shown
+
+    def _commit_turn(
+        self,
+        thread: AgentThread,
+        prompt: str,
+        reply: str,
+        shown: Optional[List[TranscriptEntry]] = None
     ):
-        """Add messages to discussion history"""
-        for msg in messages:
-            history.append({
-                "agent": msg.agent,
-                "message": msg.message,
-                "type": msg.message_type
-            })
+        """Keep a turn in the agent's thread, unless the call failed (it will be covered again next turn)"""
+        if not reply.startswith(("Error generating response", "Error executing")):
+            thread.commit(prompt, reply, shown or ())
+
+    async def _step(self, lockstep: Optional[Lockstep]):
+        if lockstep is not None:
+            await lockstep.step()
+
+    def _turn_policy(self) -> str:
+        # Dependent turns would each cost a batch round-trip
+        return SNAPSHOT if openai_service.in_batch_mode() else self.turn_policy
+
+    def _max_turns(self) -> Optional[int]:
+        # Batched turns don't burst upstream, and turns held back would each cost a round-trip
+        return None if openai_service.in_batch_mode() else self.max_concurrent_turns
 
-    def _get_agent_type(self, agent) -> str:
-        """Get agent type identifier for Airia"""
-        if agent.name == "Sales Director":
-            return "sales"
-        elif agent.name == "Customer Success Director":
-            return "cs"
-        elif agent.name == "Research Director":
-            return "research"
-        return "unknown"
+    async def _emit(
+        self,
+        emit: Optional[EventCallback],
+        event: str,
+        data: Dict[str, Any]
+    ):
+        """Report a discussion event if anyone is listening"""
+        if emit is not None:
+            await emit(event, data)
+
+    async def _data_fingerprint(self) -> str:
+        """Fingerprint of the board setup and every question-independent data context"""
+        digest = hashlib.sha256()
+        digest.update(f"{self.deliberation_mode}|{self.deliberation_rounds}|{self.max_deliberation_rounds}|{self.turn_policy}".encode())
+        for agent in self.agents:
+            digest.update(agent.name.encode())
+            if QUESTION_CONTEXT not in agent.capabilities:
+                digest.update((await agent.get_context()).encode())
+        return digest.hexdigest()
+
+    async def _replay(self, discussion: BoardDiscussion, emit: Optional[EventCallback]):
+        """Report a cached discussion through emit as if it had just run"""
+        for discussion_round in discussion.rounds:
+            await self._emit(emit, "phase", {
+                "phase": discussion_round.round_type,
+                "round_number": discussion_round.round_number
+            })
+            for message in discussion_round.messages:
+                await self._emit(emit, "message", message.model_dump())
+        if discussion.final_report is not None:
+            await self._emit(emit, "final_report", discussion.final_report.model_dump())
+        await self._emit(emit, "done", {
+            "total_rounds": discussion.total_rounds,
+            "duration_seconds": discussion.duration_seconds,
+            "cached": True
+        })
+
+    def _has_errors(self, discussion: BoardDiscussion) -> bool:
+        """Whether any upstream call failed during the discussion (not worth caching)"""
+        texts = [m.message for r in discussion.rounds for m in r.messages]
+        if discussion.final_report is not None:
+            texts.append(discussion.final_report.summary)
+        return any(text.startswith(("Error generating response", "Error executing")) for text in texts)
+
+    def _panel_history(self, history: Transcript, panel: List[Any]) -> Transcript:
+        """History as one panel sees it - its own members plus the top level (summaries and debate)"""
+        names = {agent.name for agent in panel}
+        panel_history = Transcript()
+        for entry in history.entries(["initial", "rebuttal", "panel_summary", "panel_debate"]):
+            if entry.agent in names or entry.type in ("panel_summary", "panel_debate"):
+                panel_history.append(entry.agent, entry.message, entry.type, entry.round_number)
+        return panel_history
+
+    def _history_with(
+        self,
+        history: Transcript,
+        messages: List[AgentMessage]
+    ) -> Transcript:
+        """Snapshot of the history with this round's visible messages appended"""
+        visible = history.fork()
+        visible.extend(messages)
+        return visible
 
 # Global orchestrator instance
 orchestrator = DiscussionOrchestrator()
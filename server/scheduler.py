@@ -0,0 +1,297 @@
+"""
+Turn Scheduler - Runs agent turns as a dependency graph
+
+Each turn declares which earlier turns (in the same round) it depends on.
+A turn starts as soon as its dependencies have finished, so independent
+turns run concurrently while dependent ones still see what they need.
+
+Policies:
+- sequential: each agent depends on the previous speaker (original behaviour)
+- snapshot: every agent only sees the round-start snapshot, all run at once
+
+Large boards can also be split into panels (see split_panels) that each run
+their own round of turns in parallel, and many discussions can be kept in
+lockstep (see Lockstep) so each phase's calls can be batched together.
+"""
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator, List, Optional
+
+SEQUENTIAL = "sequential"
+SNAPSHOT = "snapshot"
+POLICIES = (SEQUENTIAL, SNAPSHOT)
+
+
+@dataclass
+class AgentTurn:
+    agent: Any
+    index: int
+    depends_on: List[int] = field(default_factory=list)
+
+
+def build_turns(agents: List[Any], policy: str = SEQUENTIAL) -> List[AgentTurn]:
+    """
+    Build the turn graph for one round
+
+    Args:
+        agents: Agents speaking in this round, in speaking order
+        policy: "sequential" or "snapshot"
+
+    Returns:
+        List of turns with their dependencies
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown turn policy: {policy}")
+
+    turns = []
+    for idx, agent in enumerate(agents):
+        depends_on = [idx - 1] if policy == SEQUENTIAL and idx > 0 else []
+        turns.append(AgentTurn(agent=agent, index=idx, depends_on=depends_on))
+    return turns
+
+
+def split_panels(agents: List[Any], panel_size: int) -> List[List[Any]]:
+    """Split agents into consecutive panels of at most panel_size, balanced in size"""
+    if panel_size < 1:
+        raise ValueError("panel_size must be at least 1")
+    count = -(-len(agents) // panel_size)  # ceil
+    base, extra = divmod(len(agents), count) if count else (0, 0)
+    panels, start = [], 0
+    for idx in range(count):
+        size = base + (1 if idx < extra else 0)
+        panels.append(agents[start:start + size])
+        start += size
+    return panels
+
+
+class Lockstep:
+    """
+    Reusable barrier keeping several discussions on the same step
+
+    Each discussion runs inside member() and calls step() before every phase
+    (and deliberation round). A discussion that finishes early leaves, so it
+    never holds the others back.
+
+    The lockstep also counts its members' running work: each discussion, or
+    each of its turns while they run in parallel (see fork()). Work waiting at
+    the barrier or parked on a shared queue (see park()) isn't running. Once
+    nothing is running, on_idle is called, so a queue such as the Batch API
+    collector can send the phase's requests without waiting for a debounce.
+    """
+
+    def __init__(self, parties: int, on_idle: Optional[Callable[[], None]] = None):
+        self.parties = parties
+        self.on_idle = on_idle
+        self.running = parties
+        self._arrived = 0
+        self._released = asyncio.Event()
+
+    @contextmanager
+    def member(self) -> Iterator[None]:
+        """Run one discussion as a member: work started inside is counted, and it leaves at the end"""
+        token = _lockstep.set(self)
+        try:
+            yield
+        finally:
+            _lockstep.reset(token)
+            self.leave()
+
+    async def step(self):
+        released = self._released
+        self._arrived += 1
+        self.running -= 1
+        if self._arrived >= self.parties:
+            self._release()
+        else:
+            self._check_idle()
+        try:
+            await released.wait()
+        except asyncio.CancelledError:
+            if not released.is_set():
+                self._arrived -= 1
+                self.running += 1
+            raise
+
+    def leave(self):
+        self.parties -= 1
+        self.running -= 1
+        if self._arrived and self._arrived >= self.parties:
+            self._release()
+        else:
+            self._check_idle()
+
+    def park(self):
+        """The calling work now waits on a shared queue; counted again by resume()"""
+        self.running -= 1
+        self._check_idle()
+
+    def resume(self):
+        """Count parked work as running again (call when its result is delivered, before it wakes)"""
+        self.running += 1
+
+    def fork(self, branches: int) -> Callable[[], None]:
+        """
+        Count work splitting into branches that run in parallel
+
+        The caller waits for the branches, so it stops counting and each
+        branch counts instead. Returns a callback for each branch to call when
+        it ends; the last one hands its count back to the caller.
+        """
+        self.running += branches - 1
+        remaining = [branches]
+
+        def branch_done():
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                self.running -= 1
+                self._check_idle()
+
+        return branch_done
+
+    def _check_idle(self):
+        if self.running <= 0 and self.on_idle is not None:
+            self.on_idle()
+
+    def _release(self):
+        # Everyone released is running again before any of them wakes up
+        self.running += self._arrived
+        self._released.set()
+        self._released = asyncio.Event()
+        self._arrived = 0
+
+
+# Lockstep of the discussion the current task belongs to, if any
+_lockstep: ContextVar[Optional[Lockstep]] = ContextVar("lockstep", default=None)
+
+
+def current_lockstep() -> Optional[Lockstep]:
+    return _lockstep.get()
+
+
+class SharedWork:
+    """
+    A task several turns may wait on (e.g. a history summary)
+
+    Inside a lockstep member, the task counts as running work of its own and
+    its waiters are parked until it finishes. Waiting is shielded, so one
+    cancelled waiter doesn't cancel the work for the others.
+    """
+
+    def __init__(self, coro: Awaitable[Any]):
+        self._lockstep = _lockstep.get()
+        self._waiting = 0
+        if self._lockstep is not None:
+            self._lockstep.resume()
+        self.task = asyncio.ensure_future(self._run(coro))
+
+    async def _run(self, coro: Awaitable[Any]) -> Any:
+        try:
+            return await coro
+        finally:
+            if self._lockstep is not None:
+                # Waiters count as running again before any of them wakes, then this work stops counting
+                self._lockstep.running += self._waiting
+                self._waiting = 0
+                self._lockstep.park()
+
+    async def wait(self) -> Any:
+        lockstep = self._lockstep
+        if lockstep is None or self.task.done():
+            return await asyncio.shield(self.task)
+        self._waiting += 1
+        lockstep.park()
+        try:
+            return await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            if not self.task.done():
+                self._waiting -= 1
+                lockstep.resume()
+            raise
+
+    def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+
+
+async def gather_branches(*aws: Awaitable[Any]) -> List[Any]:
+    """asyncio.gather for work that runs in parallel inside a lockstep member"""
+    lockstep = _lockstep.get()
+    if lockstep is None or not aws:
+        return await asyncio.gather(*aws)
+    branch_done = lockstep.fork(len(aws))
+
+    async def branch(aw: Awaitable[Any]) -> Any:
+        try:
+            return await aw
+        finally:
+            branch_done()
+
+    return await asyncio.gather(*(branch(aw) for aw in aws))
+
+
+def _visible_turns(turns: List[AgentTurn]) -> List[List[int]]:
+    """Resolve each turn's dependencies transitively, in speaking order"""
+    visible: List[List[int]] = []
+    for turn in turns:
+        seen = set()
+        for dep in turn.depends_on:
+            if not 0 <= dep < turn.index:
+                raise ValueError(f"Turn {turn.index} cannot depend on turn {dep}")
+            seen.add(dep)
+            seen.update(visible[dep])
+        visible.append(sorted(seen))
+    return visible
+
+
+async def run_turns(
+    turns: List[AgentTurn],
+    run_turn: Callable[[AgentTurn, List[Any]], Awaitable[Any]],
+    max_concurrency: Optional[int] = None,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> List[Any]:
+    """
+    Run a round of turns, respecting their dependencies
+
+    Args:
+        turns: Turns built by build_turns (or by hand)
+        run_turn: Coroutine called with the turn and the results of every
+            turn it can see (its dependencies, transitively)
+        max_concurrency: Optional cap on turns running at the same time
+        semaphore: Shared cap instead of max_concurrency, e.g. across parallel panels
+
+    Returns:
+        Turn results in speaking order
+    """
+    visible = _visible_turns(turns)
+    if semaphore is None and max_concurrency:
+        semaphore = asyncio.Semaphore(max_concurrency)
+    tasks: List[asyncio.Task] = []
+    lockstep = _lockstep.get()
+    # Turns waiting on dependencies or the semaphore still count as running
+    branch_done = lockstep.fork(len(turns)) if lockstep is not None and turns else None
+
+    async def _run(turn: AgentTurn):
+        try:
+            if turn.depends_on:
+                await asyncio.gather(*(tasks[dep] for dep in turn.depends_on))
+            earlier = [tasks[dep].result() for dep in visible[turn.index]]
+            if semaphore is None:
+                return await run_turn(turn, earlier)
+            async with semaphore:
+                return await run_turn(turn, earlier)
+        finally:
+            if branch_done is not None:
+                branch_done()
+
+    for turn in turns:
+        tasks.append(asyncio.create_task(_run(turn)))
+
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        # A failed or cancelled round must not leave turns running
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -5,6 +5,9 @@ Airia v2 API - Uses PipelineExecution endpoints
 import httpx
 from typing import List, Dict, Any, Optional
 from config import settings
+from services.http_pool import http_pool
+from services.rate_limiter import airia_limiter
+from services.resilience import airia_upstream, CircuitOpenError
 
 class AiriaService:
     def __init__(self):
@@ -14,11 +17,22 @@ class AiriaService:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        # Shared keep-alive connection pool, opened/closed by the app lifespan
+        self.http = http_pool.register("airia", self.base_url, self.headers)
+        self.limiter = airia_limiter
+        self.upstream = airia_upstream
         # Agent pipeline IDs
         self.sales_agent_id = settings.airia_sales_agent_id
         self.cs_agent_id = settings.airia_cs_agent_id
         self.research_agent_id = settings.airia_research_agent_id
 
+    async def _post(self, path: str, **kwargs) -> httpx.Response:
+        """One rate-limited POST attempt; HTTP errors are raised so they can be retried"""
+        async with self.limiter.slot():
+            response = await self.http.post(path, **kwargs)
+            response.raise_for_status()
+        return response
+
     async def create_agent(self, name: str, role: str, instructions: str) -> Dict[str, Any]:
         """
         Create an agent in Airia
@@ -31,11 +45,11 @@ class AiriaService:
         Returns:
             Created agent details
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/agents",
-                    headers=self.headers,
+        try:
+            # Not retried: a timed-out create may still have succeeded
+            async with self.upstream.guard():
+                response = await self._post(
+                    "/agents",
                     json={
                         "name": name,
                         "role": role,
@@ -43,11 +57,10 @@ class AiriaService:
                     },
                     timeout=30.0
                 )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                print(f"Airia API error creating agent: {e}")
-                return {"error": str(e)}
+            return response.json()
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            print(f"Airia API error creating agent: {e}")
+            return {"error": str(e)}
 
     async def orchestrate_discussion(
         self,
@@ -66,24 +79,21 @@ class AiriaService:
         Returns:
             Orchestrated discussion results
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/orchestrate",
-                    headers=self.headers,
-                    json={
-                        "question": question,
-                        "agents": agents,
-                        "context": context or {},
-                        "mode": "sequential"  # Can be "sequential" or "parallel"
-                    },
-                    timeout=60.0
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                print(f"Airia API error orchestrating discussion: {e}")
-                return {"error": str(e)}
+        try:
+            response = await self.upstream.run(lambda: self._post(
+                "/orchestrate",
+                json={
+                    "question": question,
+                    "agents": agents,
+                    "context": context or {},
+                    "mode": "sequential"  # Can be "sequential" or "parallel"
+                },
+                timeout=60.0
+            ))
+            return response.json()
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            print(f"Airia API error orchestrating discussion: {e}")
+            return {"error": str(e)}
 
     async def run_workflow(
         self,
@@ -100,19 +110,16 @@ class AiriaService:
         Returns:
             Workflow execution results
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/workflows/{workflow_id}/run",
-                    headers=self.headers,
-                    json=inputs,
-                    timeout=60.0
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                print(f"Airia API error running workflow: {e}")
-                return {"error": str(e)}
+        try:
+            response = await self.upstream.run(lambda: self._post(
+                f"/workflows/{workflow_id}/run",
+                json=inputs,
+                timeout=60.0
+            ))
+            return response.json()
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            print(f"Airia API error running workflow: {e}")
+            return {"error": str(e)}
 
     async def coordinate_agents(
         self,
@@ -129,25 +136,26 @@ class AiriaService:
         Returns:
             Synthesized coordination response
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/coordinate",
-                    headers=self.headers,
-                    json={
-                        "question": question,
-                        "responses": agent_responses,
-                        "mode": "synthesize"
-                    },
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                result = response.json()
-                return result.get("synthesis", "")
-            except httpx.HTTPError as e:
-                print(f"Airia API error coordinating: {e}")
-                # Fallback to simple synthesis if Airia fails
-                return self._fallback_synthesis(agent_responses)
+        try:
+            response = await self.upstream.run(lambda: self._post(
+                "/coordinate",
+                json={
+                    "question": question,
+                    "responses": agent_responses,
+                    "mode": "synthesize"
+                },
+                timeout=30.0
+            ))
+            result = response.json()
+            return result.get("synthesis", "")
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            print(f"Airia API error coordinating: {e}")
+            # Fallback to simple synthesis if Airia fails
+            return self._fallback_synthesis(agent_responses)
+
+    def available(self) -> bool:
+        """False while the Airia circuit breaker is open"""
+        return self.upstream.breaker.allows()
 
     def _fallback_synthesis(self, agent_responses: List[Dict[str, str]]) -> str:
         """Fallback synthesis when Airia is unavailable"""
@@ -171,37 +179,36 @@ class AiriaService:
         Returns:
             Pipeline execution result
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/PipelineExecution/{pipeline_id}",
-                    headers=self.headers,
-                    json=input_data,
-                    timeout=60.0
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                print(f"Airia Pipeline execution error: {e}")
-                if hasattr(e, 'response') and e.response is not None:
-                    print(f"Response: {e.response.text}")
-                return {"error": str(e)}
+        try:
+            response = await self.upstream.run(lambda: self._post(
+                f"/PipelineExecution/{pipeline_id}",
+                json=input_data,
+                timeout=60.0
+            ))
+            return response.json()
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            print(f"Airia Pipeline execution error: {e}")
+            if hasattr(e, 'response') and e.response is not None:
+                print(f"Response: {e.response.text}")
+            return {"error": str(e)}
 
     async def execute_agent(
         self,
         agent_type: str,
         question: str,
         context: str,
-        previous_messages: Optional[List[Dict[str, str]]] = None
+        previous_messages: Optional[List[Dict[str, str]]] = None,
+        pipeline_id: Optional[str] = None
     ) -> str:
         """
         Execute a specific agent pipeline
 
         Args:
-            agent_type: "sales", "cs", or "research"
+            agent_type: Registry key such as "sales", "customer_service" or "research"
             question: The question to ask
             context: Context/data for the agent
             previous_messages: Previous discussion messages
+            pipeline_id: Pipeline GUID (from the agent registry); looked up by agent_type if omitted
 
         Returns:
             Agent's response
@@ -210,10 +217,11 @@ class AiriaService:
         pipeline_map = {
             "sales": self.sales_agent_id,
             "cs": self.cs_agent_id,
+            "customer_service": self.cs_agent_id,
             "research": self.research_agent_id
         }
 
-        pipeline_id = pipeline_map.get(agent_type)
+        pipeline_id = pipeline_id or pipeline_map.get(agent_type)
         if not pipeline_id:
             return f"Error: Unknown agent type {agent_type}"
 
@@ -0,0 +1,27 @@
+"""
+Call context - labels describing where an upstream call comes from
+
+API routes set the endpoint and the orchestrator sets the discussion phase.
+Services read the labels to decide per-endpoint behaviour (such as completion
+caching) without every agent and helper having to pass them along. Labels
+follow asyncio tasks, so turns scheduled inside a phase inherit it.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator
+
+_labels: ContextVar[Dict[str, str]] = ContextVar("call_labels", default={})
+
+
+@contextmanager
+def call_context(**labels: str) -> Iterator[None]:
+    """Add labels (e.g. endpoint="quick_discuss", phase="research") for calls made inside the block"""
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels() -> Dict[str, str]:
+    return _labels.get()
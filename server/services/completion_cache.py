@@ -0,0 +1,119 @@
+"""
+Completion Cache - Reuses OpenAI completions for identical requests
+
+Entries are keyed by a SHA-256 fingerprint of the model, messages,
+temperature, max_tokens and response_format, so any change to the prompt is
+a miss. Recently used entries are kept in an in-memory LRU in front of a
+SQLite table, which lets cached completions survive restarts. Entries expire
+after a TTL in both tiers.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, Optional, Tuple
+
+KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format")
+
+
+def completion_key(params: Dict[str, Any]) -> str:
+    """Fingerprint of the request fields that determine a completion"""
+    payload = json.dumps({field: params.get(field) for field in KEY_FIELDS}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    def __init__(self, path: str, ttl_seconds: float, max_memory_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        # Key -> (stored at, unix time; completion text), least recently used first
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def _init_db(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_created_at ON completions (created_at)")
+
+    def _count(self, endpoint: str, outcome: str):
+        counts = self.stats.setdefault(endpoint, {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+    async def get(self, key: str, endpoint: str) -> Optional[str]:
+        """
+        Look up a completion
+
+        Args:
+            key: Fingerprint from completion_key
+            endpoint: Endpoint label the hit/miss is counted under
+
+        Returns:
+            The cached completion text, or None
+        """
+        cutoff = time.time() - self.ttl_seconds
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] >= cutoff:
+                self._memory.move_to_end(key)
+                self._count(endpoint, "memory_hits")
+                return entry[1]
+            del self._memory[key]
+
+        row = await asyncio.to_thread(self._load, key, cutoff)
+        if row is None:
+            self._count(endpoint, "misses")
+            return None
+        self._remember(key, row)
+        self._count(endpoint, "disk_hits")
+        return row[1]
+
+    async def put(self, key: str, text: str):
+        """Store a completion in memory and on disk"""
+        entry = (time.time(), text)
+        self._remember(key, entry)
+        await asyncio.to_thread(self._save, key, entry)
+
+    def metrics(self) -> Dict[str, Any]:
+        by_endpoint = {}
+        for endpoint, counts in self.stats.items():
+            lookups = sum(counts.values())
+            hits = counts["memory_hits"] + counts["disk_hits"]
+            by_endpoint[endpoint] = {**counts, "hit_rate": hits / lookups if lookups else 0.0}
+        return {"memory_entries": len(self._memory), "by_endpoint": by_endpoint}
+
+    def _remember(self, key: str, entry: Tuple[float, str]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str, cutoff: float) -> Optional[Tuple[float, str]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT created_at, text FROM completions WHERE key = ? AND created_at >= ?",
+                (key, cutoff)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def _save(self, key: str, entry: Tuple[float, str]):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, text, created_at) VALUES (?, ?, ?)",
+                (key, entry[1], entry[0])
+            )
+            # Expired rows are pruned as new ones are written
+            conn.execute("DELETE FROM completions WHERE created_at < ?", (time.time() - self.ttl_seconds,))
@@ -0,0 +1,473 @@
+"""
+Fake Backend - Deterministic in-process stand-in for OpenAI, Linkup and Airia
+
+Selected with FAKE_BACKEND; every upstream client (the OpenAI SDK and the
+pooled Linkup/Airia clients) then sends its requests through an httpx
+transport instead of the network:
+
+- synthetic: answers are generated locally. Content depends only on the
+  request (and FAKE_BACKEND_SEED), so runs are reproducible. Latency is drawn
+  from a log-normal profile with a time-to-first-token and a token rate
+  (streams are paced chunk by chunk). Errors and 429s are injected at
+  configurable rates, and OpenAI's prompt cache is simulated so cached
+  prompt tokens show up in usage as they would in production.
+- record: requests go to the real APIs and every response is appended to
+  FAKE_BACKEND_RECORDING.
+- replay: recorded responses are served (with their recorded latency) for
+  matching requests; anything not in the recording falls back to synthetic.
+
+Calls that ask for a bare json_object get the JSON shape registered for
+their endpoint label with register_json_shape(), so endpoints that parse
+the reply into a model work offline too.
+
+Everything else - rate limiters, retries, breakers, caches, usage metering -
+runs unchanged, so load tests exercise the real orchestration path.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from config import settings
+from services.call_context import current_labels
+
+SYNTHETIC = "synthetic"
+RECORD = "record"
+REPLAY = "replay"
+MODES = (SYNTHETIC, RECORD, REPLAY)
+
+# OpenAI caches prompt prefixes of at least 1024 tokens, in 128-token steps
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP_TOKENS = 128
+PROMPT_CACHE_MAX_PREFIXES = 10000
+# Request fingerprints whose attempt counts are kept (least recently seen dropped first)
+MAX_TRACKED_REQUESTS = 10000
+
+CHARS_PER_TOKEN = 4
+WORDS_PER_TOKEN = 0.75
+# Streamed completions are sent in chunks of this many words
+STREAM_CHUNK_WORDS = 4
+# z-score of the 95th percentile, for fitting a log-normal from median and p95
+Z_95 = 1.645
+
+FILLER_WORDS = (
+    "customers revenue retention growth pipeline onboarding churn support pricing "
+    "expansion accounts quarter data trend risk opportunity team process priority"
+).split()
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    first_token_median: float  # Seconds to first token (or to the whole response, for search/Airia)
+    first_token_p95: float
+    tokens_per_second: float  # Generation speed after the first token (0 = instant)
+    search_median: float
+    search_p95: float
+
+
+PROFILES = {
+    "instant": LatencyProfile(0.0, 0.0, 0.0, 0.0, 0.0),
+    "typical": LatencyProfile(0.4, 1.2, 80.0, 1.2, 3.0),
+    "slow": LatencyProfile(1.5, 6.0, 25.0, 3.0, 10.0),
+}
+
+
+def _lognormal(rng: random.Random, median: float, p95: float) -> float:
+    if median <= 0:
+        return 0.0
+    sigma = math.log(max(p95, median) / median) / Z_95
+    return rng.lognormvariate(math.log(median), sigma)
+
+
+def _fingerprint(request: httpx.Request) -> str:
+    """Identity of a request: method, path and canonical JSON body (not the host, so recordings survive base URL changes)"""
+    try:
+        body = json.dumps(json.loads(request.content or b"null"), sort_keys=True)
+    except ValueError:
+        body = request.content.decode("utf-8", "replace")
+    payload = f"{request.method} {request.url.path} {body}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _PacedStream(httpx.AsyncByteStream):
+    """Server-sent events delivered with a delay before each one"""
+
+    def __init__(self, events: List[Tuple[float, bytes]]):
+        self.events = events
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for delay, data in self.events:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield data
+
+
+class FakeBackend:
+    def __init__(
+        self,
+        mode: str,
+        profile: str = "typical",
+        latency_scale: float = 1.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+        recording_path: str = ""
+    ):
+        if mode and mode not in MODES:
+            raise ValueError(f"FAKE_BACKEND must be one of {', '.join(MODES)} (got {mode!r})")
+        if profile not in PROFILES:
+            raise ValueError(f"FAKE_BACKEND_PROFILE must be one of {', '.join(PROFILES)} (got {profile!r})")
+        self.mode = mode
+        self.profile = PROFILES[profile]
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self.recording_path = recording_path or str(Path(__file__).parent.parent / "fake_backend.jsonl")
+        # Request fingerprint -> times seen, so retries of a failed request can succeed
+        self._attempts: "OrderedDict[str, int]" = OrderedDict()
+        # Hashes of prompt prefixes already sent, for the simulated prompt cache
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+        # Endpoint label -> JSON schema of its json_object replies
+        self._json_shapes: Dict[str, Dict[str, Any]] = {}
+        self._recording: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._replayed: Dict[str, int] = {}
+        self.stats = {
+            "requests": 0,
+            "injected_errors": 0,
+            "injected_rate_limits": 0,
+            "recorded": 0,
+            "replayed": 0,
+            "replay_misses": 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mode)
+
+    @property
+    def offline(self) -> bool:
+        """Whether requests are answered locally (no API keys or network needed)"""
+        return self.mode in (SYNTHETIC, REPLAY)
+
+    def register_json_shape(self, endpoint: str, schema: Dict[str, Any]):
+        """
+        Shape synthetic json_object replies for an endpoint
+
+        Args:
+            endpoint: The endpoint call-context label the calls are made under
+            schema: JSON schema of the reply (e.g. a Pydantic model's model_json_schema())
+        """
+        self._json_shapes[endpoint] = schema
+
+    def transport(self) -> Optional[httpx.AsyncBaseTransport]:
+        """Transport for an upstream client, or None to use the network as usual"""
+        return _FakeTransport(self) if self.enabled else None
+
+    async def handle(self, request: httpx.Request, network: httpx.AsyncBaseTransport) -> httpx.Response:
+        self.stats["requests"] += 1
+        key = _fingerprint(request)
+        if self.mode == RECORD:
+            return await self._record(key, request, network)
+        if self.mode == REPLAY:
+            response = await self._replay(key)
+            if response is not None:
+                return response
+            self.stats["replay_misses"] += 1
+        return await self._synthetic(key, request)
+
+    # Record / replay
+
+    async def _record(self, key: str, request: httpx.Request, network: httpx.AsyncBaseTransport) -> httpx.Response:
+        started = time.monotonic()
+        response = await network.handle_async_request(request)
+        # Read in full so it can be stored (streams are recorded as their complete event stream)
+        content = await response.aread()
+        record = {
+            "key": key,
+            "url": str(request.url.copy_with(query=None)),
+            "status": response.status_code,
+            "headers": {
+                name: value for name, value in response.headers.items()
+                if name.lower() in ("content-type", "retry-after")
+            },
+            "body": content.decode("utf-8", "replace"),
+            "elapsed": round(time.monotonic() - started, 4)
+        }
+        await asyncio.to_thread(self._append, record)
+        self.stats["recorded"] += 1
+        return httpx.Response(response.status_code, headers=record["headers"], content=content)
+
+    def _append(self, record: Dict[str, Any]):
+        with open(self.recording_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _load_recording(self) -> Dict[str, List[Dict[str, Any]]]:
+        recording: Dict[str, List[Dict[str, Any]]] = {}
+        path = Path(self.recording_path)
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    recording.setdefault(record["key"], []).append(record)
+        print(f"Fake backend replaying {sum(map(len, recording.values()))} recorded responses from {path}")
+        return recording
+
+    async def _replay(self, key: str) -> Optional[httpx.Response]:
+        if self._recording is None:
+            self._recording = await asyncio.to_thread(self._load_recording)
+        records = self._recording.get(key)
+        if not records:
+            return None
+        # Repeated requests get the recorded responses in order, then the last one again
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        record = records[min(index, len(records) - 1)]
+        await self._sleep(record.get("elapsed", 0.0))
+        self.stats["replayed"] += 1
+        return httpx.Response(record["status"], headers=record["headers"], content=record["body"].encode("utf-8"))
+
+    # Synthetic responses
+
+    async def _synthetic(self, key: str, request: httpx.Request) -> httpx.Response:
+        attempt = self._attempts.get(key, 0)
+        self._attempts[key] = attempt + 1
+        self._attempts.move_to_end(key)
+        while len(self._attempts) > MAX_TRACKED_REQUESTS:
+            self._attempts.popitem(last=False)
+        # Content depends only on the request; latency and faults also on the attempt
+        content_rng = random.Random(f"{self.seed}:{key}")
+        rng = random.Random(f"{self.seed}:{key}:{attempt}")
+
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            self.stats["injected_rate_limits"] += 1
+            await self._sleep(_lognormal(rng, self.profile.first_token_median, self.profile.first_token_p95) / 4)
+            return httpx.Response(
+                429,
+                headers={"retry-after": "1"},
+                json={"error": {"message": "Rate limit reached (injected by fake backend)", "type": "rate_limit_error"}}
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats["injected_errors"] += 1
+            await self._sleep(_lognormal(rng, self.profile.first_token_median, self.profile.first_token_p95))
+            return httpx.Response(
+                500, json={"error": {"message": "Internal error (injected by fake backend)", "type": "server_error"}}
+            )
+
+        body = json.loads(request.content or b"{}")
+        path = request.url.path
+        if path.endswith("/chat/completions"):
+            return await self._chat(body, content_rng, rng)
+        if path.endswith("/search"):
+            await self._sleep(_lognormal(rng, self.profile.search_median, self.profile.search_p95))
+            return httpx.Response(200, json=self._search(body, content_rng))
+        # Airia pipelines and agents
+        await self._sleep(_lognormal(rng, self.profile.search_median, self.profile.search_p95))
+        text = self._text(json.dumps(body), content_rng, 120)
+        return httpx.Response(200, json={"id": uuid.UUID(int=content_rng.getrandbits(128)).hex, "output": text, "synthesis": text})
+
+    async def _chat(self, body: Dict[str, Any], content_rng: random.Random, rng: random.Random) -> httpx.Response:
+        messages = body.get("messages", [])
+        max_tokens = body.get("max_tokens") or 1000
+        prompt = (messages[-1].get("content") or "") if messages else ""
+        text = self._completion_text(prompt, body.get("response_format"), content_rng, max_tokens)
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // CHARS_PER_TOKEN
+        completion_tokens = min(max(int(len(text.split()) / WORDS_PER_TOKEN), 1), max_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": self._cached_tokens(messages)}
+        }
+        first_token = _lognormal(rng, self.profile.first_token_median, self.profile.first_token_p95)
+        per_token = 1 / self.profile.tokens_per_second if self.profile.tokens_per_second else 0.0
+        completion_id = f"chatcmpl-{uuid.UUID(int=content_rng.getrandbits(128)).hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+
+        if not body.get("stream"):
+            await self._sleep(first_token + completion_tokens * per_token)
+            return httpx.Response(200, json={
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                "usage": usage
+            })
+
+        def event(choices: List[Dict[str, Any]], chunk_usage: Optional[Dict[str, Any]] = None) -> bytes:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                "usage": chunk_usage
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        words = text.split(" ")
+        events = [(first_token, event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]))]
+        for start in range(0, len(words), STREAM_CHUNK_WORDS):
+            piece = " ".join(words[start:start + STREAM_CHUNK_WORDS])
+            if start:
+                piece = " " + piece
+            delay = STREAM_CHUNK_WORDS / WORDS_PER_TOKEN * per_token
+            events.append((delay, event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])))
+        events.append((0.0, event([{"index": 0, "delta": {}, "finish_reason": "stop"}])))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append((0.0, event([], usage)))
+        events.append((0.0, b"data: [DONE]\n\n"))
+        scaled = [(delay * self.latency_scale, data) for delay, data in events]
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=_PacedStream(scaled))
+
+    def _completion_text(
+        self,
+        prompt: str,
+        response_format: Optional[Dict[str, Any]],
+        rng: random.Random,
+        max_tokens: int
+    ) -> str:
+        target_words = int(rng.randint(max(max_tokens // 2, 1), max_tokens) * WORDS_PER_TOKEN)
+        if response_format and response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            return json.dumps(self._from_schema(schema, prompt, rng))
+        if response_format and response_format.get("type") == "json_object":
+            shape = self._json_shapes.get(current_labels().get("endpoint"))
+            if shape is not None:
+                return json.dumps(self._from_schema(shape, prompt, rng))
+            return json.dumps({"text": self._text(prompt, rng, min(target_words, 60))})
+
+        # Echo the section headers and "**...**:" lines the prompt asks for, so parsers find them
+        sections = [
+            line.strip() for line in prompt.splitlines()
+            if line.startswith("## ") or re.match(r"\*\*[^*]+\*\*:", line.strip())
+        ]
+        if not sections:
+            return self._text(prompt, rng, target_words)
+        per_section = max(target_words // len(sections), 8)
+        parts = []
+        for line in sections:
+            if line.startswith("## "):
+                parts.append(f"{line}\n- {self._text(prompt, rng, per_section // 2)}\n- {self._text(prompt, rng, per_section // 2)}")
+            else:
+                parts.append(f"{line.split(':', 1)[0]}: {self._text(prompt, rng, per_section)}")
+        return "\n\n".join(parts)
+
+    def _text(self, prompt: str, rng: random.Random, words: int) -> str:
+        """Deterministic filler drawn from the prompt's own vocabulary"""
+        vocabulary = [w for w in re.findall(r"[a-zA-Z]{4,}", prompt.lower())] or FILLER_WORDS
+        words = max(words, 1)
+        chosen = [rng.choice(vocabulary if rng.random() < 0.7 else FILLER_WORDS) for _ in range(words)]
+        chosen[0] = chosen[0].capitalize()
+        return " ".join(chosen) + "."
+
+    def _from_schema(
+        self,
+        schema: Dict[str, Any],
+        prompt: str,
+        rng: random.Random,
+        root: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """Minimal instance of a JSON schema (local "#/$defs/..." references are followed)"""
+        root = root or schema
+        if "$ref" in schema:
+            schema = root.get("$defs", {}).get(schema["$ref"].rsplit("/", 1)[-1], {})
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        kind = schema.get("type")
+        if kind == "object":
+            return {
+                name: self._from_schema(sub, prompt, rng, root)
+                for name, sub in schema.get("properties", {}).items()
+            }
+        if kind == "array":
+            return [self._from_schema(schema.get("items", {}), prompt, rng, root) for _ in range(rng.randint(1, 3))]
+        if kind == "integer":
+            return rng.randint(0, 100)
+        if kind == "number":
+            return round(rng.uniform(0, 100), 2)
+        if kind == "boolean":
+            return rng.random() < 0.5
+        return self._text(prompt, rng, 12)
+
+    def _search(self, body: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+        query = body.get("q", "")
+        slug = "-".join(re.findall(r"[a-z0-9]+", query.lower())[:6]) or "search"
+        results = [
+            {
+                "type": "text",
+                "name": self._text(query, rng, 6).rstrip("."),
+                "url": f"https://example.com/{slug}/{index}",
+                "content": self._text(query, rng, 60)
+            }
+            for index in range(rng.randint(5, 10))
+        ]
+        if body.get("outputType") == "sourcedAnswer":
+            return {"answer": self._text(query, rng, 80), "sources": results[:5]}
+        return {"results": results}
+
+    def _cached_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """Simulated prompt cache: longest message prefix sent before, if long enough"""
+        cached_chars = 0
+        chars = 0
+        digest = hashlib.sha256()
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode("utf-8"))
+            chars += len(message.get("content") or "")
+            prefix = digest.hexdigest()
+            if prefix in self._prefixes:
+                self._prefixes.move_to_end(prefix)
+                cached_chars = chars
+            else:
+                self._prefixes[prefix] = None
+        while len(self._prefixes) > PROMPT_CACHE_MAX_PREFIXES:
+            self._prefixes.popitem(last=False)
+        cached = cached_chars // CHARS_PER_TOKEN
+        if cached < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        return cached - cached % PROMPT_CACHE_STEP_TOKENS
+
+    async def _sleep(self, seconds: float):
+        if seconds > 0 and self.latency_scale > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"mode": self.mode, **self.stats}
+
+
+class _FakeTransport(httpx.AsyncBaseTransport):
+    def __init__(self, backend: FakeBackend):
+        self.backend = backend
+        # Only used to reach the real APIs while recording
+        self._network = httpx.AsyncHTTPTransport() if backend.mode == RECORD else None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.backend.handle(request, self._network)
+
+    async def aclose(self):
+        if self._network is not None:
+            await self._network.aclose()
+
+
+fake_backend = FakeBackend(
+    settings.fake_backend,
+    profile=settings.fake_backend_profile,
+    latency_scale=settings.fake_backend_latency_scale,
+    error_rate=settings.fake_backend_error_rate,
+    rate_limit_rate=settings.fake_backend_rate_limit_rate,
+    seed=settings.fake_backend_seed,
+    recording_path=settings.fake_backend_recording
+)
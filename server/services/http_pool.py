@@ -0,0 +1,124 @@
+"""
+Pooled HTTP clients for upstream APIs
+
+Each upstream (Linkup, Airia) gets one long-lived httpx.AsyncClient, so
+calls reuse open keep-alive connections instead of paying DNS, TCP and TLS
+setup every time. Clients are opened and closed by the FastAPI lifespan;
+scripts that never run the lifespan (batch.py) get one lazily on first use.
+
+Connection reuse is measured with httpx's per-request trace hook: every
+request counts, and every TCP connect counts as a new connection.
+"""
+from typing import Dict, Optional
+
+import httpx
+
+from config import settings
+from services.fake_backend import fake_backend
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class PooledClient:
+    def __init__(self, name: str, base_url: str, headers: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.base_url = base_url
+        self.headers = headers or {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "tls_handshakes": 0,
+            "http2_requests": 0
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self.start()
+        return self._client
+
+    def start(self):
+        """Open the pooled client (no-op if already open)"""
+        if self._client is not None and not self._client.is_closed:
+            return
+        http2 = settings.http_pool_http2 and _http2_available()
+        if settings.http_pool_http2 and not http2:
+            print(f"HTTP/2 requested for {self.name} but h2 is not installed, using HTTP/1.1")
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            http2=http2,
+            # The fake backend (FAKE_BACKEND) answers in-process instead of the network
+            transport=fake_backend.transport(),
+            limits=httpx.Limits(
+                max_connections=settings.http_pool_max_connections,
+                max_keepalive_connections=settings.http_pool_max_keepalive,
+                keepalive_expiry=settings.http_pool_keepalive_seconds
+            ),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]}
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.client.post(path, **kwargs)
+
+    async def _on_request(self, request: httpx.Request):
+        self.stats["requests"] += 1
+        request.extensions["trace"] = self._trace
+
+    async def _on_response(self, response: httpx.Response):
+        if response.http_version == "HTTP/2":
+            self.stats["http2_requests"] += 1
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats["new_connections"] += 1
+        elif event_name == "connection.start_tls.complete":
+            self.stats["tls_handshakes"] += 1
+
+    def metrics(self) -> Dict[str, float]:
+        """Request and connection counts, plus the share of requests on a reused connection"""
+        requests = self.stats["requests"]
+        reused = max(requests - self.stats["new_connections"], 0)
+        return {
+            **self.stats,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / requests, 3) if requests else 0.0
+        }
+
+
+class HttpClientPool:
+    def __init__(self):
+        self._clients: Dict[str, PooledClient] = {}
+
+    def register(self, name: str, base_url: str, headers: Optional[Dict[str, str]] = None) -> PooledClient:
+        if name in self._clients:
+            raise ValueError(f"HTTP client {name} is already registered")
+        pooled = PooledClient(name, base_url, headers)
+        self._clients[name] = pooled
+        return pooled
+
+    async def start(self):
+        for pooled in self._clients.values():
+            pooled.start()
+
+    async def aclose(self):
+        for pooled in self._clients.values():
+            await pooled.aclose()
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        return {name: pooled.metrics() for name, pooled in self._clients.items()}
+
+
+http_pool = HttpClientPool()
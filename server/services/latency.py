@@ -0,0 +1,38 @@
+"""
+Latency tracking for upstream calls
+"""
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+
+import numpy as np
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        # Most recent latencies (seconds) per key
+        self.window = window
+        self._samples: Dict[Hashable, Deque[float]] = {}
+
+    def record(self, key: Hashable, seconds: float):
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: Hashable, pct: float, min_samples: int = 1) -> Optional[float]:
+        """Percentile of recent latencies for a key, or None with too few samples"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        return float(np.percentile(samples, pct))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count and p50/p95/p99 per key"""
+        return {
+            str(key): {
+                "count": len(samples),
+                "p50": float(np.percentile(samples, 50)),
+                "p95": float(np.percentile(samples, 95)),
+                "p99": float(np.percentile(samples, 99))
+            }
+            for key, samples in self._samples.items()
+            if samples
+        }
+
@@ -1,9 +1,19 @@
 """
 Linkup service for web search capabilities
+
+Searches are served from a TTL cache when possible: stale results are
+returned immediately and refreshed in the background, and failed searches
+are remembered briefly (see services/search_cache.py).
 """
+import asyncio
 import httpx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from config import settings
+from services.http_pool import http_pool
+from services.rate_limiter import linkup_limiter
+from services.resilience import linkup_upstream, CircuitOpenError
+from services.single_flight import SingleFlight
+from services.search_cache import SearchCache, search_key, STALE
 
 class LinkupService:
     def __init__(self):
@@ -13,6 +23,30 @@ class LinkupService:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        # Shared keep-alive connection pool, opened/closed by the app lifespan
+        self.http = http_pool.register("linkup", self.base_url, self.headers)
+        self.limiter = linkup_limiter
+        self.upstream = linkup_upstream
+        # Identical searches in flight at the same time share one request
+        self.single_flight = SingleFlight("linkup") if settings.single_flight_enabled else None
+        self.cache: Optional[SearchCache] = None
+        if settings.search_cache_enabled:
+            self.cache = SearchCache(
+                settings.search_cache_path,
+                ttl_seconds=settings.search_cache_ttl_seconds,
+                stale_seconds=settings.search_cache_stale_seconds,
+                negative_ttl_seconds=settings.search_cache_negative_ttl_seconds,
+                max_entries=settings.search_cache_max_entries
+            )
+        # Cache key -> background refresh of a stale entry
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def _post(self, path: str, **kwargs) -> httpx.Response:
+        """One rate-limited POST attempt; HTTP errors are raised so they can be retried"""
+        async with self.limiter.slot():
+            response = await self.http.post(path, **kwargs)
+            response.raise_for_status()
+        return response
 
     async def search(self, query: str, depth: str = "standard", output_type: str = "searchResults") -> Dict[str, Any]:
         """
@@ -26,26 +60,74 @@ class LinkupService:
         Returns:
             Search results from Linkup
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/search",
-                    headers=self.headers,
-                    json={
-                        "q": query,
-                        "depth": depth,
-                        "outputType": output_type
-                    },
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                print(f"Linkup API error: {e}")
-                return {
-                    "error": str(e),
-                    "results": []
-                }
+        key = search_key(query, depth, output_type)
+        if self.cache is not None:
+            entry = await self.cache.get(key)
+            if entry is not None:
+                if self.cache.state(entry) == STALE:
+                    self._refresh(key, query, depth, output_type)
+                return entry.value
+
+        try:
+            result = await self._fetch(key, query, depth, output_type)
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            print(f"Linkup API error: {e}")
+            result = {
+                "error": str(e),
+                "results": []
+            }
+            if self.cache is not None:
+                await self.cache.put(key, result, negative=True)
+            return result
+
+        if self.cache is not None:
+            await self.cache.put(key, result)
+        return result
+
+    async def _fetch(self, key: str, query: str, depth: str, output_type: str) -> Dict[str, Any]:
+        """One search against the API (shared with identical searches in flight)"""
+        async def fetch() -> httpx.Response:
+            return await self.upstream.run(lambda: self._post(
+                "/search",
+                json={
+                    "q": query,
+                    "depth": depth,
+                    "outputType": output_type
+                },
+                timeout=30.0
+            ))
+
+        if self.single_flight is not None:
+            response = await self.single_flight.do(key, fetch)
+        else:
+            response = await fetch()
+        return response.json()
+
+    def _refresh(self, key: str, query: str, depth: str, output_type: str):
+        """Revalidate a stale entry in the background (at most one refresh per key)"""
+        if key in self._refreshing:
+            return
+        task = asyncio.ensure_future(self._revalidate(key, query, depth, output_type))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _revalidate(self, key: str, query: str, depth: str, output_type: str):
+        self.cache.stats["refreshes"] += 1
+        try:
+            result = await self._fetch(key, query, depth, output_type)
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            # Keep serving the stale entry until it expires
+            self.cache.stats["refresh_failures"] += 1
+            print(f"Linkup refresh failed, serving stale results: {e}")
+            return
+        await self.cache.put(key, result)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "single_flight": self.single_flight.metrics() if self.single_flight else None,
+            "cache": self.cache.metrics() if self.cache else None,
+            "refreshing": len(self._refreshing)
+        }
 
     async def get_sourced_answer(self, query: str) -> str:
         """
@@ -0,0 +1,187 @@
+"""
+Model Router - Picks model, max_tokens and timeout per task class
+
+Every OpenAI call site declares what kind of call it is (a 100-token
+research summary is not a 1500-token synthesis), and the route policy for
+that task class decides which model serves it, how many tokens it may
+generate and how long it may take. OPENAI_MODEL_ROUTES overrides the
+defaults per class.
+
+A route with a latency SLO and a fallback model switches to the fallback
+while the primary model's recent p95 latency for that class exceeds the
+SLO. One call in PROBE_EVERY still goes to the primary so its latency keeps
+being measured, and the route switches back once it recovers.
+
+Latency and token counts are kept as histograms per route (task class and
+model) for /api/metrics.
+"""
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, Optional, Sequence
+
+from config import settings
+from services.latency import LatencyTracker
+
+RESEARCH_SUMMARY = "research_summary"
+PRESENTATION = "presentation"
+DELIBERATION = "deliberation"
+SYNTHESIS = "synthesis"
+SUMMARY = "summary"  # History compaction and panel summaries
+STRUCTURED_JSON = "structured_json"
+CHAT = "chat"  # Anything that doesn't declare a class
+
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+# While a route is on its fallback, one call in this many still goes to the primary
+PROBE_EVERY = 10
+# SLO checks look at this many recent calls, so a recovered primary is noticed quickly
+SLO_WINDOW = 20
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    model: str
+    max_tokens: int
+    timeout_seconds: float
+    fallback_model: str = ""
+    latency_slo_seconds: float = 0.0  # p95 target for the primary model (0 = no SLO)
+
+
+@dataclass(frozen=True)
+class Route:
+    task: str
+    model: str
+    max_tokens: int
+    timeout_seconds: float
+    fallback: bool = False
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # One count per bucket upper bound, plus one for everything above the last
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        labels = [f"<={bound:g}" for bound in self.buckets] + [f">{self.buckets[-1]:g}"]
+        return {
+            "count": count,
+            "mean": round(self.total / count, 4) if count else 0.0,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency_seconds": self.latency.to_dict(),
+            "prompt_tokens": self.prompt_tokens.to_dict(),
+            "completion_tokens": self.completion_tokens.to_dict()
+        }
+
+
+def default_policies(model: str, timeout_seconds: float) -> Dict[str, RoutePolicy]:
+    """The call sizes the discussion flow has always used, all on one model"""
+    return {
+        RESEARCH_SUMMARY: RoutePolicy(model, 100, timeout_seconds),
+        PRESENTATION: RoutePolicy(model, 200, timeout_seconds),
+        DELIBERATION: RoutePolicy(model, 150, timeout_seconds),
+        SYNTHESIS: RoutePolicy(model, 1500, timeout_seconds),
+        SUMMARY: RoutePolicy(model, 250, timeout_seconds),
+        STRUCTURED_JSON: RoutePolicy(model, 1200, timeout_seconds),
+        CHAT: RoutePolicy(model, 1000, timeout_seconds),
+    }
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        policies: Dict[str, RoutePolicy],
+        min_samples: int = 10
+    ):
+        self.policies = policies
+        self.min_samples = min_samples
+        # Recent latencies keyed by (task class, model)
+        self.latency = LatencyTracker(window=SLO_WINDOW)
+        self._stats: Dict[str, RouteStats] = {}
+        self._calls: Dict[str, int] = {}
+        self.fallbacks: Dict[str, int] = {task: 0 for task in policies}
+
+    def policy(self, task: Optional[str]) -> RoutePolicy:
+        return self.policies.get(task or CHAT, self.policies[CHAT])
+
+    def route(self, task: Optional[str], max_tokens: Optional[int] = None) -> Route:
+        """
+        Pick the model, max_tokens and timeout for a call
+
+        Args:
+            task: Task class of the call site (unknown or None routes as CHAT)
+            max_tokens: Explicit size from a call site that computes it; the policy's otherwise
+
+        Returns:
+            The route to use
+        """
+        task = task if task in self.policies else CHAT
+        policy = self.policies[task]
+        route = Route(task, policy.model, max_tokens or policy.max_tokens, policy.timeout_seconds)
+        if self._slo_at_risk(task, policy):
+            calls = self._calls.get(task, 0) + 1
+            self._calls[task] = calls
+            if calls % PROBE_EVERY:
+                self.fallbacks[task] += 1
+                return replace(route, model=policy.fallback_model, fallback=True)
+        return route
+
+    def _slo_at_risk(self, task: str, policy: RoutePolicy) -> bool:
+        if not policy.fallback_model or policy.latency_slo_seconds <= 0:
+            return False
+        p95 = self.latency.percentile((task, policy.model), 95, min_samples=self.min_samples)
+        return p95 is not None and p95 > policy.latency_slo_seconds
+
+    def observe(
+        self,
+        task: Optional[str],
+        model: str,
+        seconds: Optional[float],
+        prompt_tokens: int,
+        completion_tokens: int
+    ):
+        """Record one completed call on its route (seconds is None when latency wasn't measured)"""
+        task = task if task in self.policies else CHAT
+        stats = self._stats.setdefault(f"{task}/{model}", RouteStats())
+        if seconds is not None:
+            self.latency.record((task, model), seconds)
+            stats.latency.observe(seconds)
+        stats.prompt_tokens.observe(prompt_tokens)
+        stats.completion_tokens.observe(completion_tokens)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "policies": {task: asdict(policy) for task, policy in self.policies.items()},
+            "fallbacks": dict(self.fallbacks),
+            "routes": {route: stats.to_dict() for route, stats in self._stats.items()}
+        }
+
+
+def _configured_policies() -> Dict[str, RoutePolicy]:
+    policies = default_policies(settings.openai_model, settings.openai_timeout_seconds)
+    for task, overrides in settings.openai_model_routes.items():
+        if task not in policies:
+            raise ValueError(f"OPENAI_MODEL_ROUTES: unknown task class {task!r} (expected one of {', '.join(policies)})")
+        policies[task] = replace(policies[task], **overrides)
+    return policies
+
+
+model_router = ModelRouter(_configured_policies())
@@ -0,0 +1,195 @@
+"""
+OpenAI Batch API collector - trades latency for throughput and cost
+
+While batch mode is active (see OpenAIService.batch_mode), chat requests are
+not sent one by one. Requests from discussions kept in lockstep are
+collected until every discussion has either queued its requests for the
+phase or finished (the lockstep calls flush() once none of its work is still
+running), so a phase whose research waits on slow searches still goes out as
+one job. Other requests are collected until none has arrived for a short
+debounce window, and lockstep requests fall back to a longer timer in case
+the lockstep never goes idle. Either way a full batch is sent at once.
+
+The batch is written as one Batch API JSONL file, uploaded and submitted,
+with identical requests sent once and their result shared (single-flight is
+bypassed in batch mode, since a discussion waiting on another's call would
+look busy to its lockstep). The collector polls the batch until it finishes and resolves each caller's
+future with its own ChatCompletion, or with a BatchRequestError if that
+request failed.
+"""
+import asyncio
+import json
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+
+from scheduler import Lockstep, current_lockstep
+from services.completion_cache import completion_key
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+
+class BatchRequestError(Exception):
+    """A request inside a batch job failed (or the batch itself did)"""
+
+
+@dataclass
+class _Request:
+    custom_id: str
+    params: Dict[str, Any]
+    future: asyncio.Future
+    # Lockstep the caller is parked on until its result is delivered
+    lockstep: Optional[Lockstep] = None
+
+    def wake(self):
+        """Count the caller as running again (once)"""
+        if self.lockstep is not None:
+            self.lockstep.resume()
+            self.lockstep = None
+
+
+class BatchCollector:
+    def __init__(
+        self,
+        client: Callable[[], AsyncOpenAI],
+        flush_seconds: float,
+        max_requests: int,
+        poll_seconds: float,
+        fallback_seconds: float = 120.0,
+        completion_window: str = "24h"
+    ):
+        self._client = client
+        self.flush_seconds = flush_seconds
+        self.fallback_seconds = fallback_seconds
+        self.max_requests = max_requests
+        self.poll_seconds = poll_seconds
+        self.completion_window = completion_window
+        self._pending: List[_Request] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._jobs: List[asyncio.Task] = []
+        self.stats = {"batches": 0, "requests": 0, "failed_requests": 0, "coalesced": 0, "fallback_flushes": 0}
+
+    async def submit(self, params: Dict[str, Any]) -> ChatCompletion:
+        """Queue one chat completion request for the next batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        lockstep = current_lockstep()
+        request = _Request(uuid.uuid4().hex, params, loop.create_future())
+        self._pending.append(request)
+        if len(self._pending) >= self.max_requests:
+            self.flush()
+        elif lockstep is not None:
+            # Sent once the lockstep is idle; the timer only covers a lockstep that never is
+            if self._timer is None:
+                self._timer = loop.call_later(self.fallback_seconds, self._fallback_flush)
+        else:
+            # Debounce: wait for the rest of the phase's requests to arrive
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = loop.call_later(self.flush_seconds, self.flush)
+
+        if lockstep is not None:
+            request.lockstep = lockstep
+            lockstep.park()  # May flush right away if this was the last running work
+        try:
+            return await request.future
+        finally:
+            request.wake()
+
+    def flush(self):
+        """Send the collected requests as one batch job"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items = [item for item in self._pending if not item.future.done()]
+        self._pending = []
+        if items:
+            job = asyncio.ensure_future(self._run(items))
+            self._jobs.append(job)
+            job.add_done_callback(self._jobs.remove)
+
+    def _fallback_flush(self):
+        self._timer = None
+        if self._pending:
+            self.stats["fallback_flushes"] += 1
+            print(f"OpenAI batch sent after {self.fallback_seconds}s without the lockstep going idle")
+        self.flush()
+
+    async def _run(self, items: List[_Request]):
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(items)
+        try:
+            results = await self._execute(items)
+        except Exception as e:
+            print(f"OpenAI batch failed: {e}")
+            results = {}
+            error: Optional[Exception] = e
+        else:
+            error = None
+
+        for item in items:
+            if item.future.done():
+                continue  # Caller gave up
+            # Every caller counts as running before any of them wakes, so the
+            # first to queue its next request doesn't find the lockstep idle
+            item.wake()
+            record = results.get(item.custom_id)
+            response = (record or {}).get("response") or {}
+            if response.get("status_code") == 200:
+                item.future.set_result(ChatCompletion.model_validate(response["body"]))
+                continue
+            self.stats["failed_requests"] += 1
+            detail = (record or {}).get("error") or response.get("body") or error or "no result returned"
+            item.future.set_exception(BatchRequestError(f"Batch request failed: {detail}"))
+
+    async def _execute(self, items: List[_Request]) -> Dict[str, Dict[str, Any]]:
+        """Upload, submit and poll one batch; returns result lines by custom_id"""
+        client = self._client()
+        # Identical requests are sent once: custom_id -> custom_id of the line sent for it
+        sent: Dict[str, str] = {}
+        sent_by_key: Dict[str, str] = {}
+        lines = []
+        for item in items:
+            key = completion_key(item.params)
+            if key in sent_by_key:
+                sent[item.custom_id] = sent_by_key[key]
+                self.stats["coalesced"] += 1
+                continue
+            sent[item.custom_id] = sent_by_key[key] = item.custom_id
+            lines.append(json.dumps({
+                "custom_id": item.custom_id, "method": "POST", "url": CHAT_COMPLETIONS_URL, "body": item.params
+            }))
+        input_file = await client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=self.completion_window
+        )
+        print(f"Submitted OpenAI batch {batch.id} with {len(lines)} requests")
+
+        while batch.status not in TERMINAL_STATUSES:
+            await asyncio.sleep(self.poll_seconds)
+            batch = await client.batches.retrieve(batch.id)
+        print(f"OpenAI batch {batch.id} {batch.status}")
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await client.files.content(file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    results[record["custom_id"]] = record
+        if not results and batch.status != "completed":
+            raise BatchRequestError(f"batch {batch.id} {batch.status}: {batch.errors}")
+        return {custom_id: results[line_id] for custom_id, line_id in sent.items() if line_id in results}
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending), "running_batches": len(self._jobs)}
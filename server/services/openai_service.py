@@ -1,29 +1,157 @@
 """
 OpenAI service for agent responses
+
+Callers declare a task class, and the model router picks the model,
+max_tokens and deadline for it (see services/model_router.py).
+
+Every completion, streamed or not, runs under its route's deadline. With hedging enabled, a
+call that is still running after the recent p95 latency for calls of the
+same model and size gets a duplicate request; whichever finishes first wins and the
+other is cancelled. Every attempt (hedges included) first takes a slot
+from the shared OpenAI rate limiter, and the hedge delay only starts once
+the primary has its slot, so queueing never triggers hedges. Transient failures are retried with
+backoff inside the deadline, and the OpenAI circuit breaker fails calls fast
+while the API is down. A deadline that expires while OpenAI itself is
+answering counts against the breaker (time queued behind our own rate
+limiter doesn't). Streams are retried the same way until their first chunk.
+
+Reported token usage of every call is priced and attributed by the usage
+meter, which also refuses calls once the daily budget would be exceeded and
+caps max_tokens at MAX_TOKENS_PER_REQUEST.
+
+An optional completion cache (memory LRU over SQLite) answers repeated
+identical requests for opted-in endpoints without calling the API, and
+identical requests that are in flight at the same time share one call.
+
+Inside batch_mode(), completions are collected into OpenAI Batch API jobs
+instead (see services/openai_batch.py): no deadline, hedging or streaming,
+but much higher throughput at a lower price.
 """
-from openai import AsyncOpenAI
-from typing import List, Dict, Any, Optional
+import asyncio
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from config import settings
+from services.latency import LatencyTracker
+from services.rate_limiter import openai_limiter
+from services.resilience import openai_upstream, CircuitOpenError
+from services.call_context import current_labels
+from services.completion_cache import CompletionCache, completion_key
+from services.usage import usage_meter
+from services.single_flight import SingleFlight
+from services.openai_batch import BatchCollector
+from services.call_context import call_context
+from services.fake_backend import fake_backend
+from services.model_router import model_router, STRUCTURED_JSON
+
+BATCH_MODE = "batch"
+
+# Rough prompt size for the token bucket; exact counts come back in usage
+CHARS_PER_TOKEN = 4
+
+
+def _prompt_tokens(params: Dict[str, Any]) -> int:
+    prompt_chars = sum(len(m.get("content") or "") for m in params.get("messages", []))
+    return prompt_chars // CHARS_PER_TOKEN
+
+
+def _estimated_tokens(params: Dict[str, Any]) -> int:
+    return _prompt_tokens(params) + (params.get("max_tokens") or 0)
+
+
+def _latency_key(params: Dict[str, Any]) -> Tuple[str, Optional[int]]:
+    return (params["model"], params.get("max_tokens"))
+
+
+def _cached_tokens(usage: Any) -> int:
+    """Prompt tokens the provider served from its prompt cache"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+class QueueDeadlineError(Exception):
+    """A stream's deadline passed while it was queued behind our own rate limiter"""
+
+
+@dataclass
+class _Call:
+    """State shared by the attempts of one completion"""
+    # Attempts past the rate limiter that OpenAI hasn't answered yet
+    upstream_attempts: int = 0
+
 
 class OpenAIService:
     def __init__(self):
-        self.model = "gpt-4o-mini"
         self._client: Optional[AsyncOpenAI] = None
+        # Model, max_tokens and deadline per task class
+        self.router = model_router
+        self.hedge_enabled = settings.openai_hedge_enabled
+        self.hedge_percentile = settings.openai_hedge_percentile
+        self.hedge_min_delay = settings.openai_hedge_min_delay_seconds
+        self.hedge_min_samples = 20
+        # Keyed by (model, max_tokens); max_tokens tracks call size closely at our call sites
+        self.latency = LatencyTracker()
+        # Keyed by whether the provider served part of the prompt from its prompt cache
+        self.prompt_cache_latency = LatencyTracker()
+        self.limiter = openai_limiter
+        self.upstream = openai_upstream
+        self.usage = usage_meter
+        self.max_tokens_per_request = settings.max_tokens_per_request
+        self.cache: Optional[CompletionCache] = None
+        if settings.completion_cache_enabled:
+            self.cache = CompletionCache(
+                settings.completion_cache_path or str(Path(__file__).parent.parent / "completions.db"),
+                ttl_seconds=settings.completion_cache_ttl_seconds,
+                max_memory_entries=settings.completion_cache_max_entries
+            )
+        self.single_flight = SingleFlight("openai") if settings.single_flight_enabled else None
+        # Endpoint or phase labels (see services/call_context.py) whose calls may be cached
+        self.cache_endpoints = {
+            name.strip() for name in settings.completion_cache_endpoints.split(",") if name.strip()
+        }
+        self.stats = {
+            "requests": 0,
+            "timeouts": 0,
+            "upstream_timeouts": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "batched": 0
+        }
+        self.batch = BatchCollector(
+            self._get_client,
+            flush_seconds=settings.openai_batch_flush_seconds,
+            max_requests=settings.openai_batch_max_requests,
+            poll_seconds=settings.openai_batch_poll_seconds,
+            fallback_seconds=settings.openai_batch_fallback_seconds
+        )
+        self.batch_price_multiplier = settings.openai_batch_price_multiplier
 
     def _get_client(self) -> AsyncOpenAI:
         if self._client is None:
-            if not settings.openai_api_key:
+            api_key = settings.openai_api_key or ("fake" if fake_backend.offline else None)
+            if not api_key:
                 raise RuntimeError(
                     "OpenAI API key not configured. Set OPENAI_API_KEY in the environment or .env file."
                 )
-            self._client = AsyncOpenAI(api_key=settings.openai_api_key)
+            transport = fake_backend.transport()
+            # Retries are handled by self.upstream so they are classified and seen by the breaker
+            self._client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=settings.openai_base_url or None,
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(transport=transport) if transport else None
+            )
         return self._client
 
     async def generate_response(
         self,
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: Optional[int] = None,
+        task: Optional[str] = None
     ) -> str:
         """
         Generate a response using OpenAI's chat completion
@@ -31,46 +159,345 @@ class OpenAIService:
         Args:
             messages: List of message objects with 'role' and 'content'
             temperature: Sampling temperature (0-2)
-            max_tokens: Maximum tokens in response
+            max_tokens: Maximum tokens in response (default: the task class's route)
+            task: Task class of the call (services/model_router.py), which picks the model
 
         Returns:
             Generated response text
         """
+        route = self.router.route(task, max_tokens)
         try:
-            client = self._get_client()
-            response = await client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            return response.choices[0].message.content
+            with call_context(task=route.task):
+                return await self._complete_text({
+                    "model": route.model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": route.max_tokens
+                })
         except Exception as e:
             print(f"OpenAI API error: {e}")
             return f"Error generating response: {str(e)}"
 
+    async def generate_response_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        task: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion as it is generated
+
+        Args:
+            messages: List of message objects with 'role' and 'content'
+            temperature: Sampling temperature (0-2)
+            max_tokens: Maximum tokens in response (default: the task class's route)
+            task: Task class of the call (services/model_router.py), which picks the model
+
+        Yields:
+            Text deltas; on failure a single "Error generating response" chunk
+        """
+        if self.in_batch_mode():
+            # The Batch API can't stream; deliver the whole completion as one chunk
+            yield await self.generate_response(messages, temperature, max_tokens, task)
+            return
+
+        stream = None
+        route = self.router.route(task, max_tokens)
+        params = {
+            "model": route.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": route.max_tokens
+        }
+        cache_endpoint = self._cache_endpoint()
+        cache_key = completion_key(params) if cache_endpoint else None
+        if cache_key:
+            cached = await self.cache.get(cache_key, cache_endpoint)
+            if cached is not None:
+                yield cached
+                return
+
+        # One deadline for the whole stream, retries included: httpx's timeout only bounds each read
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + route.timeout_seconds
+
+        def remaining() -> float:
+            return deadline - loop.time()
+
+        chunks: List[str] = []
+        attempt = 1
+        self.upstream.stats["calls"] += 1
+        try:
+            self._admit(params)
+            client = self._get_client()
+            while True:
+                try:
+                    # The slot is held for the whole stream, it counts as in flight until done
+                    async with self.upstream.guard(), self.limiter.slot(_estimated_tokens(params)):
+                        if remaining() <= 0:
+                            # Not the upstream's fault, so not a breaker failure
+                            self.stats["timeouts"] += 1
+                            raise QueueDeadlineError(
+                                f"OpenAI call exceeded {route.timeout_seconds}s deadline waiting for a rate limiter slot"
+                            )
+                        started = time.monotonic()
+                        try:
+                            stream = await asyncio.wait_for(
+                                client.chat.completions.create(
+                                    **params,
+                                    stream=True,
+                                    stream_options={"include_usage": True},
+                                    timeout=route.timeout_seconds
+                                ),
+                                timeout=remaining()
+                            )
+                            chunk_iterator = stream.__aiter__()
+                            while True:
+                                try:
+                                    chunk = await asyncio.wait_for(chunk_iterator.__anext__(), timeout=remaining())
+                                except StopAsyncIteration:
+                                    break
+                                if chunk.usage:
+                                    # The usage chunk comes last, so this is the whole generation time
+                                    self.router.observe(
+                                        route.task, params["model"], time.monotonic() - started,
+                                        chunk.usage.prompt_tokens, chunk.usage.completion_tokens
+                                    )
+                                    await self._record_usage(params["model"], chunk.usage)
+                                if chunk.choices and chunk.choices[0].delta.content:
+                                    chunks.append(chunk.choices[0].delta.content)
+                                    yield chunk.choices[0].delta.content
+                        except asyncio.TimeoutError:
+                            # OpenAI was still answering (or trickling): counts against the breaker
+                            self.stats["timeouts"] += 1
+                            self.stats["upstream_timeouts"] += 1
+                            raise TimeoutError(f"OpenAI stream exceeded {route.timeout_seconds}s deadline")
+                    break
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    delay = self.upstream.backoff(attempt)
+                    # Only retried before the first chunk (after that the caller already
+                    # has part of the answer), and only if the retry fits in the deadline
+                    if chunks or not self.upstream.should_retry(e, attempt) or delay >= remaining():
+                        self.upstream.stats["failures"] += 1
+                        raise
+                    print(f"OpenAI stream failed before its first chunk ({e}), retry {attempt} in {delay:.1f}s")
+                    self.upstream.stats["retries"] += 1
+                    attempt += 1
+                    if stream is not None:
+                        await stream.close()
+                        stream = None
+                    await asyncio.sleep(delay)
+            if cache_key and chunks:
+                await self.cache.put(cache_key, "".join(chunks))
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            yield f"Error generating response: {str(e)}"
+        finally:
+            # Release the connection if the consumer stopped early or was cancelled
+            if stream is not None:
+                await stream.close()
+
     async def generate_structured_json(
         self,
         messages: List[Dict[str, str]],
         response_format: Dict[str, Any],
         temperature: float = 0.3,
-        max_tokens: int = 1200
+        max_tokens: Optional[int] = None
     ) -> str:
         """Generate a structured JSON response using response_format constraints."""
+        route = self.router.route(STRUCTURED_JSON, max_tokens)
         try:
-            client = self._get_client()
-            response = await client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                response_format=response_format,
-            )
-            return response.choices[0].message.content or ""
+            with call_context(task=route.task):
+                text = await self._complete_text({
+                    "model": route.model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": route.max_tokens,
+                    "response_format": response_format
+                })
+            return text or ""
         except Exception as e:
             print(f"OpenAI API error: {e}")
             return f"Error generating response: {str(e)}"
 
+    def _cache_endpoint(self) -> Optional[str]:
+        """The opted-in endpoint/phase label of the current call, or None if it isn't cacheable"""
+        if self.cache is None:
+            return None
+        labels = current_labels()
+        for label in (labels.get("endpoint"), labels.get("phase")):
+            if label in self.cache_endpoints:
+                return label
+        return None
+
+    async def _complete_text(self, params: Dict[str, Any]) -> Optional[str]:
+        """Completion text, from the completion cache or an identical call in flight when possible"""
+        cache_endpoint = self._cache_endpoint()
+        cache_key = completion_key(params) if cache_endpoint else None
+        if cache_key:
+            cached = await self.cache.get(cache_key, cache_endpoint)
+            if cached is not None:
+                return cached
+
+        # Batch jobs coalesce identical requests themselves, and a discussion waiting on
+        # another's call would hold up its lockstep phase (see services/openai_batch.py)
+        if self.single_flight is not None and not self.in_batch_mode():
+            response = await self.single_flight.do(
+                cache_key or completion_key(params),
+                lambda: self._complete(**params)
+            )
+        else:
+            response = await self._complete(**params)
+        text = response.choices[0].message.content
+        if cache_key and text:
+            await self.cache.put(cache_key, text)
+        return text
+
+    def batch_mode(self):
+        """Context manager: completions requested inside it go through the Batch API"""
+        return call_context(mode=BATCH_MODE)
+
+    def in_batch_mode(self) -> bool:
+        return current_labels().get("mode") == BATCH_MODE
+
+    def _admit(self, params: Dict[str, Any]):
+        """Cap max_tokens and check the daily budget before dispatching (raises BudgetExceededError)"""
+        if self.max_tokens_per_request and params["max_tokens"] > self.max_tokens_per_request:
+            params["max_tokens"] = self.max_tokens_per_request
+        self.usage.check_budget(params["model"], _prompt_tokens(params), params["max_tokens"])
+
+    def _observe_route(self, params: Dict[str, Any], seconds: Optional[float], usage: Any):
+        self.router.observe(
+            current_labels().get("task"), params["model"], seconds, usage.prompt_tokens, usage.completion_tokens
+        )
+
+    async def _record_usage(self, model: str, usage: Any, price_multiplier: float = 1.0):
+        await self.usage.record(
+            model=model,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=_cached_tokens(usage),
+            labels=current_labels(),
+            price_multiplier=price_multiplier
+        )
+
+    async def _complete(self, **params: Any):
+        """Chat completion under the per-call deadline, hedged if enabled, retried if transient"""
+        self._admit(params)
+        self.stats["requests"] += 1
+        if self.in_batch_mode():
+            self.stats["batched"] += 1
+            response = await self.batch.submit(params)
+            if response.usage:
+                self._observe_route(params, None, response.usage)
+                await self._record_usage(params["model"], response.usage, self.batch_price_multiplier)
+            return response
+        timeout = self.router.policy(current_labels().get("task")).timeout_seconds
+        call = _Call()
+        try:
+            return await asyncio.wait_for(
+                self.upstream.run(lambda: self._hedged(params, call)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            if call.upstream_attempts:
+                # OpenAI was still answering, so it's a hanging upstream rather than
+                # a call stuck behind our own rate limiter: count it against the breaker
+                self.stats["upstream_timeouts"] += 1
+                self.upstream.breaker.record_failure()
+            raise TimeoutError(f"OpenAI call exceeded {timeout}s deadline")
+
+    async def _attempt(self, params: Dict[str, Any], call: _Call, admitted: Optional[asyncio.Event] = None):
+        client = self._get_client()
+        async with self.limiter.slot(_estimated_tokens(params)):
+            # Measured after the limiter so queueing doesn't skew hedge delays
+            started = time.monotonic()
+            call.upstream_attempts += 1
+            if admitted is not None:
+                admitted.set()
+            try:
+                response = await client.chat.completions.create(**params)
+            except Exception:
+                call.upstream_attempts -= 1
+                raise
+            # Left counted if cancelled: a deadline that cuts it off was spent on OpenAI
+            call.upstream_attempts -= 1
+        elapsed = time.monotonic() - started
+        self.latency.record(_latency_key(params), elapsed)
+        if response.usage:
+            self.prompt_cache_latency.record(
+                "cached_prefix" if _cached_tokens(response.usage) else "uncached", elapsed
+            )
+            self._observe_route(params, elapsed, response.usage)
+            await self._record_usage(params["model"], response.usage)
+        return response
+
+    def _hedge_delay(self, params: Dict[str, Any]) -> Optional[float]:
+        """Seconds to wait before sending a duplicate, or None to not hedge"""
+        if not self.hedge_enabled:
+            return None
+        p = self.latency.percentile(
+            _latency_key(params), self.hedge_percentile, min_samples=self.hedge_min_samples
+        )
+        return None if p is None else max(p, self.hedge_min_delay)
+
+    async def _hedged(self, params: Dict[str, Any], call: _Call):
+        delay = self._hedge_delay(params)
+        admitted = asyncio.Event()
+        primary = asyncio.create_task(self._attempt(params, call, admitted))
+        pending = {primary}
+        hedged = False
+        try:
+            if delay is not None:
+                # The hedge delay starts once the primary is past the rate limiter:
+                # time queued behind our own limiter isn't OpenAI being slow, and a
+                # duplicate sent then would only add to the queue
+                admission = asyncio.create_task(admitted.wait())
+                try:
+                    await asyncio.wait({primary, admission}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    admission.cancel()
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    pending.add(asyncio.create_task(self._attempt(params, call)))
+                    hedged = True
+                    self.stats["hedges_sent"] += 1
+
+            # First successful completion wins; only fail once every attempt has failed
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            self.stats["primary_wins" if task is primary else "hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # The losing attempt is cancelled so it stops using upstream capacity
+            for task in pending:
+                task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Deadline, hedging and latency metrics"""
+        hedged = self.stats["hedges_sent"]
+        return {
+            **self.stats,
+            "hedge_rate": hedged / self.stats["requests"] if self.stats["requests"] else 0.0,
+            "latency_by_model_and_max_tokens": self.latency.summary(),
+            "latency_by_prompt_cache": self.prompt_cache_latency.summary(),
+            "rate_limiter": self.limiter.metrics(),
+            "completion_cache": self.cache.metrics() if self.cache else None,
+            "single_flight": self.single_flight.metrics() if self.single_flight else None,
+            "batch": self.batch.metrics(),
+            "routes": self.router.metrics()
+        }
+
     async def generate_agent_response(
         self,
         agent_name: str,
@@ -0,0 +1,281 @@
+"""
+Rate limiting for upstream APIs and incoming requests
+
+Upstream calls (OpenAI, Linkup, Airia) go through an UpstreamLimiter:
+- token buckets for requests and (for OpenAI) tokens per minute, so bursts
+  from parallel turns are smoothed out before the upstream rejects them
+- AIMD concurrency: the in-flight limit is halved when the upstream answers
+  429/5xx or times out, and grows by one per limit's worth of successes
+- Retry-After on a 429 pauses the upstream's request bucket
+
+Incoming API requests are limited per client with ClientWindowLimiter, using
+the same RATE_LIMIT_* settings as the Node proxy (index.js). Behind reverse
+proxies (TRUSTED_PROXY_HOPS), the client is read from X-Forwarded-For.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+import httpx
+
+from config import settings
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _reserve(self, amount: float) -> float:
+        """Take amount now (possibly going into debt) and return how long to wait"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= amount
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._paused_until - now)
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """
+        Wait until amount is available
+
+        Reservations are made without awaiting, so waiters are served in
+        arrival order. Returns the seconds spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        wait = self._reserve(amount)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._tokens += amount  # Give back a reservation that was never used
+                raise
+        return wait
+
+    def pause(self, seconds: float):
+        """Hold all acquisitions for a while (e.g. Retry-After on a 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.limit = float(maximum)
+        self.in_flight = 0
+        # Bumped on every decrease; requests started before it don't decrease again
+        self.epoch = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # Slot was handed over just as we were cancelled
+            elif waiter in self._waiters:
+                # _wake may already have dropped the cancelled waiter
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def on_overload(self, epoch: int):
+        if epoch != self.epoch:
+            return
+        self.limit = max(self.minimum, self.limit / 2)
+        self.epoch += 1
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+def _overload_status(exc: BaseException) -> Tuple[bool, Optional[float]]:
+    """Whether an upstream error means "slow down", and its Retry-After if any"""
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException)):
+        return True, None
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status is None or not (status == 429 or status >= 500):
+        return False, None
+    retry_after = None
+    if status == 429 and isinstance(response, httpx.Response):
+        try:
+            retry_after = float(response.headers.get("retry-after", ""))
+        except ValueError:
+            pass
+    return True, retry_after
+
+
+class UpstreamLimiter:
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        max_concurrency: int,
+        tokens_per_minute: int = 0
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency) if max_concurrency > 0 else None
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "wait_seconds": 0.0,
+            "overloads": 0
+        }
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Hold a rate-limited slot for one upstream call
+
+        Args:
+            tokens: Estimated tokens the call will use (prompt + max_tokens)
+
+        Exceptions raised inside the block are inspected to adapt concurrency,
+        then re-raised unchanged.
+        """
+        waited = 0.0
+        if self.requests:
+            waited += await self.requests.acquire()
+        if self.tokens and tokens:
+            waited += await self.tokens.acquire(tokens)
+        started = time.monotonic()
+        if self.concurrency:
+            await self.concurrency.acquire()
+        waited += time.monotonic() - started
+        epoch = self.concurrency.epoch if self.concurrency else 0
+
+        self.stats["requests"] += 1
+        self.stats["wait_seconds"] += waited
+        if waited > 0.001:
+            self.stats["throttled"] += 1
+        try:
+            yield
+        except Exception as e:
+            overloaded, retry_after = _overload_status(e)
+            if overloaded:
+                self.stats["overloads"] += 1
+                if self.concurrency:
+                    self.concurrency.on_overload(epoch)
+                if retry_after and self.requests:
+                    self.requests.pause(retry_after)
+            raise
+        else:
+            if self.concurrency:
+                self.concurrency.on_success()
+        finally:
+            if self.concurrency:
+                self.concurrency.release()
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 3),
+            "concurrency_limit": round(self.concurrency.limit, 2) if self.concurrency else None,
+            "in_flight": self.concurrency.in_flight if self.concurrency else None
+        }
+
+
+def client_address(scope: Dict, trusted_hops: Optional[int] = None) -> str:
+    """
+    The address to rate-limit an ASGI request by
+
+    Args:
+        scope: The request's ASGI scope
+        trusted_hops: Reverse proxies in front of the app (TRUSTED_PROXY_HOPS by default)
+
+    Returns:
+        The address the nearest trusted proxy saw the request come from, or
+        the socket peer when there are no trusted proxies or the header is short
+    """
+    hops = settings.trusted_proxy_hops if trusted_hops is None else trusted_hops
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if hops <= 0:
+        return peer
+    forwarded = [
+        address.strip()
+        for name, value in scope.get("headers", [])
+        if name == b"x-forwarded-for"
+        for address in value.decode("latin-1").split(",")
+        if address.strip()
+    ]
+    # Each trusted proxy appends the address it saw; anything further left is client-supplied
+    return forwarded[-hops] if len(forwarded) >= hops else peer
+
+
+class ClientWindowLimiter:
+    def __init__(self, max_requests: int, window_minutes: int):
+        self.max_requests = max_requests
+        self.window_seconds = window_minutes * 60
+        # Client key -> (window start, request count)
+        self._windows: Dict[str, Tuple[float, int]] = {}
+
+    def check(self, client: str) -> Optional[float]:
+        """
+        Count a request from a client
+
+        Returns:
+            None if allowed, else seconds until the client's window resets
+        """
+        if self.max_requests <= 0:
+            return None
+        now = time.monotonic()
+        if len(self._windows) > 10000:
+            self._windows = {
+                key: window for key, window in self._windows.items()
+                if now - window[0] < self.window_seconds
+            }
+        start, count = self._windows.get(client, (now, 0))
+        if now - start >= self.window_seconds:
+            start, count = now, 0
+        if count >= self.max_requests:
+            return self.window_seconds - (now - start)
+        self._windows[client] = (start, count + 1)
+        return None
+
+
+openai_limiter = UpstreamLimiter(
+    "openai",
+    requests_per_minute=settings.openai_requests_per_minute,
+    max_concurrency=settings.openai_max_concurrency,
+    tokens_per_minute=settings.openai_tokens_per_minute
+)
+linkup_limiter = UpstreamLimiter(
+    "linkup",
+    requests_per_minute=settings.linkup_requests_per_minute,
+    max_concurrency=settings.linkup_max_concurrency
+)
+airia_limiter = UpstreamLimiter(
+    "airia",
+    requests_per_minute=settings.airia_requests_per_minute,
+    max_concurrency=settings.airia_max_concurrency
+)
+upstream_limiters = {limiter.name: limiter for limiter in (openai_limiter, linkup_limiter, airia_limiter)}
+
+# Per-client limits on incoming requests (all /api routes, and the stricter AI routes)
+api_limiter = ClientWindowLimiter(settings.rate_limit_max_requests, settings.rate_limit_window_minutes)
+ai_api_limiter = ClientWindowLimiter(settings.ai_rate_limit_max_requests, settings.rate_limit_window_minutes)
@@ -0,0 +1,212 @@
+"""
+Research Fan-out - Multi-query web research with dedupe and ranking
+
+The question is expanded into a few focused sub-queries (the question
+itself, then its key terms plus a trends, benchmarks or competitors angle),
+which run concurrently against Linkup under RESEARCH_CONCURRENCY. Whatever
+has come back by RESEARCH_DEADLINE_SECONDS is used and the rest is
+cancelled, so the fan-out never takes longer than one slow search did.
+
+Results are merged by URL and ranked the way build_query_pack.ts ranks
+research findings, score = confidence x relevance, weighted by recency:
+- confidence: how highly and how often the sub-queries returned the page
+- relevance: share of the question's key terms in the title and snippet
+- recency: newest year the result mentions, halving every
+  RECENCY_HALF_LIFE_YEARS (undated results get UNDATED_RECENCY)
+"""
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from services.latency import LatencyTracker
+from services.linkup_service import linkup_service
+from services.search_cache import search_key
+from similarity import STOPWORDS
+
+# Angles appended to the question's key terms, in the order they are used
+SUBQUERY_ANGLES = (
+    "market trends {year}",
+    "industry statistics benchmarks",
+    "competitors case studies",
+)
+# Results kept per sub-query before merging
+RESULTS_PER_QUERY = 10
+RECENCY_HALF_LIFE_YEARS = 2.0
+UNDATED_RECENCY = 0.6
+# Key terms carried into the angled sub-queries
+MAX_KEY_TERMS = 8
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+
+
+@dataclass
+class Finding:
+    title: str
+    url: str
+    snippet: str
+    confidence: float
+    relevance: float
+    recency: float
+    queries: int  # Sub-queries that returned this page
+
+    @property
+    def score(self) -> float:
+        return round(self.confidence * self.relevance * self.recency, 2)
+
+
+def key_terms(text: str) -> List[str]:
+    """Distinct non-stopword terms, in order of appearance"""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if word not in STOPWORDS and len(word) > 2 and word not in terms:
+            terms.append(word)
+    return terms
+
+
+def expand_query(question: str, count: int, today: Optional[date] = None) -> List[str]:
+    """
+    Sub-queries for a question
+
+    Args:
+        question: The discussion question
+        count: Number of sub-queries wanted (the question itself is always first)
+        today: Reference date for year-specific angles
+
+    Returns:
+        Up to count distinct queries
+    """
+    year = (today or date.today()).year
+    core = " ".join(key_terms(question)[:MAX_KEY_TERMS])
+    candidates = [question]
+    if core:
+        candidates += [f"{core} {angle.format(year=year)}" for angle in SUBQUERY_ANGLES]
+
+    queries, seen = [], set()
+    for query in candidates:
+        key = search_key(query, "standard", "searchResults")
+        if key not in seen:
+            seen.add(key)
+            queries.append(query)
+    return queries[:max(count, 1)]
+
+
+def _recency(result: Dict[str, Any], this_year: int) -> float:
+    years = [int(year) for year in _YEAR.findall(" ".join(
+        str(result.get(field) or "") for field in ("date", "publishedDate", "published_date", "name", "title", "content")
+    ))]
+    years = [year for year in years if year <= this_year]
+    if not years:
+        return UNDATED_RECENCY
+    return 0.5 ** ((this_year - max(years)) / RECENCY_HALF_LIFE_YEARS)
+
+
+class ResearchFanout:
+    def __init__(self):
+        self.stats = {
+            "runs": 0,
+            "queries": 0,
+            "queries_timed_out": 0,
+            "results": 0,
+            "duplicates": 0,
+            "deadline_hits": 0
+        }
+        self.latency = LatencyTracker()
+
+    async def research(self, question: str, max_results: Optional[int] = None) -> List[Finding]:
+        """
+        Search the web for a question
+
+        Args:
+            question: The discussion question
+            max_results: Findings to return (RESEARCH_MAX_RESULTS by default)
+
+        Returns:
+            Findings ranked by score, best first (empty when nothing came back in time)
+        """
+        started = time.perf_counter()
+        queries = expand_query(question, settings.research_subqueries)
+        self.stats["runs"] += 1
+        self.stats["queries"] += len(queries)
+
+        semaphore = asyncio.Semaphore(max(settings.research_concurrency, 1))
+
+        async def search(query: str) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await linkup_service.search_results(query, max_results=RESULTS_PER_QUERY)
+
+        tasks = [asyncio.ensure_future(search(query)) for query in queries]
+        try:
+            done, pending = await asyncio.wait(tasks, timeout=settings.research_deadline_seconds)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if pending:
+            self.stats["deadline_hits"] += 1
+            self.stats["queries_timed_out"] += len(pending)
+
+        # Results per sub-query, in query order so ties favour the question itself
+        result_lists = []
+        for task in tasks:
+            if task not in done:
+                continue
+            if task.exception() is not None:
+                print(f"⚠️  Research sub-query failed: {task.exception()}")
+            else:
+                result_lists.append(task.result())
+
+        findings = self._rank(question, result_lists)
+        self.latency.record("research", time.perf_counter() - started)
+        return findings[:max_results or settings.research_max_results]
+
+    def _rank(self, question: str, result_lists: List[List[Dict[str, Any]]]) -> List[Finding]:
+        """Merge results by URL and sort them by score"""
+        terms = set(key_terms(question))
+        this_year = date.today().year
+        merged: Dict[str, Tuple[Dict[str, Any], List[int]]] = {}
+        for results in result_lists:
+            for rank, result in enumerate(results):
+                url = (result.get("url") or "").rstrip("/")
+                if not url:
+                    continue
+                self.stats["results"] += 1
+                if url in merged:
+                    self.stats["duplicates"] += 1
+                    merged[url][1].append(rank)
+                    # Keep the fuller snippet of the two
+                    if len(result.get("content") or "") > len(merged[url][0].get("content") or ""):
+                        merged[url] = ({**merged[url][0], "content": result["content"]}, merged[url][1])
+                else:
+                    merged[url] = (result, [rank])
+
+        findings = []
+        for url, (result, ranks) in merged.items():
+            title = result.get("name", result.get("title", "Untitled"))
+            snippet = result.get("content", result.get("snippet", "No description"))
+            page_terms = set(key_terms(f"{title} {snippet}"))
+            findings.append(Finding(
+                title=title,
+                url=url,
+                snippet=snippet,
+                # A first-place result is fully trusted; lower places add up across sub-queries
+                confidence=min(1.0, sum(1 / (rank + 1) for rank in ranks)),
+                relevance=max(len(terms & page_terms) / len(terms), 0.1) if terms else 1.0,
+                recency=_recency(result, this_year),
+                queries=len(ranks)
+            ))
+        findings.sort(key=lambda finding: finding.score, reverse=True)
+        return findings
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "latency": self.latency.summary().get("research")
+        }
+
+
+research_fanout = ResearchFanout()
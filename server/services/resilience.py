@@ -0,0 +1,218 @@
+"""
+Resilience for upstream calls - classified retries and circuit breakers
+
+Each upstream (OpenAI, Linkup, Airia) has one ResilientUpstream:
+- Transient failures (timeouts, connection errors, 408/429/5xx) are retried
+  with exponential backoff and full jitter; other errors fail immediately.
+- A circuit breaker opens after consecutive transient failures. While open,
+  calls fail fast with CircuitOpenError instead of waiting on timeouts, so
+  callers can go straight to their fallback. After a cool-down a single probe
+  call is let through (half-open); its outcome closes or re-opens the breaker.
+
+Breaker states are reported by /health.
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, TypeVar
+
+import httpx
+
+from config import settings
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether an upstream error is worth retrying (and counts against the breaker)"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    # openai's connection and timeout errors don't share a base class with httpx's
+    if type(exc).__name__ in ("APIConnectionError", "APITimeoutError"):
+        return True
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    return status in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return self._state
+
+    def allows(self) -> bool:
+        """Whether a call would be let through right now (without claiming the probe)"""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._probe_in_flight)
+
+    def acquire(self) -> bool:
+        """
+        Claim permission for one call
+
+        Returns:
+            True if the call is the half-open probe
+
+        Raises:
+            CircuitOpenError: If the breaker is open (or a probe is already running)
+        """
+        if not self.allows():
+            raise CircuitOpenError(f"{self.name} circuit is open, failing fast")
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._state = CLOSED
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probe_in_flight or self.failures >= self.failure_threshold:
+            if self._state != OPEN or self._probe_in_flight:
+                print(f"⚠️  {self.name} circuit opened after {self.failures} failures")
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """A probe ended without an outcome (e.g. cancelled); let another one through"""
+        self._probe_in_flight = False
+
+
+class ResilientUpstream:
+    def __init__(
+        self,
+        name: str,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        failure_threshold: int,
+        reset_seconds: float
+    ):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_seconds)
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "short_circuited": 0
+        }
+
+    def should_retry(self, exc: BaseException, attempt: int) -> bool:
+        """Whether attempt number attempt (1-based), which failed with exc, is worth another try"""
+        return is_transient(exc) and attempt < self.max_attempts and self.breaker.allows()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number attempt (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """
+        Run one attempt under the breaker, without retrying
+
+        Used directly where a retry isn't safe (e.g. a stream that has
+        already yielded output).
+        """
+        try:
+            probe = self.breaker.acquire()
+        except CircuitOpenError:
+            self.stats["short_circuited"] += 1
+            raise
+        try:
+            yield
+        except Exception as e:
+            if is_transient(e):
+                self.breaker.record_failure()
+            elif probe:
+                self.breaker.release_probe()
+            raise
+        except BaseException:
+            # Cancelled (or a stream closed early): no verdict on the upstream
+            if probe:
+                self.breaker.release_probe()
+            raise
+        else:
+            self.breaker.record_success()
+
+    async def run(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """
+        Call operation with retries and the circuit breaker
+
+        Args:
+            operation: Zero-argument coroutine function making one upstream attempt
+
+        Returns:
+            The operation's result
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+            Exception: The last error once retries are exhausted, or the
+                first non-transient error
+        """
+        self.stats["calls"] += 1
+        attempt = 1
+        while True:
+            try:
+                async with self.guard():
+                    return await operation()
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    self.stats["failures"] += 1
+                    raise
+                delay = self.backoff(attempt)
+                print(f"{self.name} call failed ({e}), retry {attempt} in {delay:.1f}s")
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def metrics(self) -> Dict[str, object]:
+        return {**self.stats, "state": self.breaker.state, "consecutive_failures": self.breaker.failures}
+
+
+def _upstream(name: str) -> ResilientUpstream:
+    return ResilientUpstream(
+        name,
+        max_attempts=settings.upstream_retry_attempts,
+        base_delay=settings.upstream_retry_base_delay_seconds,
+        max_delay=settings.upstream_retry_max_delay_seconds,
+        failure_threshold=settings.circuit_failure_threshold,
+        reset_seconds=settings.circuit_reset_seconds
+    )
+
+
+openai_upstream = _upstream("openai")
+linkup_upstream = _upstream("linkup")
+airia_upstream = _upstream("airia")
+upstreams = {upstream.name: upstream for upstream in (openai_upstream, linkup_upstream, airia_upstream)}
@@ -0,0 +1,154 @@
+"""
+Search Cache - TTL cache for Linkup results with stale-while-revalidate
+
+Entries are fresh for SEARCH_CACHE_TTL_SECONDS and then stale for
+SEARCH_CACHE_STALE_SECONDS more: a stale entry is still served immediately
+while the caller refreshes it in the background. Failed searches are
+remembered for a short negative TTL, so an erroring query isn't retried on
+every phase of every discussion. Recently used entries live in a bounded
+in-memory LRU; with SEARCH_CACHE_PATH set they are also kept in SQLite and
+survive restarts.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+FRESH = "fresh"
+STALE = "stale"
+NEGATIVE = "negative"
+
+
+def search_key(query: str, depth: str, output_type: str) -> str:
+    """Cache key: case, surrounding punctuation and whitespace runs don't make a query different"""
+    normalized = " ".join(query.lower().split()).strip(" ?!.")
+    return f"{depth}|{output_type}|{normalized}"
+
+
+@dataclass(frozen=True)
+class SearchEntry:
+    stored_at: float
+    value: Dict[str, Any]
+    negative: bool = False
+
+
+class SearchCache:
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float,
+        stale_seconds: float,
+        negative_ttl_seconds: float,
+        max_entries: int
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, SearchEntry]" = OrderedDict()
+        self.stats = {
+            "fresh_hits": 0,
+            "stale_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_failures": 0
+        }
+        if self.path:
+            self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def _init_db(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS searches (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    negative INTEGER NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS searches_stored_at ON searches (stored_at)")
+
+    def state(self, entry: SearchEntry, now: Optional[float] = None) -> Optional[str]:
+        """FRESH, STALE or NEGATIVE while an entry may be served, None once it has expired"""
+        age = (now or time.time()) - entry.stored_at
+        if entry.negative:
+            return NEGATIVE if age < self.negative_ttl_seconds else None
+        if age < self.ttl_seconds:
+            return FRESH
+        if age < self.ttl_seconds + self.stale_seconds:
+            return STALE
+        return None
+
+    async def get(self, key: str) -> Optional[SearchEntry]:
+        """
+        Look up a search
+
+        Returns:
+            The entry while it may be served (check state() for how), or None
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        elif self.path:
+            entry = await asyncio.to_thread(self._load, key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        state = self.state(entry) if entry is not None else None
+        if state is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats[f"{state}_hits"] += 1
+        return entry
+
+    async def put(self, key: str, value: Dict[str, Any], negative: bool = False):
+        """Store a search result (or, with negative, the error it failed with)"""
+        entry = SearchEntry(time.time(), value, negative)
+        self._remember(key, entry)
+        if self.path:
+            await asyncio.to_thread(self._save, key, entry)
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = sum(self.stats[outcome] for outcome in ("fresh_hits", "stale_hits", "negative_hits", "misses"))
+        served = self.stats["fresh_hits"] + self.stats["stale_hits"]
+        return {
+            **self.stats,
+            "hit_rate": served / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+    def _remember(self, key: str, entry: SearchEntry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[SearchEntry]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT value, stored_at, negative FROM searches WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return SearchEntry(stored_at=row[1], value=json.loads(row[0]), negative=bool(row[2]))
+
+    def _save(self, key: str, entry: SearchEntry):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO searches (key, value, stored_at, negative) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(entry.value), entry.stored_at, int(entry.negative))
+            )
+            # Rows past their stale window are pruned as new ones are written
+            conn.execute(
+                "DELETE FROM searches WHERE stored_at < ?",
+                (time.time() - self.ttl_seconds - self.stale_seconds,)
+            )
@@ -0,0 +1,64 @@
+"""
+Single-flight - Coalesces identical concurrent upstream calls
+
+The first caller for a key starts the call; identical callers that arrive
+while it is still running await the same result instead of making their own
+request. Nothing is kept once the call finishes, so this only removes
+duplicate work during spikes and never serves stale results. If every caller
+waiting on a call is cancelled (e.g. their clients disconnected), the call
+is cancelled too.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        # Key -> [shared task, number of callers waiting on it]
+        self._calls: Dict[Hashable, List[Any]] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, operation: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run operation, or join an identical call already in flight
+
+        Args:
+            key: Identity of the call (equal keys must mean interchangeable results)
+            operation: Zero-argument coroutine function making the call
+
+        Returns:
+            The (shared) result; exceptions are shared the same way
+        """
+        self.stats["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(operation())
+            call = [task, 0]
+            self._calls[key] = call
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.stats["coalesced"] += 1
+
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if call[1] == 1 and not task.done():
+                # Nobody else is waiting for it; later callers start afresh
+                task.cancel()
+                self._forget(key, task)
+            raise
+        finally:
+            call[1] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "in_flight": len(self._calls)}
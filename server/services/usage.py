@@ -0,0 +1,277 @@
+"""
+Usage Meter - Token and cost accounting for OpenAI calls
+
+Every completion's reported usage (prompt, cached prompt and completion
+tokens) is priced at the rate of the model that served it and attributed
+using the call context labels: endpoint, discussion, phase and agent. Today's totals are persisted in SQLite so the
+daily budget survives restarts, and calls are refused before dispatch once
+DAILY_BUDGET_LIMIT would be exceeded.
+"""
+import asyncio
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import settings
+
+# Breakdown dimensions, each a call context label
+DIMENSIONS = ("endpoint", "phase", "agent", "model")
+UNLABELLED = "other"
+
+
+class BudgetExceededError(Exception):
+    """Raised instead of dispatching a call that would exceed the daily budget"""
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    # USD per million tokens
+    input: float
+    cached_input: float
+    output: float
+
+
+# List prices; OPENAI_MODEL_PRICES adds or overrides models, and models that
+# match none of these are priced at OPENAI_*_COST_PER_MILLION
+MODEL_PRICES = {
+    "gpt-4o-mini": ModelPrice(0.15, 0.075, 0.60),
+    "gpt-4o": ModelPrice(2.50, 1.25, 10.00),
+    "gpt-4.1-nano": ModelPrice(0.10, 0.025, 0.40),
+    "gpt-4.1-mini": ModelPrice(0.40, 0.10, 1.60),
+    "gpt-4.1": ModelPrice(2.00, 0.50, 8.00),
+    "o4-mini": ModelPrice(1.10, 0.275, 4.40),
+    "gpt-3.5-turbo": ModelPrice(0.50, 0.50, 1.50),
+}
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+    def add(self, other: "Usage"):
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.cached_tokens += other.cached_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cost += other.cost
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **asdict(self),
+            "cost": round(self.cost, 6),
+            # Share of prompt tokens served from the provider's prompt cache
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0
+        }
+
+
+class UsageMeter:
+    def __init__(
+        self,
+        path: str,
+        daily_limit: float,
+        default_price: ModelPrice,
+        model_prices: Dict[str, ModelPrice],
+        max_discussions: int = 100
+    ):
+        self.path = path
+        self.daily_limit = daily_limit
+        self.default_price = default_price
+        self.model_prices = model_prices
+        self.max_discussions = max_discussions
+        self._day = ""
+        self._total = Usage()
+        self._by: Dict[str, Dict[str, Usage]] = {}
+        # Discussion id -> {"question", "usage", "by_phase"}, most recent last
+        self._discussions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.rejected = 0
+        self._init_db()
+        self._roll_day()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def _init_db(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS usage (
+                    day TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    phase TEXT NOT NULL,
+                    agent TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    calls INTEGER NOT NULL,
+                    prompt_tokens INTEGER NOT NULL,
+                    cached_tokens INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL,
+                    cost REAL NOT NULL,
+                    PRIMARY KEY (day, endpoint, phase, agent, model)
+                )"""
+            )
+
+    def _roll_day(self):
+        """Start a new day's totals, loading anything already recorded today"""
+        today = datetime.utcnow().date().isoformat()
+        if today == self._day:
+            return
+        self._day = today
+        self._total = Usage()
+        self._by = {dimension: {} for dimension in DIMENSIONS}
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM usage WHERE day = ?", (today,)).fetchall()
+        for row in rows:
+            _, endpoint, phase, agent, model, *counts = row
+            self._add({"endpoint": endpoint, "phase": phase, "agent": agent, "model": model}, Usage(*counts))
+
+    def _add(self, labels: Dict[str, str], usage: Usage):
+        self._total.add(usage)
+        for dimension in DIMENSIONS:
+            self._by[dimension].setdefault(labels[dimension], Usage()).add(usage)
+
+    def spent_today(self) -> float:
+        self._roll_day()
+        return self._total.cost
+
+    def model_price(self, model: str) -> ModelPrice:
+        """Price of a model; dated snapshots (gpt-4o-2024-08-06) match their base name"""
+        if model in self.model_prices:
+            return self.model_prices[model]
+        matches = [name for name in self.model_prices if model.startswith(f"{name}-")]
+        if matches:
+            return self.model_prices[max(matches, key=len)]
+        return self.default_price
+
+    def price(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        rates = self.model_price(model)
+        return (
+            (prompt_tokens - cached_tokens) * rates.input
+            + cached_tokens * rates.cached_input
+            + completion_tokens * rates.output
+        ) / 1_000_000
+
+    def check_budget(self, model: str, prompt_tokens: int, max_tokens: int):
+        """
+        Refuse a call whose worst-case cost would exceed today's budget
+
+        Args:
+            model: Model the call is routed to
+            prompt_tokens: Estimated prompt tokens
+            max_tokens: Most tokens the call may generate
+
+        Raises:
+            BudgetExceededError: If DAILY_BUDGET_LIMIT is set and would be exceeded
+        """
+        if self.daily_limit <= 0:
+            return
+        if self.spent_today() + self.price(model, prompt_tokens, max_tokens) > self.daily_limit:
+            self.rejected += 1
+            raise BudgetExceededError(
+                f"Daily budget limit reached (${self._total.cost:.4f} of ${self.daily_limit:.2f} used)"
+            )
+
+    def start_discussion(self, discussion_id: str, question: str):
+        """Track per-phase usage for a discussion (the most recent max_discussions are kept)"""
+        self._discussions[discussion_id] = {"question": question, "usage": Usage(), "by_phase": {}}
+        while len(self._discussions) > self.max_discussions:
+            self._discussions.popitem(last=False)
+
+    async def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int,
+        labels: Dict[str, str],
+        price_multiplier: float = 1.0
+    ):
+        """
+        Price and attribute one call's reported usage
+
+        Args:
+            model: Model that served the call
+            prompt_tokens: Prompt tokens, including cached ones
+            completion_tokens: Generated tokens
+            cached_tokens: Prompt tokens served from the provider's prompt cache
+            labels: Call context labels (endpoint, discussion, phase, agent)
+            price_multiplier: Discount applied to list price (e.g. 0.5 for the Batch API)
+        """
+        self._roll_day()
+        usage = Usage(
+            calls=1,
+            prompt_tokens=prompt_tokens,
+            cached_tokens=cached_tokens,
+            completion_tokens=completion_tokens,
+            cost=self.price(model, prompt_tokens, completion_tokens, cached_tokens) * price_multiplier
+        )
+        keys = {dimension: labels.get(dimension) or UNLABELLED for dimension in DIMENSIONS}
+        keys["model"] = model
+        self._add(keys, usage)
+
+        discussion = self._discussions.get(labels.get("discussion", ""))
+        if discussion is not None:
+            discussion["usage"].add(usage)
+            discussion["by_phase"].setdefault(keys["phase"], Usage()).add(usage)
+
+        await asyncio.to_thread(self._save, self._day, keys, usage)
+
+    def _save(self, day: str, keys: Dict[str, str], usage: Usage):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (day, endpoint, phase, agent, model) DO UPDATE SET
+                    calls = calls + excluded.calls,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    cached_tokens = cached_tokens + excluded.cached_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    cost = cost + excluded.cost""",
+                (day, keys["endpoint"], keys["phase"], keys["agent"], keys["model"], *asdict(usage).values())
+            )
+
+    def discussion(self, discussion_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._discussions.get(discussion_id)
+        if entry is None:
+            return None
+        return {
+            "discussion_id": discussion_id,
+            "question": entry["question"],
+            **entry["usage"].to_dict(),
+            "by_phase": {phase: usage.to_dict() for phase, usage in entry["by_phase"].items()}
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """Today's spend against the budget, broken down by endpoint, phase, agent and model"""
+        self._roll_day()
+        return {
+            "date": self._day,
+            **self._total.to_dict(),
+            "limit": self.daily_limit,
+            "remaining": max(self.daily_limit - self._total.cost, 0.0) if self.daily_limit > 0 else None,
+            "rejected_calls": self.rejected,
+            **{
+                f"by_{dimension}": {key: usage.to_dict() for key, usage in self._by[dimension].items()}
+                for dimension in DIMENSIONS
+            },
+            "recent_discussions": [self.discussion(d) for d in reversed(self._discussions)]
+        }
+
+
+usage_meter = UsageMeter(
+    settings.usage_db_path or str(Path(__file__).parent.parent / "usage.db"),
+    daily_limit=settings.daily_budget_limit,
+    default_price=ModelPrice(
+        settings.openai_input_cost_per_million,
+        settings.openai_cached_input_cost_per_million,
+        settings.openai_output_cost_per_million
+    ),
+    model_prices={
+        **MODEL_PRICES,
+        **{model: ModelPrice(**rates) for model, rates in settings.openai_model_prices.items()}
+    }
+)
@@ -0,0 +1,59 @@
+"""
+Text similarity helpers - Cheap local similarity with hashed n-gram vectors
+
+Text is turned into a fixed-size vector of hashed word and character
+trigram counts (the "hashing trick"), L2-normalised so cosine similarity is
+a dot product. No vocabulary, no model download, and a whole matrix of
+stored vectors can be compared against a query in one NumPy call.
+"""
+import re
+import zlib
+
+import numpy as np
+
+DIMENSIONS = 2048
+
+# Function words that carry no topic; negations are kept on purpose
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from has have how i if in
+into is it its may me might my of on or our should so than that the their them
+then there these they this to us was we what when where which who why will with
+would you your
+""".split())
+
+_NON_WORD = re.compile(r"[^a-z0-9\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _NON_WORD.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def content_words(text: str) -> frozenset:
+    """The normalised text's words, minus stopwords"""
+    return frozenset(word for word in normalize_text(text).split(" ") if word and word not in STOPWORDS)
+
+
+def text_vector(text: str, dimensions: int = DIMENSIONS) -> np.ndarray:
+    """Unit-length hashed vector of word unigrams and character trigrams"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    normalized = normalize_text(text)
+    if not normalized:
+        return vector
+
+    features = normalized.split(" ")
+    padded = f" {normalized} "
+    features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    # crc32 rather than hash() so vectors are stable across processes
+    indices = [zlib.crc32(feature.encode()) % dimensions for feature in features]
+    np.add.at(vector, indices, 1.0)
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def similarity(a: str, b: str) -> float:
+    """Cosine similarity of two texts, between 0 and 1"""
+    return float(np.dot(text_vector(a), text_vector(b)))
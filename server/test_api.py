@@ -121,6 +121,28 @@ async def test_analyze_report():
         has_now = any(t.get('priority') == 'Now' for t in action_plan)
         return has_now and isinstance(action_plan, list)
 
+async def test_disconnect_cancels_discussion():
+    """Test that abandoning a discussion mid-way cancels it on the server"""
+    async with httpx.AsyncClient() as client:
+        before = (await client.get(f"{BASE_URL}/api/metrics")).json()["client_disconnects"]["cancelled"]
+        try:
+            # Give up long before a full discussion could finish
+            await client.post(
+                f"{BASE_URL}/api/advisory-board/discuss",
+                json={"question": "How can we reduce churn in the SMB segment?"},
+                timeout=3.0
+            )
+            print("✗ Discussion finished before the client gave up; nothing to cancel")
+            return False
+        except httpx.TimeoutException:
+            pass
+
+        # The server notices within a disconnect poll or two
+        await asyncio.sleep(2.0)
+        after = (await client.get(f"{BASE_URL}/api/metrics")).json()["client_disconnects"]["cancelled"]
+        print(f"\n✓ Cancelled discussions: {before} -> {after}")
+        return after > before
+
 async def main():
     """Run all tests"""
     print("=" * 60)
@@ -133,7 +155,8 @@ async def main():
         ("List Agents", test_list_agents),
         ("Single Agent Query", test_single_agent),
         ("Full Advisory Board Discussion", test_advisory_board),
-        ("Analyze Final Report", test_analyze_report)
+        ("Analyze Final Report", test_analyze_report),
+        ("Disconnect Cancels Discussion", test_disconnect_cancels_discussion)
     ]
 
     results = []
@@ -0,0 +1,800 @@
+"""
+Offline checks of the discussion flow and the upstream plumbing under it,
+run against the fake upstream backend and in-process stand-ins
+No server or API keys needed: python test_discussion_flow.py (or pytest)
+"""
+import asyncio
+import os
+import tempfile
+from dataclasses import replace
+from types import SimpleNamespace
+
+import httpx
+
+os.environ.setdefault("FAKE_BACKEND", "synthetic")
+os.environ.setdefault("FAKE_BACKEND_PROFILE", "instant")
+os.environ.setdefault("USAGE_DB_PATH", os.path.join(tempfile.gettempdir(), "discussion_flow_usage.db"))
+os.environ.setdefault("DAILY_BUDGET_LIMIT", "0")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("COMPLETION_CACHE_ENABLED", "false")
+os.environ.setdefault("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "discussion_flow_jobs.db"))
+
+from answer_cache import SemanticAnswerCache
+from compaction import SUMMARY_MAX_TOKENS, HistoryCompactor
+from convergence import position_similarity
+from models import AgentMessage, BoardDiscussion, DiscussionRound
+from orchestrator import DiscussionOrchestrator
+from services.completion_cache import CompletionCache, completion_key
+from services.linkup_service import linkup_service
+from services.model_router import DELIBERATION, PROBE_EVERY, SLO_WINDOW, SYNTHESIS, ModelRouter, default_policies
+from services.openai_service import OpenAIService, openai_service
+from services.rate_limiter import AdaptiveConcurrency, ClientWindowLimiter, TokenBucket, UpstreamLimiter
+from services.resilience import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, ResilientUpstream
+from services.search_cache import SearchCache
+from services.single_flight import SingleFlight
+from transcript import EMPTY_HISTORY, Transcript
+from scheduler import Lockstep, SEQUENTIAL, SNAPSHOT, build_turns, run_turns, split_panels
+
+QUESTION = "How should we reduce churn in the SMB segment?"
+
+
+async def run_recorded(orchestrator: DiscussionOrchestrator):
+    """Run a discussion, recording the messages of every OpenAI request"""
+    requests = []
+    generate_response = openai_service.generate_response
+
+    async def recording(messages, *args, **kwargs):
+        requests.append([dict(message) for message in messages])
+        return await generate_response(messages, *args, **kwargs)
+
+    openai_service.generate_response = recording
+    try:
+        discussion = await orchestrator.conduct_discussion(QUESTION)
+    finally:
+        openai_service.generate_response = generate_response
+    return discussion, requests
+
+
+def hierarchical_orchestrator(rounds: int) -> DiscussionOrchestrator:
+    """Three agents in panels of two: [Sales, Customer Success] and [Research]"""
+    orchestrator = DiscussionOrchestrator()
+    orchestrator.deliberation_mode = "fixed"
+    orchestrator.deliberation_topology = "hierarchical"
+    orchestrator.panel_size = 2
+    orchestrator.deliberation_rounds = rounds
+    return orchestrator
+
+
+def test_panel_peer_hears_lead_debate():
+    """A panel member is shown its lead's top-level debate statement"""
+    orchestrator = hierarchical_orchestrator(rounds=2)
+    discussion, requests = asyncio.run(run_recorded(orchestrator))
+    lead, peer = orchestrator.agents[0], orchestrator.agents[1]
+
+    first_deliberation = next(r for r in discussion.rounds if r.round_type == "deliberation")
+    lead_messages = [m for m in first_deliberation.messages if m.agent == lead.name]
+    assert len(lead_messages) == 2, "the lead speaks once in its panel and once in the debate"
+    debate = next(m.message for m in lead_messages if m.message_type == "panel_debate")
+
+    peer_requests = [r for r in requests if r[0]["role"] == "system" and peer.name in r[0]["content"]]
+    assert any(debate in m["content"] for r in peer_requests for m in r), \
+        f"{peer.name} never received {lead.name}'s debate statement"
+    print(f"✓ {peer.name} received {lead.name}'s debate statement")
+
+
+def test_leads_continue_earlier_debate():
+    """Panel leads see the previous round's top-level debate"""
+    orchestrator = hierarchical_orchestrator(rounds=2)
+    discussion, requests = asyncio.run(run_recorded(orchestrator))
+    lead, other_lead = orchestrator.agents[0], orchestrator.agents[2]
+
+    first_deliberation = next(r for r in discussion.rounds if r.round_type == "deliberation")
+    debate = next(
+        m.message for m in first_deliberation.messages
+        if m.agent == other_lead.name and m.message_type == "panel_debate"
+    )
+
+    lead_requests = [r for r in requests if r[0]["role"] == "system" and lead.name in r[0]["content"]]
+    assert any(debate in m["content"] for r in lead_requests for m in r), \
+        f"{lead.name} never received {other_lead.name}'s earlier debate statement"
+    print(f"✓ {lead.name} received {other_lead.name}'s earlier debate statement")
+
+
+def test_answer_cache_needs_same_content_words():
+    """The answer cache never serves a discussion of a different question"""
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=60, max_entries=4)
+    stored = BoardDiscussion(question="Should we raise prices?", rounds=[], total_rounds=0)
+    cache.store(stored.question, "data-v1", stored)
+
+    assert cache.lookup("Should we lower prices?", "data-v1") is None, "served the opposite question"
+    assert cache.lookup("should we RAISE prices", "data-v2") is None, "served a discussion of stale data"
+    hit = cache.lookup("should we RAISE prices", "data-v1")
+    assert hit is not None, "missed a question that normalises to the same text"
+    assert hit.question == "Should we raise prices?", "relabelled the stored discussion"
+    print("✓ Answer cache only reuses discussions of the same question")
+
+
+class StubCompletions:
+    """chat.completions stand-in that answers after a fixed delay"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.calls = 0
+
+    async def create(self, **params):
+        self.calls += 1
+        await asyncio.sleep(self.seconds)
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=message)])
+
+
+def stub_service(upstream_seconds: float, max_concurrency: int) -> OpenAIService:
+    """An OpenAIService hedging after 50ms, behind a limiter of max_concurrency"""
+    service = OpenAIService()
+    completions = StubCompletions(upstream_seconds)
+    service._get_client = lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    service.limiter = UpstreamLimiter("test", requests_per_minute=0, max_concurrency=max_concurrency)
+    service.hedge_enabled = True
+    service._hedge_delay = lambda params: 0.05
+    return service
+
+
+async def complete_many(service: OpenAIService, count: int):
+    params = {"model": "test-model", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 10}
+    await asyncio.gather(*(service._complete(**params) for _ in range(count)))
+
+
+def test_hedge_delay_starts_after_rate_limiter():
+    """Calls queued behind the limiter aren't hedged; calls slow upstream are"""
+    queued = stub_service(upstream_seconds=0.03, max_concurrency=1)
+    asyncio.run(complete_many(queued, 8))
+    assert queued.stats["hedges_sent"] == 0, f"hedged {queued.stats['hedges_sent']} calls that were only queued"
+
+    slow = stub_service(upstream_seconds=0.2, max_concurrency=2)
+    asyncio.run(complete_many(slow, 1))
+    assert slow.stats["hedges_sent"] == 1, "a slow upstream call wasn't hedged"
+    print("✓ Hedge delay runs from the rate limiter slot, not from the queue")
+
+
+async def api_statuses(requests, api_limit: int, trusted_hops: int):
+    """Status codes of (method, path, headers) requests, with a fresh API limit of api_limit"""
+    import main as server
+    from config import settings
+
+    limiter = server.api_limiter
+    hops = settings.trusted_proxy_hops
+    server.api_limiter = ClientWindowLimiter(api_limit, window_minutes=15)
+    settings.trusted_proxy_hops = trusted_hops
+    try:
+        transport = httpx.ASGITransport(app=server.app, client=("10.0.0.1", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [(await client.request(method, path, headers=headers)).status_code for method, path, headers in requests]
+    finally:
+        server.api_limiter = limiter
+        settings.trusted_proxy_hops = hops
+
+
+def test_job_polls_skip_api_limit():
+    """Polling a job's status doesn't count against the per-client API limit"""
+    polls = [("GET", "/api/advisory-board/jobs/unknown", {})] * 5
+    statuses = asyncio.run(api_statuses(polls + [("GET", "/api/agents", {})] * 3, api_limit=2, trusted_hops=0))
+    assert statuses[:5] == [404] * 5, f"job polls were rate limited: {statuses[:5]}"
+    assert statuses[5:] == [200, 200, 429], f"other routes weren't limited: {statuses[5:]}"
+    print("✓ Job status polls aren't rate limited")
+
+
+def test_api_limit_per_forwarded_client():
+    """Behind a trusted proxy, clients are limited by X-Forwarded-For rather than the proxy's address"""
+    alice = {"X-Forwarded-For": "203.0.113.7"}
+    # A client-supplied address to the left of the proxy's entry is ignored
+    spoofed = {"X-Forwarded-For": "198.51.100.1, 203.0.113.7"}
+    bob = {"X-Forwarded-For": "203.0.113.8"}
+    requests = [("GET", "/api/agents", alice), ("GET", "/api/agents", spoofed), ("GET", "/api/agents", bob)]
+    statuses = asyncio.run(api_statuses(requests, api_limit=1, trusted_hops=1))
+    assert statuses == [200, 429, 200], f"expected one bucket per forwarded client, got {statuses}"
+
+    untrusted = asyncio.run(api_statuses(requests, api_limit=1, trusted_hops=0))
+    assert untrusted == [200, 429, 429], f"X-Forwarded-For was trusted without a proxy: {untrusted}"
+    print("✓ API limit is per forwarded client behind a trusted proxy")
+
+
+def discussion_round(number: int, messages) -> DiscussionRound:
+    return DiscussionRound(round_number=number, round_type="deliberation", messages=[
+        AgentMessage(agent=agent, role="Advisor", message=message, round_number=number,
+                     message_type="rebuttal", timestamp="")
+        for agent, message in messages
+    ])
+
+
+def test_convergence_waits_for_every_agent():
+    """One agent still changing position keeps deliberation going"""
+    steady = "We should focus onboarding on the first ninety days and track activation weekly."
+    agents = ["Sales", "Research", "Marketing", "Finance", "Product", "Customer Success"]
+    previous = discussion_round(1, [(agent, steady) for agent in agents])
+    settled = discussion_round(2, [(agent, steady) for agent in agents])
+    # Five agents repeat themselves; averaged in, the one who moved would look converged
+    moved = discussion_round(2, [(agent, steady) for agent in agents[:-1]] + [
+        (agents[-1], "Price is the real problem: cut the SMB tier by a third before anything else.")
+    ])
+
+    assert position_similarity(previous, settled) > 0.99
+    score = position_similarity(previous, moved)
+    assert score < 0.85, f"one agent's new position was averaged away ({score:.2f})"
+    print(f"✓ Convergence uses the agent who moved most ({score:.2f})")
+
+
+def test_analyze_report_offline():
+    """/api/analyze-report returns a valid action plan on the fake backend"""
+    import main as server
+
+    report = {
+        "summary": "Churn is concentrated in SMB accounts in their first quarter.",
+        "key_points": ["Onboarding gaps", "Slow support response"],
+        "agent_metrics": {"Sales": {"confidence": 0.8}},
+        "recommendations": ["Add onboarding calls", "Set support SLAs"]
+    }
+
+    async def analyze():
+        transport = httpx.ASGITransport(app=server.app, client=("10.0.0.2", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/analyze-report", json=report)
+
+    response = asyncio.run(analyze())
+    assert response.status_code == 200, f"analyze-report failed offline: {response.text}"
+    plan = server.AnalysisOutput.model_validate(response.json())
+    assert plan.action_plan, "empty action plan"
+    print(f"✓ analyze-report returned {len(plan.action_plan)} tasks offline")
+
+
+def test_unknown_turn_policy_fails_at_startup():
+    """A misconfigured DISCUSSION_TURN_POLICY is rejected when settings load"""
+    from typing import get_args
+    from pydantic import ValidationError
+    from config import Settings
+    from scheduler import POLICIES
+
+    try:
+        Settings(discussion_turn_policy="parallel")
+    except ValidationError:
+        pass
+    else:
+        raise AssertionError("an unknown turn policy was accepted")
+    allowed = get_args(Settings.model_fields["discussion_turn_policy"].annotation)
+    assert set(allowed) == set(POLICIES), f"settings allow {allowed}, the scheduler knows {POLICIES}"
+    print("✓ Unknown turn policies fail at startup")
+
+
+def test_batch_phase_waits_for_slow_research():
+    """A lockstep phase goes out as one Batch API job even when some research is slow"""
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    import batch_stub_server
+    from services.linkup_service import linkup_service
+    from services.openai_batch import BatchCollector
+
+    batch_stub_server.BATCH_DELAY_SECONDS = 0
+    stub = AsyncOpenAI(
+        api_key="stub",
+        base_url="http://stub/v1",
+        http_client=DefaultAsyncHttpxClient(transport=httpx.ASGITransport(app=batch_stub_server.app))
+    )
+    collector = BatchCollector(lambda: stub, flush_seconds=0.05, max_requests=1000, poll_seconds=0.01)
+    sizes = []
+    execute = collector._execute
+
+    async def recording(items):
+        sizes.append(len(items))
+        return await execute(items)
+
+    collector._execute = recording
+    search_results = linkup_service.search_results
+
+    async def slow_search(query, *args, **kwargs):
+        # Searches for every other question take far longer than the debounce
+        if "slow" in query:
+            await asyncio.sleep(0.3)
+        return await search_results(query, *args, **kwargs)
+
+    questions = [f"How should we grow {'slow' if i % 2 else 'fast'} market segment {i}?" for i in range(4)]
+    orchestrator = DiscussionOrchestrator()
+    batch, linkup_service.search_results, openai_service.batch = openai_service.batch, slow_search, collector
+    try:
+        outcomes = asyncio.run(orchestrator.conduct_discussions_batch(questions))
+    finally:
+        openai_service.batch, linkup_service.search_results = batch, search_results
+
+    assert not [o for o in outcomes if isinstance(o, Exception)], f"discussions failed: {outcomes}"
+    research_calls = len(questions) * len(orchestrator.agents)
+    assert sizes[0] == research_calls, f"research phase was split into batches of {sizes}"
+    assert collector.stats["fallback_flushes"] == 0, "a phase was only sent by the fallback timer"
+    print(f"✓ Batch jobs per lockstep step: {sizes}")
+
+
+def test_turn_graph_order_and_concurrency():
+    """Sequential turns see every earlier speaker; snapshot turns run at once, up to the cap"""
+    agents = ["A", "B", "C", "D"]
+    assert [t.depends_on for t in build_turns(agents, SEQUENTIAL)] == [[], [0], [1], [2]]
+    assert [t.depends_on for t in build_turns(agents, SNAPSHOT)] == [[], [], [], []]
+
+    async def run(policy: str, cap=None):
+        running, peak, seen = 0, 0, {}
+
+        async def turn(t, earlier):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            seen[t.agent] = earlier
+            return t.agent
+
+        results = await run_turns(build_turns(agents, policy), turn, max_concurrency=cap)
+        return results, peak, seen
+
+    results, peak, seen = asyncio.run(run(SEQUENTIAL))
+    assert results == agents and peak == 1
+    assert seen["D"] == ["A", "B", "C"], "a sequential turn didn't see every earlier speaker"
+    results, peak, seen = asyncio.run(run(SNAPSHOT))
+    assert results == agents and peak == 4 and seen["D"] == []
+    _, peak, _ = asyncio.run(run(SNAPSHOT, cap=2))
+    assert peak == 2, f"max_concurrency=2 let {peak} turns run at once"
+    print("✓ Turn graph respects dependencies and the concurrency cap")
+
+
+def test_failed_turn_cancels_round():
+    """A failing turn fails the round and cancels the turns still running"""
+    cancelled = []
+
+    async def turn(t, earlier):
+        if t.agent == "B":
+            raise RuntimeError("upstream down")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(t.agent)
+            raise
+
+    async def run():
+        try:
+            await run_turns(build_turns(["A", "B", "C"], SNAPSHOT), turn)
+        except RuntimeError:
+            await asyncio.sleep(0)
+            return True
+        return False
+
+    assert asyncio.run(run()), "the turn's error was swallowed"
+    assert sorted(cancelled) == ["A", "C"], f"turns left running: {cancelled}"
+    print("✓ A failed turn cancels the rest of its round")
+
+
+def test_panels_and_lockstep():
+    """Panels are balanced; lockstep members wait for each other and early leavers don't block"""
+    assert [len(p) for p in split_panels(list(range(10)), 4)] == [4, 3, 3]
+    assert [len(p) for p in split_panels(list(range(4)), 4)] == [4]
+
+    async def run():
+        lockstep = Lockstep(3)
+        log = []
+
+        async def member(name: str, steps: int):
+            with lockstep.member():
+                for step in range(steps):
+                    await lockstep.step()
+                    log.append((step, name))
+                    await asyncio.sleep(0.01 if name == "slow" else 0)
+
+        await asyncio.gather(member("slow", 3), member("fast", 3), member("short", 1))
+        return log
+
+    log = asyncio.run(run())
+    steps = [step for step, _ in log]
+    assert steps == sorted(steps), f"a member ran ahead of the others: {log}"
+    assert sum(1 for step, _ in log if step == 2) == 2
+    print("✓ Panels are balanced and lockstep members move together")
+
+
+def test_transcript_forks_are_snapshots():
+    """A fork sees its base up to the fork point, and neither side sees the other's later entries"""
+    base = Transcript()
+    base.append("Sales", "Revenue is up", "initial", 1)
+    base.append("Research", "Market is flat", "research", 0)
+    assert base.render(["initial"]) == "\nSales: Revenue is up\n"
+
+    fork = base.fork()
+    fork.append("Customer Success", "Churn is rising", "rebuttal", 2)
+    base.append("Sales", "Pipeline is thin", "rebuttal", 2)
+
+    assert fork.render(["initial", "rebuttal"]) == "\nSales: Revenue is up\n\nCustomer Success: Churn is rising\n"
+    assert base.render(["rebuttal"]) == "\nSales: Pipeline is thin\n"
+    assert len(fork) == 3 and len(base) == 3
+    assert [e.agent for e in fork.entries(["rebuttal"])] == ["Customer Success"]
+    assert fork.char_count_for(["initial", "rebuttal"]) == len(fork.render(["initial", "rebuttal"]))
+    assert Transcript().render(["initial"]) == EMPTY_HISTORY
+    print("✓ Transcript forks are independent snapshots")
+
+
+def test_transcript_render_is_incremental():
+    """Cached renders extended with new entries match a fresh render"""
+    transcript = Transcript()
+    fresh = Transcript()
+    for round_number in range(1, 6):
+        for agent in ("Sales", "Research"):
+            message = f"{agent} point {round_number}"
+            transcript.append(agent, message, "rebuttal", round_number)
+            fresh.append(agent, message, "rebuttal", round_number)
+        transcript.render(["rebuttal"])  # Cache the render so far
+    assert transcript.render(["rebuttal"]) == fresh.render(["rebuttal"])
+    assert transcript.token_estimate_for(["rebuttal"]) == len(fresh.render(["rebuttal"])) // 4
+    print("✓ Transcript renders are extended incrementally")
+
+
+def test_compaction_stays_within_budget():
+    """Over budget, old rounds become one rolling summary, built once per round"""
+    summaries = []
+    generate_response = openai_service.generate_response
+
+    async def summarize(messages, *args, **kwargs):
+        summaries.append(messages[-1]["content"])
+        return f"summary {len(summaries)}"
+
+    transcript = Transcript()
+    for round_number in range(1, 6):
+        for agent in ("Sales", "Research"):
+            transcript.append(agent, f"{agent} round {round_number}: " + "detail " * 20, "rebuttal", round_number)
+    budget = SUMMARY_MAX_TOKENS + 100
+    compactor = HistoryCompactor(budget)
+
+    async def render_twice():
+        first = await compactor.render(transcript, ["rebuttal"])
+        second = await compactor.render(transcript, ["rebuttal"])
+        transcript.append("Sales", "Sales round 6: closing thoughts", "rebuttal", 6)
+        third = await compactor.render(transcript, ["rebuttal"])
+        unlimited = await HistoryCompactor(0).render(transcript, ["rebuttal"])
+        assert unlimited == transcript.render(["rebuttal"]), "a zero budget still compacted"
+        return first, second, third
+
+    openai_service.generate_response = summarize
+    try:
+        first, second, third = asyncio.run(render_twice())
+    finally:
+        openai_service.generate_response = generate_response
+
+    assert first == second and first.startswith("\nSummary of rounds 1-"), first[:80]
+    recent = first.split("\n", 2)[2]
+    assert len(recent) // 4 <= budget - SUMMARY_MAX_TOKENS, "verbatim rounds exceed the space left by the summary"
+    assert "round 5" in recent, "the latest round wasn't kept verbatim"
+    # The summary chain is built once; a new round only summarizes what newly fell out of the window
+    built = len(summaries)
+    assert built == int(first.split("-", 1)[1].split(":", 1)[0]), f"{built} summaries for one render"
+    assert third.startswith("\nSummary of rounds 1-") and len(summaries) - built <= 1
+    print(f"✓ Compaction keeps history within {budget} tokens ({len(summaries)} summaries)")
+
+
+def test_deadline_bounds_queued_and_hanging_calls():
+    """Calls past the route deadline fail; only the one OpenAI was answering counts against the breaker"""
+    service = stub_service(upstream_seconds=1.0, max_concurrency=1)
+    service.hedge_enabled = False
+    service.router = ModelRouter(default_policies("test-model", timeout_seconds=0.1))
+    service.upstream = ResilientUpstream(
+        "test", max_attempts=1, base_delay=0, max_delay=0, failure_threshold=5, reset_seconds=30
+    )
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(complete_many(service, 1), complete_many(service, 1), return_exceptions=True)
+        return results, loop.time() - started
+
+    results, elapsed = asyncio.run(run())
+    assert all(isinstance(result, TimeoutError) for result in results), results
+    assert elapsed < 0.5, f"calls ran {elapsed:.2f}s past a 0.1s deadline"
+    assert service.stats["timeouts"] == 2
+    assert service.stats["upstream_timeouts"] == 1, "a call queued at the limiter was blamed on OpenAI"
+    assert service.upstream.breaker.failures == 1
+    print("✓ Per-call deadline covers the limiter queue and the upstream call")
+
+
+def test_token_bucket_smooths_bursts():
+    """The burst is free, then acquisitions are spaced at the rate; pauses and cancellations hold"""
+    async def run():
+        bucket = TokenBucket(per_minute=600, burst_seconds=0.1)  # 10/s, burst of 1
+        assert await bucket.acquire() == 0.0, "the burst allowance wasn't free"
+        waited = await bucket.acquire()
+        assert 0.05 < waited <= 0.1, f"second call waited {waited:.3f}s at 10/s"
+
+        bucket.pause(0.2)
+        assert await bucket.acquire() >= 0.19, "Retry-After pause was ignored"
+
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert await bucket.acquire() <= 0.1, "a cancelled wait kept its reservation"
+
+    asyncio.run(run())
+    print("✓ Token bucket spaces calls at its rate")
+
+
+def test_adaptive_concurrency_backs_off_and_recovers():
+    """Overloads halve the limit once per epoch; waiters get slots as the limit allows"""
+    async def run():
+        concurrency = AdaptiveConcurrency(maximum=4)
+        for _ in range(4):
+            await concurrency.acquire()
+        waiter = asyncio.create_task(concurrency.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done(), "a fifth call got a slot at limit 4"
+
+        epoch = concurrency.epoch
+        concurrency.on_overload(epoch)
+        concurrency.on_overload(epoch)  # Same burst of failures: no second halving
+        assert concurrency.limit == 2
+
+        concurrency.release()
+        concurrency.release()
+        await asyncio.sleep(0)
+        assert not waiter.done(), "woke a waiter with 2 in flight at limit 2"
+        concurrency.release()
+        await waiter
+        assert concurrency.in_flight == 2
+
+        cancelled = asyncio.create_task(concurrency.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        for _ in range(8):
+            concurrency.on_success()
+        assert 2 < concurrency.limit <= 4, concurrency.limit
+        assert concurrency.in_flight == 2, "a cancelled waiter took a slot"
+
+    asyncio.run(run())
+    print("✓ Adaptive concurrency halves on overload and climbs back")
+
+
+def test_circuit_breaker_states():
+    """Transient failures are retried until the breaker opens; a single probe closes or reopens it"""
+    upstream = ResilientUpstream(
+        "test", max_attempts=3, base_delay=0, max_delay=0, failure_threshold=2, reset_seconds=0.05
+    )
+    attempts = []
+
+    async def failing(exc: Exception):
+        attempts.append(exc)
+        raise exc
+
+    async def succeeding():
+        return "ok"
+
+    async def run():
+        try:
+            await upstream.run(lambda: failing(ValueError("bad request")))
+        except ValueError:
+            pass
+        assert len(attempts) == 1 and upstream.breaker.failures == 0, "retried a non-transient error"
+
+        try:
+            await upstream.run(lambda: failing(TimeoutError()))
+        except TimeoutError:
+            pass
+        # The second failure opens the breaker, so the third attempt isn't made
+        assert len(attempts) == 3 and upstream.stats["retries"] == 1
+        assert upstream.breaker.state == OPEN
+        try:
+            await upstream.run(succeeding)
+            raise AssertionError("an open breaker let a call through")
+        except CircuitOpenError:
+            assert upstream.stats["short_circuited"] == 1
+
+        await asyncio.sleep(0.06)
+        assert upstream.breaker.state == HALF_OPEN
+        assert upstream.breaker.acquire(), "the first half-open call wasn't the probe"
+        assert not upstream.breaker.allows(), "let a second call through beside the probe"
+        upstream.breaker.record_failure()
+        assert upstream.breaker.state == OPEN, "a failed probe didn't reopen the breaker"
+
+        await asyncio.sleep(0.06)
+        assert await upstream.run(succeeding) == "ok"
+        assert upstream.breaker.state == CLOSED and upstream.breaker.failures == 0
+
+    asyncio.run(run())
+    print("✓ Circuit breaker opens, probes and closes")
+
+
+def test_completion_cache_tiers_and_ttl():
+    """Hits come from memory, then SQLite (also after a restart), until the TTL runs out"""
+    path = os.path.join(tempfile.mkdtemp(), "completions.db")
+    first = completion_key({"model": "test-model", "messages": [{"role": "user", "content": "a"}]})
+    second = completion_key({"model": "test-model", "messages": [{"role": "user", "content": "b"}]})
+    assert first != completion_key({"model": "test-model", "messages": [], "temperature": 0.2})
+
+    async def run():
+        cache = CompletionCache(path, ttl_seconds=0.2, max_memory_entries=1)
+        await cache.put(first, "answer a")
+        await cache.put(second, "answer b")  # Evicts first from memory
+        assert await cache.get(second, "test") == "answer b"
+        assert await cache.get(first, "test") == "answer a"
+        assert cache.stats["test"] == {"memory_hits": 1, "disk_hits": 1, "misses": 0}
+
+        restarted = CompletionCache(path, ttl_seconds=0.2, max_memory_entries=1)
+        assert await restarted.get(second, "test") == "answer b", "entries didn't survive a restart"
+
+        await asyncio.sleep(0.25)
+        assert await cache.get(first, "test") is None, "served an expired entry from memory"
+        assert await restarted.get(second, "test") is None, "served an expired entry from disk"
+
+    asyncio.run(run())
+    print("✓ Completion cache serves both tiers within its TTL")
+
+
+def test_single_flight_coalesces_and_cancels():
+    """Identical calls share one upstream call, which outlives any caller but the last"""
+    flight = SingleFlight("test")
+    started, cancelled = [], []
+
+    async def operation(result: str):
+        started.append(result)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled.append(result)
+            raise
+        return result
+
+    async def failing():
+        started.append("error")
+        raise ValueError("upstream said no")
+
+    async def run():
+        callers = [asyncio.create_task(flight.do("key", lambda: operation("shared"))) for _ in range(3)]
+        await asyncio.sleep(0)
+        callers[0].cancel()  # The caller that started the call goes away
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+        assert results[1:] == ["shared", "shared"], results
+        assert started == ["shared"] and not cancelled
+        assert flight.stats == {"calls": 3, "coalesced": 2}
+
+        abandoned = [asyncio.create_task(flight.do("key", lambda: operation("abandoned"))) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in abandoned:
+            caller.cancel()
+        await asyncio.gather(*abandoned, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert cancelled == ["abandoned"], "the call kept running with nobody waiting"
+        assert await flight.do("key", lambda: operation("fresh")) == "fresh", "joined a cancelled call"
+
+        errors = await asyncio.gather(*(flight.do("error", failing) for _ in range(2)), return_exceptions=True)
+        assert started.count("error") == 1 and all(isinstance(e, ValueError) for e in errors)
+        assert flight.metrics()["in_flight"] == 0
+
+    asyncio.run(run())
+    print("✓ Single-flight shares calls and cancels them only when nobody waits")
+
+
+def test_router_falls_back_while_slo_is_missed():
+    """A slow primary sends its class to the fallback, with probes, until it recovers"""
+    policies = default_policies("primary", timeout_seconds=30)
+    policies[SYNTHESIS] = replace(policies[SYNTHESIS], fallback_model="fallback", latency_slo_seconds=2.0)
+    policies[DELIBERATION] = replace(policies[DELIBERATION], latency_slo_seconds=2.0)  # No fallback model
+    router = ModelRouter(policies, min_samples=5)
+
+    for _ in range(4):
+        router.observe(SYNTHESIS, "primary", 5.0, 100, 100)
+        router.observe(DELIBERATION, "primary", 5.0, 100, 100)
+    assert router.route(SYNTHESIS).model == "primary", "fell back before min_samples calls"
+    router.observe(SYNTHESIS, "primary", 5.0, 100, 100)
+    router.observe(DELIBERATION, "primary", 5.0, 100, 100)
+
+    routes = [router.route(SYNTHESIS) for _ in range(PROBE_EVERY)]
+    assert [route.model for route in routes].count("primary") == 1, "no single probe of the primary"
+    assert all(route.fallback == (route.model == "fallback") for route in routes)
+    assert router.fallbacks[SYNTHESIS] == PROBE_EVERY - 1
+    assert router.route(DELIBERATION).model == "primary", "fell back without a fallback model"
+
+    for _ in range(SLO_WINDOW):
+        router.observe(SYNTHESIS, "primary", 0.5, 100, 100)
+    assert router.route(SYNTHESIS).model == "primary", "stayed on the fallback after the primary recovered"
+    print("✓ Router falls back while the SLO is missed and returns once it's met")
+
+
+def test_search_cache_serves_stale_and_negative_entries():
+    """Fresh hits skip Linkup; stale ones are served while refreshed; failures are remembered briefly"""
+    service = linkup_service
+    cache, fetch_from_linkup = service.cache, service._fetch
+    service.cache = SearchCache("", ttl_seconds=0.1, stale_seconds=0.3, negative_ttl_seconds=0.1, max_entries=10)
+    fetched = []
+    failing = set()
+
+    async def fetch(key, query, depth, output_type):
+        fetched.append(query)
+        if query in failing:
+            raise httpx.ConnectError("linkup unreachable")
+        return {"results": [{"name": f"{query} #{len(fetched)}"}]}
+
+    service._fetch = fetch
+
+    async def search(query: str) -> str:
+        result = await service.search(query)
+        return result["results"][0]["name"] if result["results"] else result["error"]
+
+    async def refreshed():
+        await asyncio.gather(*service._refreshing.values())
+
+    async def run():
+        assert await search("Churn drivers?") == "Churn drivers? #1"
+        assert await search("churn   DRIVERS") == "Churn drivers? #1", "a reworded query missed"
+        assert len(fetched) == 1
+
+        await asyncio.sleep(0.12)
+        assert await search("churn drivers") == "Churn drivers? #1", "a stale entry wasn't served"
+        await refreshed()
+        assert await search("churn drivers") == "churn drivers #2", "the stale entry wasn't refreshed"
+
+        await asyncio.sleep(0.12)
+        failing.add("churn drivers")
+        assert await search("churn drivers") == "churn drivers #2"
+        await refreshed()
+        assert await search("churn drivers") == "churn drivers #2", "a failed refresh dropped the entry"
+        assert service.cache.stats["refresh_failures"] == 1
+
+        failing.add("pricing")
+        assert await search("pricing") == "linkup unreachable"
+        assert await search("pricing") == "linkup unreachable" and fetched.count("pricing") == 1
+        await asyncio.sleep(0.12)
+        failing.discard("pricing")
+        assert await search("pricing") == "pricing #6", "a failure was cached past its negative TTL"
+
+        await asyncio.sleep(0.3)
+        assert await service.cache.get("standard|searchResults|churn drivers") is None, "served an expired entry"
+
+    try:
+        asyncio.run(run())
+        stats = service.cache.stats
+    finally:
+        service.cache, service._fetch = cache, fetch_from_linkup
+    assert (stats["fresh_hits"], stats["stale_hits"], stats["negative_hits"]) == (2, 3, 1), stats
+    print("✓ Search cache serves fresh, stale and negative entries within their TTLs")
+
+
+def main():
+    tests = [
+        ("Panel Peer Hears Lead Debate", test_panel_peer_hears_lead_debate),
+        ("Leads Continue Earlier Debate", test_leads_continue_earlier_debate),
+        ("Answer Cache Needs Same Content Words", test_answer_cache_needs_same_content_words),
+        ("Hedge Delay Starts After Rate Limiter", test_hedge_delay_starts_after_rate_limiter),
+        ("Job Polls Skip API Limit", test_job_polls_skip_api_limit),
+        ("API Limit Per Forwarded Client", test_api_limit_per_forwarded_client),
+        ("Convergence Waits For Every Agent", test_convergence_waits_for_every_agent),
+        ("Analyze Report Offline", test_analyze_report_offline),
+        ("Unknown Turn Policy Fails At Startup", test_unknown_turn_policy_fails_at_startup),
+        ("Batch Phase Waits For Slow Research", test_batch_phase_waits_for_slow_research),
+        ("Turn Graph Order And Concurrency", test_turn_graph_order_and_concurrency),
+        ("Failed Turn Cancels Round", test_failed_turn_cancels_round),
+        ("Panels And Lockstep", test_panels_and_lockstep),
+        ("Transcript Forks Are Snapshots", test_transcript_forks_are_snapshots),
+        ("Transcript Render Is Incremental", test_transcript_render_is_incremental),
+        ("Compaction Stays Within Budget", test_compaction_stays_within_budget),
+        ("Deadline Bounds Queued And Hanging Calls", test_deadline_bounds_queued_and_hanging_calls),
+        ("Token Bucket Smooths Bursts", test_token_bucket_smooths_bursts),
+        ("Adaptive Concurrency Backs Off And Recovers", test_adaptive_concurrency_backs_off_and_recovers),
+        ("Circuit Breaker States", test_circuit_breaker_states),
+        ("Completion Cache Tiers And TTL", test_completion_cache_tiers_and_ttl),
+        ("Single Flight Coalesces And Cancels", test_single_flight_coalesces_and_cancels),
+        ("Router Falls Back While SLO Is Missed", test_router_falls_back_while_slo_is_missed),
+        ("Search Cache Serves Stale And Negative Entries", test_search_cache_serves_stale_and_negative_entries),
+    ]
+
+    results = []
+    for name, test_func in tests:
+        try:
+            test_func()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"✗ {name}: {e}")
+            results.append((name, False))
+
+    for name, success in results:
+        print(f"{'✓ PASSED' if success else '✗ FAILED'}: {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Transcript - Append-only discussion history
+
+Replaces rebuilding the "discussion so far" string from a list of dicts on
+every prompt. Entries are rendered once when appended, per-type views and
+character counts are kept up to date incrementally, and rendered prompt
+text is cached per type filter and only extended with new entries.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import AgentMessage
+
+# Rough OpenAI tokenizer ratio for English text
+CHARS_PER_TOKEN = 4
+
+EMPTY_HISTORY = "No previous discussion."
+
+
+@dataclass(frozen=True)
+class TranscriptEntry:
+    agent: str
+    message: str
+    type: str
+    round_number: int
+    text: str  # Rendered prompt line
+
+
+class Transcript:
+    def __init__(self, base: Optional["Transcript"] = None):
+        # A fork shares its base's entries up to the fork point
+        self._base = base
+        self._base_len = len(base) if base is not None else 0
+        self._base_chars = base._type_chars() if base is not None else {}
+        self._entries: List[TranscriptEntry] = []
+        self._by_type: Dict[str, List[TranscriptEntry]] = {}
+        self._chars_by_type: Dict[str, int] = {}
+        self.char_count = base.char_count if base is not None else 0
+        # include_types -> (own entries rendered, rendered text)
+        self._renders: Dict[Tuple[str, ...], Tuple[int, str]] = {}
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._entries)
+
+    @property
+    def token_estimate(self) -> int:
+        """Approximate token count of everything in the transcript"""
+        return self.char_count // CHARS_PER_TOKEN
+
+    def append(self, agent: str, message: str, type: str, round_number: int = 0) -> TranscriptEntry:
+        """Add one message to the end of the transcript"""
+        entry = TranscriptEntry(
+            agent=agent,
+            message=message,
+            type=type,
+            round_number=round_number,
+            text=f"\n{agent}: {message}\n"
+        )
+        self._entries.append(entry)
+        self._by_type.setdefault(type, []).append(entry)
+        self._chars_by_type[type] = self._chars_by_type.get(type, 0) + len(entry.text)
+        self.char_count += len(entry.text)
+        return entry
+
+    def extend(self, messages: Iterable[AgentMessage]):
+        """Add agent messages to the end of the transcript"""
+        for msg in messages:
+            self.append(msg.agent, msg.message, msg.message_type, msg.round_number)
+
+    def fork(self) -> "Transcript":
+        """Cheap snapshot that can be extended without touching this transcript"""
+        return Transcript(base=self)
+
+    def entries(self, include_types: Optional[Iterable[str]] = None) -> List[TranscriptEntry]:
+        """Entries in order, optionally limited to some message types"""
+        if include_types is None:
+            return self._all_entries()
+        types = set(include_types)
+        if self._base is None and len(types) == 1:
+            return list(self._by_type.get(next(iter(types)), []))
+        return [e for e in self._all_entries() if e.type in types]
+
+    def char_count_for(self, include_types: Iterable[str]) -> int:
+        """Characters rendered by render(include_types), without rendering"""
+        chars = self._type_chars()
+        return sum(chars.get(t, 0) for t in set(include_types))
+
+    def token_estimate_for(self, include_types: Iterable[str]) -> int:
+        """Approximate tokens rendered by render(include_types)"""
+        return self.char_count_for(include_types) // CHARS_PER_TOKEN
+
+    def render(self, include_types: Iterable[str]) -> str:
+        """Prompt text for the given message types"""
+        text = self._render(tuple(sorted(set(include_types))))
+        return text if text else EMPTY_HISTORY
+
+    def _all_entries(self) -> List[TranscriptEntry]:
+        if self._base is None:
+            return list(self._entries)
+        return self._base._all_entries()[:self._base_len] + self._entries
+
+    def _type_chars(self) -> Dict[str, int]:
+        chars = dict(self._base_chars)
+        for t, count in self._chars_by_type.items():
+            chars[t] = chars.get(t, 0) + count
+        return chars
+
+    def _render(self, key: Tuple[str, ...]) -> str:
+        rendered, text = self._renders.get(key, (0, ""))
+        if rendered < len(self._entries):
+            # Only the entries appended since the last render are joined in
+            text += "".join(e.text for e in self._entries[rendered:] if e.type in key)
+            self._renders[key] = (len(self._entries), text)
+        if self._base is None:
+            return text
+        return self._base._render_prefix(key, self._base_len) + text
+
+    def _render_prefix(self, key: Tuple[str, ...], length: int) -> str:
+        if length == len(self):
+            return self._render(key)
+        # The base grew after the fork; render the snapshot directly
+        return "".join(e.text for e in self._all_entries()[:length] if e.type in key)
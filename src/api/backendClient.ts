@@ -18,7 +18,7 @@ export interface AgentMessage {
   role: string;
   message: string;
   round_number: number;
-  message_type: "research" | "initial" | "rebuttal" | "synthesis";
+  message_type: "research" | "initial" | "rebuttal" | "panel_summary" | "panel_debate" | "synthesis";
   timestamp: string;
 }
 